@@ -27,7 +27,43 @@ SERVER = {
         'limit': 10,
         # Timeframe for rate limiting. Requests are counted against limit for
         # this many seconds
-        'per': 30
+        'per': 30,
+        # How to count requests:
+        #  - 'fixed': count requests in windows of 'per' seconds. Clients can
+        #    make up to twice the limit in a burst across the end of a window.
+        #  - 'bucket': each client has a bucket of 'limit' tokens, refilled
+        #    at limit/per tokens a second, and each request takes a token.
+        'strategy': 'fixed',
+        # Different limits for particular API methods, e.g.
+        # '/api/v1/translate': {'limit': 5, 'per': 30}
+        'endpoints': {},
+        # Different limits for clients sending one of these keys in the
+        # X-API-Key header, e.g. 'secret-key': {'limit': 1000, 'per': 30}.
+        # Every client using a key shares its limit. A key can also have its
+        # own byte quota, e.g. 'bytes': {'limit': 10 * 1024 * 1024,
+        # 'per': 3600}.
+        'api_keys': {},
+        # Also limit the number of bytes of text each client can have
+        # translated, since large requests cost much more than small ones.
+        # This uses the same strategy and storage as the request limit.
+        'bytes': {
+            'enabled': False,
+            'limit': 1024 * 1024,
+            'per': 3600
+        },
+        # Where to keep request counts:
+        #  - 'memory': in each server process. With several worker processes
+        #    (e.g. under uWSGI), each one counts separately.
+        #  - 'shared': in the file at 'path', shared by every process on this
+        #    host. 'slots' is the maximum number of counters it holds.
+        #  - 'redis': on the Redis server at 'host', 'port' and 'db', shared
+        #    by every host using it.
+        'storage': 'memory',
+        # 'path': '/tmp/translate-ratelimit',
+        # 'slots': 4096,
+        # 'host': 'localhost',
+        # 'port': 6379,
+        # 'db': 0
     },
 
     # Specify SSL key and certificates to use, for use with bin/translate. It's
@@ -46,6 +82,19 @@ SERVER = {
         'cert': 'ssl.cert'
     },
 
+    # Serve requests asynchronously with gevent, so that requests waiting on
+    # slow translation services don't each hold up a thread. Only used by
+    # bin/translate; under uWSGI, use its --gevent option instead.
+    #
+    # This requires 'gevent' (pip install gevent)
+    'async': {
+        'enabled': False,
+        # Maximum number of requests to handle at the same time
+        'connections': 1000,
+        # Number of threads to run backends that don't support async mode in
+        'threads': 10
+    },
+
     # Limits for size (in bytes) for texts to translate (defaults to off)
     'sizelimit': {
         # Should we enable size limits?
@@ -55,6 +104,151 @@ SERVER = {
         # and should automatically split up requests into multiple requests
         # under their limit (not counted individually toward ratelimit).
         'limit': 10 * 1024
+    },
+
+    # Options for /api/v1/translate/document requests.
+    'document': {
+        # Documents are translated a piece at a time, split on sentence
+        # boundaries into pieces of at most this many bytes (or the size
+        # limit above, if that's smaller).
+        'segment': 4 * 1024
+    },
+
+    # Options for /api/v1/batch requests.
+    'batch': {
+        # Maximum number of requests allowed in a single batch (0 for no
+        # limit)
+        'limit': 100,
+        # Maximum number of requests from a single batch to handle at the same
+        # time
+        'workers': 8,
+        # Number of seconds after which any requests in a batch that haven't
+        # finished are reported as timed out (HTTP 504)
+        'timeout': 30
+    },
+
+    # Backends are started up in parallel when the first request comes in
+    # (most of them have to ask a web service which languages they support).
+    # Backends that take longer than 'deadline' seconds finish starting up in
+    # the background, and aren't used until they're ready.
+    'startup': {
+        'deadline': 10,
+        # Maximum number of backends to start at once
+        'workers': 8
+    },
+
+    # Remember the language pairs that backends support between restarts, so
+    # they don't all have to be asked again before requests can be served.
+    # Pairs older than 'ttl' seconds are still used, but refreshed in the
+    # background. Set 'path' to None to always ask backends.
+    'pairs': {
+        'path': 'pairs.json',
+        'ttl': 24 * 60 * 60,
+        # Ask backends for their language pairs again every this many seconds
+        # (plus or minus a random fraction 'jitter' of that), so that pairs
+        # added or dropped by a service are picked up without a restart. None
+        # disables this.
+        'refresh': 6 * 60 * 60,
+        'jitter': 0.1
+    },
+
+    # How to choose which backend to try first for a language pair. By default
+    # backends are only ordered by their 'preference'. With adaptive ordering,
+    # each backend's preference is reduced according to how slow and
+    # unreliable it has recently been for that pair:
+    #   score = preference - latency * mean seconds - errors * error rate
+    'ordering': {
+        'adaptive': False,
+        # Weight given to each new request in the running averages (0 to 1)
+        'alpha': 0.2,
+        # Preference points lost per second of average latency
+        'latency': 10,
+        # Preference points lost by a backend that fails every request
+        'errors': 50,
+        # While a backend isn't being used, its averages are halved every
+        # this many seconds, so that one which has been demoted gets tried
+        # again once it's had time to recover
+        'decay': 300
+    },
+
+    # Keep track of how much of the quota of metered backends (e.g. Yandex's
+    # daily limit) has been used, and stop sending them requests shortly
+    # before it runs out. Quotas can be changed with the 'quota' option of
+    # each backend (see below), and count characters of text (not bytes).
+    # Each server process counts separately, so with several workers (e.g.
+    # under uWSGI) lower the quotas to match, or leave this off.
+    'quota': {
+        'enabled': False,
+        # File to save usage in, so it isn't forgotten on restart
+        'path': 'quota.json',
+        # Fraction of each quota to leave unused
+        'margin': 0.05
+    },
+
+    # Stop sending requests to backends that keep failing for a while, rather
+    # than making every request wait for them to time out first. Texts that a
+    # service refuses to translate (e.g. Yandex's "could not be translated")
+    # don't count as failures.
+    'breaker': {
+        'enabled': True,
+        # Number of failures in a row after which to skip a backend
+        'failures': 5,
+        # Seconds to skip the backend for
+        'reset': 30,
+        # After that, let one request through every this many seconds to see
+        # if it has recovered
+        'interval': 5,
+        # Count requests taking longer than this many seconds as failures
+        # (None to only count errors)
+        'slow': None
+    },
+
+    # Hedge translation requests: if a backend hasn't answered after 'delay'
+    # seconds, also send the request to the next backend that can handle it,
+    # and use whichever answers first (defaults to off)
+    'hedge': {
+        'enabled': False,
+        # Seconds to wait on a backend before trying the next one as well
+        'delay': 1,
+        # Maximum number of backend requests to have running at once
+        'workers': 20,
+        # Instead of always waiting 'delay' seconds, wait for this percentile
+        # of each backend's recent latencies, e.g. 95 to hedge the slowest 5%
+        # of its requests. 'delay' is still used for backends until enough of
+        # their requests have been seen.
+        'percentile': None,
+        # Number of each backend's latest requests to take the percentile of
+        'samples': 100
+    },
+
+    # Cache translation results, so repeated requests for the same text don't
+    # have to go through a backend again (off unless enabled here)
+    'cache': {
+        # Should we cache translations?
+        'enabled': False,
+        # Maximum number of translations to keep in memory
+        'entries': 1024,
+        # Maximum total size (in bytes) of translations kept in memory
+        'size': 1024 * 1024,
+        # Number of seconds a cached translation is valid for
+        'ttl': 60 * 60,
+        # Optional path to an SQLite database to share cached translations
+        # through. Useful when running multiple server processes (uWSGI
+        # workers, etc.) on the same host.
+        'path': None
+    },
+
+    # Translation memory. Every segment translated by a backend is saved, and
+    # reused instead of asking a backend again. Unlike the cache, entries
+    # never expire. Results from memory have 'origin' set to 'memory'.
+    'memory': {
+        'enabled': False,
+        # SQLite database to keep translations in
+        'path': 'memory.db',
+        # How similar (from 0 to 1) a remembered segment must be to the one
+        # being translated for its translation to be used. 1 only allows exact
+        # matches, 0.9 would also allow e.g. small changes in punctuation.
+        'threshold': 1.0
     }
 }
 
@@ -64,6 +258,21 @@ SERVER = {
 # 'preference' key here. Use this if you want to try a specific backend before
 # other possibilities. Higher preferences indicate a higher priority to try to
 # use that backend when possible.
+#
+# Only backends that are active here are loaded at all. Backends from other
+# packages are found by name through the 'translate.backends' entry point
+# group, or can be named directly with a 'module' key, e.g.
+# 'mybackend': {'module': 'mypackage.backend:MyBackend'}
+#
+# Backends using web services keep a pool of open connections to the service,
+# which can be tuned with the following (optional) keys:
+#
+#   'pool_size': Maximum number of connections to keep open (default 10)
+#   'keepalive': Set to False to open a new connection for every request
+#   'retries':   Number of times to retry requests that fail to connect
+#                (default 0)
+#   'backoff':   Seconds to wait before the first retry, doubling for each
+#                following retry (default 0.5)
 BACKENDS = {
     # Dummy backend, doesn't do anything useful (translates between en-en), for
     # testing purposes only.
@@ -73,7 +282,21 @@ BACKENDS = {
 
     # Local apertium service. You must have `apertium` on the PATH.
     'apertium': {
-        'active': True
+        'active': True,
+        # Number of warm apertium processes to keep around for each language
+        # pair. Individual pairs can be given their own size in 'pool_sizes',
+        # e.g. {'en-es': 4}
+        'pool_size': 1,
+        'pool_sizes': {},
+        # Restart an apertium process after it has translated this many texts
+        'max_requests': 1000,
+        # Seconds to wait on an apertium process before assuming it has hung
+        'timeout': 10,
+        # 'apertium' runs each pair through the apertium script. 'chain' runs
+        # the stages of the pair's mode file as separate processes piped
+        # into each other, skipping the script, and shares them between
+        # every request for the pair at once (pool sizes are ignored).
+        'engine': 'apertium'
     },
 
     # Apertium web service (api.apertium.org)
@@ -83,7 +306,10 @@ BACKENDS = {
         'timeout': 5,
         # API key (optional) for webservice. Find more information on
         # api.apertium.org
-        'key': os.environ.get('APERTIUM_KEY')
+        'key': os.environ.get('APERTIUM_KEY'),
+        # Traffic limit of the web service, if you know it, e.g.
+        # {'per': 86400, 'requests': 10000}
+        # 'quota': None
     },
 
     # Backend using freetranslation.com
@@ -125,6 +351,15 @@ BACKENDS = {
         # Sign up for a key at https://translate.yandex.com/apikeys
         'key': os.environ.get('YANDEX_KEY'),
         # Timeout after which to give up on request
-        'timeout': 5
+        'timeout': 5,
+        # Long texts are split up and the pieces translated in parallel. This
+        # is the most requests to have in flight at once (across every text),
+        # so as not to get throttled.
+        'concurrency': 4,
+        # Seconds after which to give up on translating a long text
+        'deadline': 30,
+        # Limits of your API key. The free plan allows 1,000,000 characters a
+        # day. Set to None to not track usage.
+        'quota': {'per': 24 * 60 * 60, 'characters': 1000000}
     }
 }
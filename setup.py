@@ -3,6 +3,7 @@
 import translate
 
 import subprocess
+import sys
 
 from setuptools import setup, find_packages, Command
 
@@ -55,6 +56,10 @@ packages = [
 
 requires = []
 
+# collections.OrderedDict was added in Python 2.7
+if sys.version_info < (2, 7):
+    requires.append('ordereddict')
+
 
 setup(name='translate',
       version=translate.__version__,
@@ -1,6 +1,314 @@
+import os
 import subprocess
+import sys
+import tempfile
+import threading
 
-from translate.backends.apertium import ApertiumBackend
+import pytest
+
+from translate.backends.apertium import ApertiumBackend, ApertiumChain, \
+    ApertiumChainPool, ApertiumPipeline, ApertiumPool, parse_mode
+from translate.exceptions import TranslationException
+
+
+# Stand-in for `apertium -z`: upper-cases each NUL terminated block.
+FAKE_APERTIUM = [sys.executable, '-u', '-c', '''
+import sys
+buf = ''
+while True:
+    c = sys.stdin.read(1)
+    if not c:
+        break
+    if c == '\\0':
+        sys.stdout.write(buf.upper() + '\\0')
+        sys.stdout.flush()
+        buf = ''
+    else:
+        buf += c
+''']
+
+# Stand-in for a later stage of a mode: swaps the case of each block back.
+FAKE_STAGE = [sys.executable, '-u', '-c', '''
+import sys
+buf = ''
+while True:
+    c = sys.stdin.read(1)
+    if not c:
+        break
+    if c == '\\0':
+        sys.stdout.write(buf.swapcase() + '\\0')
+        sys.stdout.flush()
+        buf = ''
+    else:
+        buf += c
+''']
+
+# Stand-in for `apertium -z` that writes out each line as soon as it's read,
+# like the real thing, rather than waiting for the end of the block.
+FAKE_STREAMING = [sys.executable, '-u', '-c', '''
+import sys
+while True:
+    c = sys.stdin.read(1)
+    if not c:
+        break
+    sys.stdout.write(c.upper())
+''']
+
+# Stand-in for `apertium -z` that takes a while over blocks saying 'slow'.
+FAKE_SLOW = [sys.executable, '-u', '-c', '''
+import sys
+import time
+buf = ''
+while True:
+    c = sys.stdin.read(1)
+    if not c:
+        break
+    if c == '\\0':
+        if 'slow' in buf:
+            time.sleep(0.7)
+        sys.stdout.write(buf.upper() + '\\0')
+        sys.stdout.flush()
+        buf = ''
+    else:
+        buf += c
+''']
+
+# Stand-in for an apertium process that never responds.
+HUNG_APERTIUM = [sys.executable, '-c', 'import time; time.sleep(60)']
+
+
+def test_pipeline_reuse():
+    pipeline = ApertiumPipeline(FAKE_APERTIUM)
+
+    assert pipeline.translate(u'hello') == u'HELLO'
+    assert pipeline.translate(u'world\0') == u'WORLD'
+    assert pipeline.requests == 2
+    assert pipeline.alive()
+
+    pipeline.close()
+    assert not pipeline.alive()
+
+
+def test_pipeline_large():
+    pipeline = ApertiumPipeline(FAKE_STREAMING)
+
+    # Much larger than the pipe buffers in both directions
+    text = u'word ' * 40000
+    assert pipeline.translate(text) == text.upper()
+
+    pipeline.close()
+
+
+def test_pipeline_timeout():
+    pipeline = ApertiumPipeline(HUNG_APERTIUM, timeout=0.5)
+
+    with pytest.raises(TranslationException):
+        pipeline.translate(u'hello')
+
+    pipeline.close()
+
+
+def test_pipeline_hung_writing():
+    pipeline = ApertiumPipeline(HUNG_APERTIUM, timeout=0.5)
+
+    # Never read, so the write can't finish either
+    with pytest.raises(TranslationException):
+        pipeline.translate(u'word ' * 100000)
+
+    pipeline.close()
+
+
+def test_pool_recycles():
+    pool = ApertiumPool(FAKE_APERTIUM, size=1, max_requests=2)
+
+    assert pool.translate(u'a') == u'A'
+    first = pool.idle.queue[0]
+
+    # Hits max_requests, so should be thrown away afterwards
+    assert pool.translate(u'b') == u'B'
+    assert pool.idle.empty()
+    assert not first.alive()
+
+    assert pool.translate(u'c') == u'C'
+    assert pool.spawned == 1
+
+    pool.close()
+    assert pool.spawned == 0
+
+
+def test_pool_translate_many():
+    pool = ApertiumPool(FAKE_APERTIUM, size=2)
+
+    assert pool.translate_many([u'a', u'b', u'c']) == [u'A', u'B', u'C']
+    assert pool.spawned == 1
+    assert pool.idle.queue[0].requests == 3
+
+    pool.close()
+
+
+def test_pool_discards_hung():
+    pool = ApertiumPool(HUNG_APERTIUM, size=1, timeout=0.5)
+
+    with pytest.raises(TranslationException):
+        pool.translate(u'hello')
+
+    assert pool.spawned == 0
+    assert pool.idle.empty()
+
+
+def test_parse_mode():
+    fd, path = tempfile.mkstemp(suffix='.mode')
+
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write("lt-proc '/usr/share/apertium/en-es.automorf.bin' | "
+                    "apertium-tagger -g $2 '/tmp/en es.prob' | "
+                    "lt-proc -z $1 /usr/share/apertium/en-es.autogen.bin\n")
+
+        assert parse_mode(path) == [
+            ['lt-proc', '-z', '/usr/share/apertium/en-es.automorf.bin'],
+            ['apertium-tagger', '-z', '-g', '/tmp/en es.prob'],
+            ['lt-proc', '-z', '-g', '/usr/share/apertium/en-es.autogen.bin']]
+    finally:
+        os.remove(path)
+
+
+def test_chain():
+    chain = ApertiumChain([FAKE_APERTIUM, FAKE_STAGE])
+
+    assert chain.translate(u'Hello') == u'hello'
+    assert chain.translate(u'w\u00f6rld\0') == u'w\u00f6rld'
+    assert chain.requests == 2
+    assert chain.alive()
+
+    # Many requests in flight at once still each get their own translation
+    results = {}
+
+    def run(i):
+        results[i] = chain.translate(u'TEXT {0}'.format(i))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == dict((i, u'text {0}'.format(i)) for i in range(20))
+
+    chain.close()
+    assert not chain.alive()
+
+    with pytest.raises(TranslationException):
+        chain.translate(u'hello')
+
+
+def test_chain_retire():
+    chain = ApertiumChain([FAKE_APERTIUM, FAKE_STAGE])
+
+    slots = [chain.submit(u'A'), chain.submit(u'B')]
+    chain.retire()
+
+    # Requests already written are still translated
+    assert [chain.result(slot) for slot in slots] == [u'a', u'b']
+
+    # Nothing more is accepted
+    assert chain.submit(u'C') is None
+
+    chain.reader.join(5)
+    assert not chain.alive()
+
+
+def test_chain_timeout():
+    chain = ApertiumChain([FAKE_APERTIUM, HUNG_APERTIUM], timeout=0.5)
+
+    with pytest.raises(TranslationException):
+        chain.translate(u'hello')
+
+    assert not chain.alive()
+    chain.close()
+
+
+def test_chain_timeout_one():
+    chain = ApertiumChain([FAKE_SLOW], timeout=0.5)
+
+    slow = chain.submit(u'slow')
+    fast = chain.submit(u'fast')
+
+    # Only the request that timed out fails
+    with pytest.raises(TranslationException):
+        chain.result(slow)
+
+    assert chain.result(fast) == u'FAST'
+
+    # But nothing more is sent to it
+    assert not chain.alive()
+    assert chain.submit(u'more') is None
+
+    chain.close()
+
+
+def test_chain_pool_timeout():
+    pool = ApertiumChainPool([FAKE_SLOW], timeout=0.5)
+
+    with pytest.raises(TranslationException):
+        pool.translate(u'slow')
+
+    first = pool.chain
+
+    assert pool.translate(u'fast') == u'FAST'
+    assert pool.chain is not first
+    assert pool.retired == [first]
+
+    pool.close()
+    assert pool.retired == []
+    assert all(proc.poll() is not None for proc in first.procs)
+
+
+def test_chain_pool_hung_writing():
+    # The first stage never reads, so a large request fills up the pipe
+    pool = ApertiumChainPool([HUNG_APERTIUM], timeout=1)
+    errors = []
+
+    def translate(text):
+        try:
+            pool.translate(text)
+        except TranslationException as exc:
+            errors.append(exc)
+
+    large = threading.Thread(target=translate, args=(u'x' * 200000,))
+    large.start()
+
+    # Requests behind the stuck write give up too, rather than waiting on
+    # it forever.
+    small = threading.Thread(target=translate, args=(u'hi',))
+    small.start()
+
+    large.join(5)
+    small.join(5)
+
+    assert not large.is_alive()
+    assert not small.is_alive()
+    assert len(errors) == 2
+
+    # Retiring a chain with a write in progress doesn't wait on it either
+    pool.close()
+
+
+def test_chain_pool_recycles():
+    pool = ApertiumChainPool([FAKE_APERTIUM], max_requests=2)
+
+    assert pool.translate_many([u'a', u'b']) == [u'A', u'B']
+    first = pool.chain
+
+    assert pool.translate(u'c') == u'C'
+    assert pool.chain is not first
+    assert pool.chain.requests == 1
+
+    pool.close()
+    assert pool.chain is None
+
+    with pytest.raises(TranslationException):
+        pool.translate(u'd')
 
 
 # Only run these tests if apertium exectutable exists
@@ -25,5 +333,9 @@ try:
         assert trans is not ""
         assert trans is not None
 
+    def test_deactivate():
+        backend.deactivate()
+        assert backend.pools == {}
+
 except subprocess.CalledProcessError:
     print('Skipping apertium backend')
@@ -5,7 +5,102 @@ import time
 
 from translate.app import app, views
 from translate.app.ratelimit import RateLimit
-from translate.backend import BackendManager
+from translate.backend import BackendManager, CircuitBreaker, IBackend
+from translate.exceptions import ContentException, TranslationException
+
+
+class SlowBackend(IBackend):
+    name = "Slow"
+    description = "Takes its time"
+    url = 'about:blank'
+    preference = 0
+    language_pairs = [('en', 'slow')]
+
+    def activate(self, config):
+        return True
+
+    def deactivate(self):
+        pass
+
+    def translate(self, text, from_lang, to_lang):
+        time.sleep(float(text))
+        return text
+
+
+class BatchBackend(IBackend):
+    name = "Batch"
+    description = "Counts calls to translate_many"
+    url = 'about:blank'
+    preference = 0
+    language_pairs = [('en', 'up'), ('en', 'down')]
+
+    calls = []
+
+    def activate(self, config):
+        return True
+
+    def deactivate(self):
+        pass
+
+    def translate(self, text, from_lang, to_lang):
+        raise AssertionError('translate_many should be used instead')
+
+    def translate_many(self, texts, from_lang, to_lang):
+        BatchBackend.calls.append((texts, from_lang, to_lang))
+
+        if to_lang == 'up':
+            return [text.upper() for text in texts]
+        return [text.lower() for text in texts]
+
+
+class FlakyBackend(IBackend):
+    name = "Flaky"
+    description = "Fails until fixed"
+    url = 'about:blank'
+    preference = 0
+    language_pairs = [('en', 'flaky')]
+
+    broken = True
+    calls = 0
+
+    def activate(self, config):
+        return True
+
+    def deactivate(self):
+        pass
+
+    def translate(self, text, from_lang, to_lang):
+        FlakyBackend.calls += 1
+
+        if text == 'untranslatable':
+            raise ContentException('refused')
+        if FlakyBackend.broken:
+            raise TranslationException('broken')
+        return text
+
+
+class DocumentBackend(IBackend):
+    name = "Document"
+    description = "Shouts, and counts calls to translate"
+    url = 'about:blank'
+    preference = 0
+    language_pairs = [('en', 'loud')]
+
+    texts = []
+
+    def activate(self, config):
+        return True
+
+    def deactivate(self):
+        pass
+
+    def translate(self, text, from_lang, to_lang):
+        DocumentBackend.texts.append(text)
+
+        if u'fail' in text:
+            raise TranslationException('Failed on purpose')
+
+        return text.strip().upper()
 
 
 class TestAPIv1():
@@ -150,11 +245,244 @@ exclude=Dummy')
         assert js[1]['status'] == 452
         assert js[2]['status'] == 200
 
+    def test_batch_concurrent(self):
+        views.manager.backends.append(SlowBackend())
+        views.manager.build_index()
+
+        app.config['SERVER']['batch'] = {'limit': 5, 'workers': 4,
+                                         'timeout': 0.75}
+
+        urls = ['/api/v1/translate?from=en&to=slow&text=0.5',
+                '/api/v1/translate?from=en&to=slow&text=0.3',
+                '/api/v1/translate?from=en&to=slow&text=0.4',
+                '/api/v1/translate?from=en&to=slow&text=5']
+
+        start = time.time()
+        resp = self.client.post('/api/v1/batch',
+                                data={'urls': json.dumps(urls)})
+        assert time.time() - start < 1.5
+
+        js = json.loads(resp.data)
+        assert resp.status_code == 200
+
+        # Responses stay in the order they were requested
+        assert [r['url'] for r in js] == urls
+        assert [r['data'].get('result') for r in js[:3]] == \
+            ['0.5', '0.3', '0.4']
+
+        # Last request goes past the batch deadline
+        assert js[3]['status'] == 504
+
+        # Too many requests
+        resp = self.client.post('/api/v1/batch',
+                                data={'urls': json.dumps(urls * 2)})
+        assert resp.status_code == 455
+        assert json.loads(resp.data)['details'] == {'given': 8, 'limit': 5}
+
+        app.config['SERVER']['batch'] = {'limit': 100, 'workers': 8,
+                                         'timeout': 30}
+        views.manager.disable(views.manager.find_best('en', 'slow'))
+
+    def test_pairs_etag(self):
+        resp = self.client.get('/api/v1/pairs')
+        js = json.loads(resp.data)
+
+        assert resp.status_code == 200
+        assert js['version'] == views.manager.pairs_version()
+        assert resp.headers['ETag'] == '"{0}"'.format(js['version'])
+
+        resp = self.client.get('/api/v1/pairs', headers={
+            'If-None-Match': resp.headers['ETag']})
+        assert resp.status_code == 304
+        assert resp.data == ''
+
+        resp = self.client.get('/api/v1/pairs', headers={
+            'If-None-Match': '"stale"'})
+        assert resp.status_code == 200
+
+    def test_translate_batch(self):
+        views.manager.backends.append(BatchBackend())
+        views.manager.build_index()
+
+        segments = [{'text': 'a', 'from': 'en', 'to': 'up'},
+                    {'text': 'B', 'from': 'en', 'to': 'down'},
+                    {'text': 'c', 'from': 'en', 'to': 'up'},
+                    {'text': 'c', 'from': 'en', 'to': 'nowhere'},
+                    {'from': 'en', 'to': 'up'},
+                    {'text': 'x' * 101, 'from': 'en', 'to': 'up'}]
+
+        resp = self.client.post('/api/v1/translate/batch',
+                                data=json.dumps({'segments': segments}))
+        assert resp.status_code == 200
+
+        js = json.loads(resp.data)
+        assert len(js) == len(segments)
+
+        assert [r.get('result') for r in js[:3]] == ['A', 'b', 'C']
+        assert js[0]['translator'] == 'Batch'
+        assert [r.get('code') for r in js[3:]] == [454, 452, 431]
+
+        # One call per language pair
+        assert sorted(BatchBackend.calls) == [(['B'], 'en', 'down'),
+                                              (['a', 'c'], 'en', 'up')]
+
+        resp = self.client.post('/api/v1/translate/batch',
+                                data=json.dumps({'segments': segments,
+                                                 'exclude': ['Batch']}))
+        js = json.loads(resp.data)
+        assert js[0]['code'] == 453
+
+        resp = self.client.post('/api/v1/translate/batch', data='}bad')
+        assert resp.status_code == 452
+
+        # Values that aren't strings only fail their own segment
+        bad = [{'text': 5, 'from': 'en', 'to': 'up'},
+               {'text': {'a': 'b'}, 'from': 'en', 'to': 'up'},
+               {'text': ['a'], 'from': 'en', 'to': 'up'},
+               {'text': 'a', 'from': 1, 'to': 'up'},
+               {'text': 'a', 'from': 'en', 'to': True},
+               None, 5,
+               {'text': 'd', 'from': 'en', 'to': 'up'}]
+
+        resp = self.client.post('/api/v1/translate/batch',
+                                data=json.dumps({'segments': bad}))
+        assert resp.status_code == 200
+
+        js = json.loads(resp.data)
+        assert [r.get('code') for r in js[:-1]] == [452] * 7
+        assert js[-1]['result'] == 'D'
+
+        views.manager.disable(views.manager.find_best('en', 'up'))
+
+    def test_translate_document(self):
+        views.manager.backends.append(DocumentBackend())
+        views.manager.build_index()
+
+        text = u''.join(u'S\xe9ntence {0}. '.format(i) for i in range(100))
+
+        resp = self.client.post('/api/v1/translate/document?from=en&to=loud',
+                                data=text.encode('utf-8'),
+                                content_type='text/plain')
+        assert resp.status_code == 200
+        assert resp.mimetype == 'text/plain'
+        assert resp.data.decode('utf-8') == text.upper()
+
+        # Split on sentences, under the size limit
+        assert len(DocumentBackend.texts) > 1
+        assert all(t.endswith(u'. ') and len(t.encode('utf-8')) <= 100
+                   for t in DocumentBackend.texts)
+
+        lines = [json.dumps('one'), '', json.dumps({'text': 'two'}),
+                 '{bad', json.dumps('x' * 101)]
+
+        resp = self.client.post('/api/v1/translate/document?from=en&to=loud',
+                                data='\n'.join(lines),
+                                content_type='application/x-ndjson')
+        assert resp.status_code == 200
+
+        js = [json.loads(line) for line in resp.data.splitlines()]
+        assert [r.get('result') for r in js[:2]] == ['ONE', 'TWO']
+        assert [r.get('code') for r in js[2:]] == [452, 431]
+
+        # Errors before anything has been translated get a status code
+        resp = self.client.post('/api/v1/translate/document?from=en&to=xx',
+                                data='Hello.', content_type='text/plain')
+        assert resp.status_code == 454
+
+        # Even when the document doesn't start with anything to translate
+        resp = self.client.post('/api/v1/translate/document?from=en&to=xx',
+                                data='\n\nHello.', content_type='text/plain')
+        assert resp.status_code == 454
+        assert '\0' not in resp.data
+
+        resp = self.client.post('/api/v1/translate/document?from=en&to=xx',
+                                data=json.dumps('Hello.'),
+                                content_type='application/x-ndjson')
+        assert resp.status_code == 454
+
+        resp = self.client.post('/api/v1/translate/document?from=en&to=loud',
+                                data='Hello.', content_type='image/png')
+        assert resp.status_code == 452
+
+        # Failures part way through are marked at the end of the response
+        resp = self.client.post('/api/v1/translate/document?from=en&to=loud',
+                                data=text.encode('utf-8') + 'Now fail. ' +
+                                text.encode('utf-8'),
+                                content_type='text/plain')
+        assert resp.status_code == 200
+
+        translated, error = resp.data.decode('utf-8').split(u'\0')
+        assert text.upper().startswith(translated)
+        assert json.loads(error)['code'] == 453
+
+        views.manager.disable(views.manager.find_best('en', 'loud'))
+
+    def test_circuit_breaker(self):
+        manager = views.manager
+        views.manager = BackendManager({}, breaker={'failures': 2,
+                                                    'reset': 60})
+        views.manager.backends.append(FlakyBackend())
+        views.manager.breakers['Flaky'] = CircuitBreaker('Flaky', failures=2,
+                                                         reset=60)
+        views.manager.build_index()
+
+        url = '/api/v1/translate?from=en&to=flaky&text=hi'
+
+        for i in range(3):
+            resp = self.client.get(url)
+            assert resp.status_code == 453
+
+        # The third request shouldn't have reached the backend
+        assert FlakyBackend.calls == 2
+        assert json.loads(resp.data)['details']['tried'] == []
+
+        info = json.loads(self.client.get('/api/v1/info').data)
+        flaky = [b for b in info['backends'] if b['name'] == 'Flaky'][0]
+        assert flaky['health']['state'] == 'open'
+
+        views.manager = manager
+
+    def test_content_errors(self):
+        manager = views.manager
+        views.manager = BackendManager({})
+        views.manager.backends.append(FlakyBackend())
+        views.manager.breakers['Flaky'] = CircuitBreaker('Flaky', failures=2,
+                                                         reset=60)
+        views.manager.build_index()
+
+        url = '/api/v1/translate?from=en&to=flaky&text=untranslatable'
+        calls = FlakyBackend.calls
+
+        # Texts the service refuses don't make it look broken
+        for i in range(3):
+            assert self.client.get(url).status_code == 453
+
+        assert FlakyBackend.calls == calls + 3
+        assert views.manager.breakers['Flaky'].state == CircuitBreaker.CLOSED
+
+        views.manager = manager
+
+    def test_quota_characters(self):
+        manager = views.manager
+        views.manager = BackendManager(
+            {'dummy': {'active': True,
+                       'quota': {'per': 1000, 'characters': 10}}},
+            quota={'margin': 0})
+
+        text = u'\u00e9\u00e9\u00e9'.encode('utf-8')
+        resp = self.client.get('/api/v1/translate?from=en&to=en&text=' + text)
+        assert resp.status_code == 200
+
+        # Upstream quotas count characters, not UTF-8 bytes
+        info = json.loads(self.client.get('/api/v1/info').data)
+        dummy = [b for b in info['backends'] if b['name'] == 'Dummy'][0]
+        assert dummy['quota']['characters'] == 3
+        assert dummy['quota']['max_characters'] == 10
+
+        views.manager = manager
+
     def test_ratelimit_info(self):
-        RateLimit.limit_dict = {}
-        RateLimit.enabled = True
-        RateLimit.limit = 5
-        RateLimit.per = 5
+        RateLimit.enable(limit=5, per=5)
 
         reset = time.time() + 100
         RateLimit.reset = reset
@@ -186,7 +514,6 @@ exclude=Dummy')
             '/api/v1/pairs': 4
         }
 
-        RateLimit.limit_dict = {}
         RateLimit.enabled = False
 
     def test_sizelimit(self):
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from multiprocessing import Process
+from multiprocessing.pool import ThreadPool
+
+import translate.app
+import translate.app.async_server as async_server
+
+from translate.backends.dummy import DummyBackend
+
+
+class BlockingBackend(DummyBackend):
+    cooperative = False
+
+    def translate(self, text, from_lang, to_lang):
+        return threading.current_thread().name
+
+
+def test_call_backend():
+    backend = BlockingBackend()
+    current = threading.current_thread().name
+
+    # Not running in async mode, so everything is called directly
+    assert async_server.call_backend(backend, 'translate', 'a', 'en', 'en') \
+        == current
+
+    async_server.threadpool = ThreadPool(1)
+
+    try:
+        assert async_server.call_backend(backend, 'translate', 'a', 'en',
+                                         'en') != current
+
+        dummy = DummyBackend()
+        assert async_server.call_backend(dummy, 'translate', 'a', 'en',
+                                         'en') == 'a'
+    finally:
+        async_server.threadpool.close()
+        async_server.threadpool = None
+
+
+@pytest.mark.skipif(async_server.gevent is None,
+                    reason='gevent not installed')
+def test_serve():
+    config = {
+        'SERVER': {
+            'port': 8766,
+            'async': {'enabled': True, 'connections': 10, 'threads': 2}
+        },
+        'BACKENDS': {'dummy': {'active': True}}
+    }
+
+    server = Process(target=translate.app.start_server,
+                     args=(config, False))
+    server.start()
+
+    try:
+        for _ in xrange(40):
+            time.sleep(0.25)
+            try:
+                r = requests.get('http://localhost:8766/api/v1/pairs')
+                if r.status_code == 200:
+                    break
+            except requests.exceptions.RequestException:
+                pass
+
+        assert r.status_code == 200
+        assert 'pairs' in r.json()
+
+    finally:
+        server.terminate()
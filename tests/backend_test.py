@@ -1,13 +1,50 @@
+import json
+import os
 import pytest
+import sys
+import tempfile
+import time
+import types
 
 import translate
 import translate.backend
 import translate.exceptions
+import translate.utils
+
+import tests.test_backends.test_backend
 
 mgr = None
 DEACTIVATE_WAS_CALLED = False
 
 
+class DiscoveringBackend(translate.backend.IBackend):
+    name = "Discovering"
+    description = "Counts how often its pairs are discovered"
+    url = 'example.com'
+    preference = 0
+    language_pairs = []
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+        self.discovered = 0
+
+    def activate(self, config):
+        self.config = config
+        self.language_pairs = self.load_pairs()
+
+        return len(self.language_pairs) != 0
+
+    def deactivate(self):
+        pass
+
+    def discover_pairs(self):
+        self.discovered += 1
+        return self.pairs
+
+    def translate(self, text, from_lang, to_lang):
+        return text
+
+
 def setup_module():
     global mgr
     mgr = translate.backend.BackendManager({
@@ -25,7 +62,56 @@ class TestBackendManager:
     def test_default_loads(self):
         assert len(self.mgr.backends) != 0
         modules = [m.__module__ for m in self.mgr.backends]
-        assert 'dummy' in modules
+        assert 'translate.backends.dummy' in modules
+
+    def test_registry(self):
+        from tests.test_backends.test_backend import TestBackend
+        from translate.backends.dummy import DummyBackend
+
+        assert translate.backend.find_backend('dummy') is DummyBackend
+        assert translate.backend.find_backend('no_such_backend') is None
+
+        # Backends can be named explicitly in their configuration
+        assert translate.backend.find_backend(
+            'anything',
+            {'module': 'tests.test_backends.test_backend:TestBackend'}) \
+            is TestBackend
+
+        # Inactive backends are never imported, so a missing one is fine
+        mgr = translate.backend.BackendManager({
+            'dummy': {'active': True},
+            'missing': {'active': False, 'module': 'no.such.module:Backend'},
+            'test': {'module': 'tests.test_backends.test_backend:TestBackend',
+                     'foo': 'bar', 'preference': 10}
+        })
+
+        assert mgr.find_configured() == [(DummyBackend, 'dummy'),
+                                         (TestBackend, 'test')]
+
+        # Loading the backends directory gives the same classes
+        found = translate.utils.find_subclasses('translate/backends',
+                                                translate.backend.IBackend)
+        assert (DummyBackend, 'dummy') in found
+
+        assert [b.name for b in mgr.find_all('en', 'en')] == ['Test Backend',
+                                                              'Dummy']
+
+    def test_registry_unrelated_module(self):
+        # An unrelated module of the same name isn't mistaken for a backend
+        other = types.ModuleType('slow_backend')
+        saved = sys.modules.get('slow_backend')
+        sys.modules['slow_backend'] = other
+
+        try:
+            found = translate.utils.find_subclasses(
+                'tests/test_backends', translate.backend.IBackend)
+            assert 'slow_backend' in [name for _, name in found]
+            assert sys.modules['slow_backend'] is not other
+        finally:
+            if saved is not None:
+                sys.modules['slow_backend'] = saved
+            else:
+                sys.modules.pop('slow_backend', None)
 
     def test_bad_backend(self):
         from tests.test_backends.bad_backend import BadBackend
@@ -69,6 +155,336 @@ class TestBackendManager:
         prefs = [b.preference for b in backends]
         assert sorted(prefs, reverse=True) == prefs
 
+    def test_pairs(self):
+        pairs = self.mgr.pairs()
+
+        assert ('en', 'en') in pairs
+        assert len(pairs) == len(set(pairs))
+        assert sorted(pairs) == pairs
+
+    def test_reweight(self):
+        dummy = self.mgr.find_all('en', 'en')[-1]
+        assert dummy.name == 'Dummy'
+
+        self.mgr.reweight(dummy, 2000)
+        assert self.mgr.find_best('en', 'en') is dummy
+
+        self.mgr.reweight(dummy, 0)
+        assert self.mgr.find_best('en', 'en') is not dummy
+
+    def test_disable(self):
+        mgr = translate.backend.BackendManager({'dummy': {'active': True}})
+        dummy = mgr.find_best('en', 'en')
+        assert dummy.name == 'Dummy'
+
+        mgr.disable(dummy)
+        assert dummy not in mgr.backends
+        assert mgr.find_all('en', 'en') == []
+        assert ('en', 'en') not in mgr.pairs()
+
+    def test_adaptive_ordering(self):
+        config = {'dummy': {'active': True},
+                  'test_backend': {'foo': 'bar', 'preference': 1000}}
+
+        mgr = translate.backend.BackendManager(
+            config, scoring={'alpha': 0.5, 'latency': 10, 'errors': 50,
+                             'decay': None})
+        mgr.load_backends('tests/test_backends')
+
+        test, dummy = mgr.find_all('en', 'en')
+        assert test.preference > dummy.preference
+
+        # Unused backends are ordered by preference alone
+        mgr.record(test, True, 0.1, ('en', 'en'))
+        assert mgr.find_best('en', 'en') is test
+
+        # A slow or failing backend drops below the others
+        mgr.record(test, False, 199.9, ('en', 'en'))
+        assert mgr.find_all('en', 'en') == [dummy, test]
+        assert mgr.stats.get(test, 'en', 'en') == (100.0, 0.5)
+
+        # Other pairs are unaffected
+        mgr.record(test, False, 200)
+        assert mgr.stats.get(test, 'en', 'es') is None
+
+        # Static ordering stays the default
+        mgr = translate.backend.BackendManager(config)
+        mgr.load_backends('tests/test_backends')
+        test = mgr.find_best('en', 'en')
+
+        mgr.record(test, False, 200, ('en', 'en'))
+        assert mgr.find_best('en', 'en') is test
+
+    def test_score_recovery(self):
+        from tests.test_backends.test_backend import TestBackend
+
+        stats = translate.backend.BackendStats(alpha=0.5, latency=10,
+                                               errors=50, decay=60)
+        backend = TestBackend()
+
+        stats.record(backend, 'en', 'es', False, 10, now=1000)
+        assert stats.score(backend, 'en', 'es', now=1000) == \
+            backend.preference - 150
+
+        # Left unused, it drifts back to its preference
+        assert stats.score(backend, 'en', 'es', now=1060) == \
+            backend.preference - 75
+        assert stats.get(backend, 'en', 'es', now=1060) == (5, 0.5)
+        assert stats.score(backend, 'en', 'es', now=1000 + 60 * 20) > \
+            backend.preference - 0.001
+
+        # New observations start from the decayed averages
+        stats.record(backend, 'en', 'es', True, 1, now=1060)
+        assert stats.get(backend, 'en', 'es', now=1060) == (3, 0.25)
+
+    def test_warming(self):
+        config = {'test_backend': {'foo': 'bar'},
+                  'slow_backend': {'active': True, 'delay': 0.5}}
+
+        mgr = translate.backend.BackendManager(config)
+
+        start = time.time()
+        mgr.load_backends('tests/test_backends', deadline=0.1)
+        assert time.time() - start < 0.4
+
+        # Not routed to until it's ready
+        assert mgr.find_all('en', 'slow') == []
+        assert mgr.startup()['Slow Backend'] == {'status': 'warming',
+                                                 'time': None}
+        assert mgr.startup()['Test Backend']['status'] == 'active'
+
+        time.sleep(0.7)
+
+        assert mgr.find_best('en', 'slow').name == 'Slow Backend'
+
+        startup = mgr.startup()['Slow Backend']
+        assert startup['status'] == 'active'
+        assert startup['time'] >= 0.5
+
+    def test_breaker(self):
+        mgr = translate.backend.BackendManager(
+            {'dummy': {'active': True}},
+            breaker={'failures': 2, 'reset': 0.1, 'interval': 0.1})
+        dummy = mgr.find_best('en', 'en')
+
+        assert mgr.available(dummy)
+        assert mgr.health(dummy)['state'] == 'closed'
+
+        mgr.record(dummy, False, 0)
+        assert mgr.available(dummy)
+        mgr.record(dummy, False, 0)
+        assert not mgr.available(dummy)
+        assert mgr.health(dummy)['state'] == 'open'
+
+        assert not mgr.allow(dummy)
+
+        # Half open: a single probe is let through. Checking whether it's
+        # available doesn't use the probe up.
+        time.sleep(0.15)
+        assert mgr.available(dummy)
+        assert mgr.available(dummy)
+        assert mgr.allow(dummy)
+        assert not mgr.allow(dummy)
+        assert not mgr.available(dummy)
+        assert mgr.health(dummy)['state'] == 'half-open'
+
+        # A failed probe reopens it
+        mgr.record(dummy, False, 0)
+        assert mgr.health(dummy)['state'] == 'open'
+        assert not mgr.available(dummy)
+
+        time.sleep(0.15)
+        assert mgr.available(dummy)
+        assert mgr.allow(dummy)
+        mgr.record(dummy, True, 0)
+        assert mgr.health(dummy)['state'] == 'closed'
+        assert mgr.allow(dummy)
+        assert mgr.allow(dummy)
+
+    def test_breaker_slow(self):
+        breaker = translate.backend.CircuitBreaker('foo', failures=1, slow=1)
+
+        breaker.record(True, 0.5)
+        assert breaker.allow()
+
+        breaker.record(True, 2)
+        assert not breaker.allow()
+
+    def test_quota(self):
+        path = tempfile.mktemp()
+
+        try:
+            quotas = translate.backend.QuotaTracker(path=path, margin=0.1)
+            quotas.declare('a', per=1000, requests=10)
+            quotas.declare('b', per=1000, characters=100)
+
+            # Untracked backends are always allowed
+            assert quotas.allows('c', 10 ** 9)
+
+            for i in range(9):
+                assert quotas.allows('a', 0)
+                quotas.consume('a', 0)
+            assert not quotas.allows('a', 0)
+
+            assert quotas.allows('b', 90)
+            assert not quotas.allows('b', 91)
+            quotas.consume('b', 50)
+            assert not quotas.allows('b', 41)
+
+            quotas.exhaust('b')
+            assert not quotas.allows('b', 0)
+            assert quotas.info('b')['exhausted']
+
+            # Usage survives a restart
+            quotas.save()
+            with open(path) as f:
+                assert json.load(f)['a']['requests'] == 9
+
+            quotas = translate.backend.QuotaTracker(path=path, margin=0.1)
+            quotas.declare('a', per=1000, requests=10)
+            assert quotas.info('a')['requests'] == 9
+            assert not quotas.allows('a', 0)
+
+            # ...but not past the end of the window
+            quotas.usage['a']['window'] = time.time() - 1
+            assert quotas.allows('a', 0)
+            assert quotas.info('a')['requests'] == 0
+        finally:
+            os.remove(path)
+
+    def test_pair_cache(self):
+        path = tempfile.mktemp()
+
+        try:
+            cache = translate.backend.PairCache(path)
+
+            backend = DiscoveringBackend([['en', 'es'], ('en', 'es')])
+            backend.pair_cache = cache
+
+            assert backend.activate({'key': 1})
+            assert backend.language_pairs == [('en', 'es')]
+            assert backend.discovered == 1
+            assert not cache.stale(backend)
+
+            # Read back from disk, without asking the backend again
+            backend = DiscoveringBackend([('en', 'fr')])
+            backend.pair_cache = translate.backend.PairCache(path)
+
+            assert backend.activate({'key': 1})
+            assert backend.language_pairs == [('en', 'es')]
+            assert backend.discovered == 0
+
+            # Different configuration, different pairs
+            backend.pair_cache = translate.backend.PairCache(path)
+            assert backend.activate({'key': 2})
+            assert backend.language_pairs == [('en', 'fr')]
+            assert backend.discovered == 1
+
+            # Old versions of the file are ignored
+            with open(path) as f:
+                data = json.load(f)
+
+            data['version'] -= 1
+            with open(path, 'w') as f:
+                json.dump(data, f)
+
+            assert translate.backend.PairCache(path).entries == {}
+        finally:
+            os.remove(path)
+
+    def test_pair_refresh(self):
+        path = tempfile.mktemp()
+
+        try:
+            old = DiscoveringBackend([])
+            old.config = {}
+            translate.backend.PairCache(path).set(old, [('en', 'es')])
+
+            # Every entry is immediately stale
+            mgr = translate.backend.BackendManager(
+                {}, pairs={'path': path, 'ttl': 0})
+
+            backend = DiscoveringBackend([('en', 'fr')])
+            backend.pair_cache = mgr.pair_cache
+
+            # Starts out with the cached pairs, then swaps in new ones in the
+            # background
+            mgr._activate(backend, {})
+
+            for i in range(50):
+                if mgr.find_best('en', 'fr') is backend:
+                    break
+                time.sleep(0.01)
+
+            assert mgr.find_best('en', 'fr') is backend
+            assert mgr.find_best('en', 'es') is None
+            assert mgr.pair_cache.get(backend) == [('en', 'fr')]
+
+            # A backend that can't find any pairs keeps the old ones
+            backend.pairs = []
+            assert not mgr.refresh(backend)
+            assert mgr.find_best('en', 'fr') is backend
+        finally:
+            os.remove(path)
+
+    def test_pairs_version(self):
+        mgr = translate.backend.BackendManager({'dummy': {'active': True}})
+        dummy = mgr.find_best('en', 'en')
+
+        version = mgr.pairs_version()
+
+        # Same pairs, same version
+        mgr.build_index()
+        assert mgr.pairs_version() == version
+
+        dummy.language_pairs = [('en', 'en'), ('en', 'es')]
+        mgr.build_index()
+        assert mgr.pairs_version() != version
+
+    def test_periodic_refresh(self):
+        mgr = translate.backend.BackendManager({})
+
+        backend = DiscoveringBackend([('en', 'es')])
+        mgr._activate(backend, {})
+
+        version = mgr.pairs_version()
+        backend.pairs = [('en', 'fr')]
+
+        thread = mgr.start_refresh(0.05, jitter=0.5)
+
+        for i in range(50):
+            if mgr.find_best('en', 'fr') is backend:
+                break
+            time.sleep(0.02)
+
+        assert mgr.find_best('en', 'fr') is backend
+        assert mgr.find_best('en', 'es') is None
+        assert mgr.pairs_version() != version
+
+        # Backends with fixed pairs are left alone
+        assert translate.backend.discovers_pairs(backend)
+        assert not translate.backend.discovers_pairs(
+            tests.test_backends.test_backend.TestBackend())
+
+        mgr.shutdown()
+        thread.join(1)
+        assert not thread.is_alive()
+
+    def test_manager_quota(self):
+        mgr = translate.backend.BackendManager(
+            {'dummy': {'active': True,
+                       'quota': {'per': 1000, 'characters': 10}}},
+            quota={'margin': 0})
+        dummy = mgr.find_best('en', 'en')
+
+        assert mgr.available(dummy, 10)
+        mgr.record(dummy, True, 0, size=6)
+        assert not mgr.available(dummy, 5)
+        assert mgr.quota(dummy)['characters'] == 6
+
+        mgr.exhaust(dummy)
+        assert not mgr.available(dummy, 0)
+
     def test_raise_bad_data(self):
         """Make sure all backends fail on bad input"""
 
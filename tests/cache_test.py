@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import tempfile
+import time
+
+from translate.app import app, views
+from translate.app.cache import TranslationCache
+from translate.backend import BackendManager
+
+
+class TestTranslationCache():
+
+    def test_key(self):
+        key = TranslationCache.key
+
+        assert key(u'foo', 'en', 'es') == key(u'foo', 'en', 'es', [])
+        assert key(u'foo', 'en', 'es') != key(u'foo', 'es', 'en')
+        assert key(u'foo', 'en', 'es', ['a', 'b']) == \
+            key(u'foo', 'en', 'es', ['b', 'a', 'a'])
+        assert key(u'foo', 'en', 'es') != key(u'foo', 'en', 'es', ['a'])
+
+        # Composed and decomposed forms should share a key
+        assert key(u'café', 'fr', 'en') == key(u'café', 'fr', 'en')
+
+    def test_hit_miss(self):
+        cache = TranslationCache()
+
+        assert cache.get('foo') is None
+        cache.set('foo', {'result': 'bar'})
+        assert cache.get('foo') == {'result': 'bar'}
+
+        info = cache.info()
+        assert info['hits'] == 1
+        assert info['misses'] == 1
+        assert info['entries'] == 1
+
+    def test_lru_entries(self):
+        cache = TranslationCache(entries=2)
+
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_lru_size(self):
+        cache = TranslationCache(size=10)
+
+        cache.set('a', 'xxxx')
+        cache.set('b', 'yyyy')
+        assert cache.get('a') is None
+        assert cache.get('b') == 'yyyy'
+        assert cache.info()['size'] <= 10
+
+        # Too large to ever cache
+        cache.set('c', 'z' * 20)
+        assert cache.get('c') is None
+        assert cache.get('b') == 'yyyy'
+
+    def test_ttl(self):
+        cache = TranslationCache(ttl=0.1)
+
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+
+        time.sleep(0.2)
+        assert cache.get('a') is None
+        assert cache.info()['entries'] == 0
+
+    def test_disk_store(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        try:
+            first = TranslationCache(path=path)
+            second = TranslationCache(path=path)
+
+            first.set('a', {'result': u'é'})
+            assert second.get('a') == {'result': u'é'}
+            assert second.info()['entries'] == 1
+
+        finally:
+            os.remove(path)
+
+
+class TestCacheAPI():
+
+    def setup_class(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+
+        # Make sure the app is initialized before replacing anything.
+        self.client.get('/api/v1/info')
+
+        views.manager = BackendManager({'dummy': {'active': True}})
+        views.cache = TranslationCache()
+
+    def teardown_class(self):
+        views.cache = None
+
+    def test_cached_translation(self):
+        url = '/api/v1/translate?from=en&to=en&text=hello'
+
+        first = self.client.get(url)
+        second = self.client.get(url)
+
+        assert first.status_code == second.status_code == 200
+        assert json.loads(first.data) == json.loads(second.data)
+
+        js = json.loads(self.client.get('/api/v1/info').data)
+        assert js['cache']['hits'] == 1
+        assert js['cache']['misses'] == 1
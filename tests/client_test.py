@@ -9,6 +9,7 @@ import pytest
 import json
 
 from multiprocessing import Process
+from multiprocessing.pool import ThreadPool
 
 
 class ResponseTester():
@@ -140,6 +141,11 @@ class TestClient():
         assert self.client.language_pairs() == [('en', 'en')]
         assert self.client._pairs == [('en', 'en')]
         assert self.client.language_pairs(True) == [('en', 'en')]
+        assert self.client._pairs_version is not None
+
+        # Revalidated, rather than downloaded again
+        pairs = self.client._pairs
+        assert self.client.language_pairs(True) is pairs
 
     def test_translators(self):
         trans = self.client.translators()
@@ -160,6 +166,41 @@ class TestClient():
         with pytest.raises(translate.client.exceptions.TranslateException):
             self.client.translate('bad', 'arguments', 'here')
 
+    def test_context_manager(self):
+        with translate.client.Client('localhost', port=8765,
+                                     max_connections=2) as client:
+            assert client.can_translate('en', 'en')
+
+    def test_shared_between_threads(self):
+        pool = ThreadPool(4)
+
+        texts = ['text %d' % i for i in range(20)]
+        results = pool.map(lambda t: self.client.translate(t, 'en', 'en'),
+                           texts)
+        pool.close()
+
+        assert results == texts
+
+    def test_async_client(self):
+        with translate.client.AsyncClient('localhost', port=8765,
+                                          max_concurrency=3) as client:
+            assert client.can_translate('en', 'en').get()
+            assert client.language_pairs().get() == [('en', 'en')]
+            assert client.info().get().sizelimit == 987
+            assert client.translate('hello', 'en', 'en').get() == 'hello'
+
+            bad = client.translate('bad', 'arguments', 'here')
+            with pytest.raises(tce.TranslateException):
+                bad.get()
+
+            # Larger than the sizelimit, so split into multiple requests
+            texts = ['a', 'b' * 2000, 'c']
+            result = client.translate_many(texts, 'en', 'en')
+
+            assert len(result.results) == 5
+            assert result.get() == texts
+            assert result.ready() and result.successful()
+
     def test_batch_translate(self):
         results = self.client.batch_translate([('good', 'en', 'en'),
                                                ('bad', 'foo', 'bar'),
@@ -215,6 +256,11 @@ class TestClient():
         assert text == self.client.translate(text, 'en', 'en',
                                              split_text=True)
 
+        # Split on sentences, by size in bytes rather than characters
+        text = u'\xe9t\xe9 chaud. ' * 60
+
+        assert text == self.client.translate(text, 'en', 'en')
+
     def teardown_class(self):
         if self.thread.is_alive():
             self.thread.terminate()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from translate.app.hedge import Hedger
+from translate.exceptions import TranslationException
+
+
+class FakeBackend(object):
+
+    def __init__(self, name, delay=0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+
+    def translate(self, text, from_lang, to_lang):
+        time.sleep(self.delay)
+
+        if self.fail:
+            raise TranslationException('{0} failed'.format(self.name))
+
+        return u'{0}: {1}'.format(self.name, text)
+
+
+class TestHedger():
+
+    def setup_method(self, method):
+        self.hedger = Hedger(delay=0.1, workers=4)
+
+    def teardown_method(self, method):
+        self.hedger.close()
+
+    def test_fast_first(self):
+        tried = []
+        backends = [FakeBackend('a'), FakeBackend('b')]
+
+        backend, trans = self.hedger.translate(backends, u'hi', 'en', 'es',
+                                               tried)
+
+        assert backend.name == 'a'
+        assert trans == u'a: hi'
+        assert tried == ['a']
+
+    def test_hedges_slow_backend(self):
+        tried = []
+        backends = [FakeBackend('slow', delay=1), FakeBackend('fast')]
+
+        start = time.time()
+        backend, trans = self.hedger.translate(backends, u'hi', 'en', 'es',
+                                               tried)
+
+        assert backend.name == 'fast'
+        assert time.time() - start < 0.5
+        assert tried == ['slow', 'fast']
+
+    def test_failure_falls_through(self):
+        tried = []
+        backends = [FakeBackend('bad', fail=True), FakeBackend('good')]
+
+        backend, trans = self.hedger.translate(backends, u'hi', 'en', 'es',
+                                               tried)
+
+        assert backend.name == 'good'
+        assert tried == ['bad', 'good']
+
+    def test_all_fail(self):
+        tried = []
+        backends = [FakeBackend('a', fail=True), FakeBackend('b', fail=True)]
+
+        with pytest.raises(TranslationException):
+            self.hedger.translate(backends, u'hi', 'en', 'es', tried)
+
+        assert tried == ['a', 'b']
+
+    def test_admit(self):
+        tried = []
+        backends = [FakeBackend('a'), FakeBackend('b'), FakeBackend('c')]
+
+        backend, trans = self.hedger.translate(
+            backends, u'hi', 'en', 'es', tried,
+            admit=lambda backend: backend.name != 'a')
+
+        # Backends that aren't admitted are never started
+        assert backend.name == 'b'
+        assert tried == ['b']
+
+        with pytest.raises(TranslationException):
+            self.hedger.translate(backends, u'hi', 'en', 'es', [],
+                                  admit=lambda backend: False)
+
+    def test_percentile_delay(self):
+        hedger = Hedger(delay=5, workers=4, percentile=90)
+
+        try:
+            fast = FakeBackend('fast')
+            slow = FakeBackend('slow', delay=1)
+
+            # Not enough observations yet
+            assert hedger.delay_for(fast) == 5
+
+            for i in range(20):
+                hedger.observe(fast, 0.001 * (i + 1))
+
+            assert hedger.delay_for(fast) == pytest.approx(0.018)
+            assert hedger.delay_for(slow) == 5
+
+            # Hedged as soon as it's slower than usual, not after 5 seconds
+            fast.delay = 1
+            start = time.time()
+
+            backend, trans = hedger.translate([fast, FakeBackend('b')], u'hi',
+                                              'en', 'es', [])
+
+            assert backend.name == 'b'
+            assert time.time() - start < 0.5
+        finally:
+            hedger.close()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import StringIO
+import tempfile
+
+from translate.app import app, views
+from translate.app.memory import TranslationMemory, ngrams
+from translate.backend import BackendManager
+
+
+TMX = '''<?xml version="1.0" encoding="UTF-8"?>
+<tmx version="1.4">
+  <header creationtool="test" creationtoolversion="1" datatype="plaintext"
+          segtype="sentence" adminlang="en" srclang="en" o-tmf="test"/>
+  <body>
+    <tu creationid="Human" creationdate="20150102T030405Z">
+      <tuv xml:lang="es"><seg>Hola, mundo.</seg></tuv>
+      <tuv xml:lang="en"><seg>Hi, <bpt i="1">&lt;b&gt;</bpt>world.</seg></tuv>
+      <tuv xml:lang="fr"><seg>Bonjour, monde.</seg></tuv>
+    </tu>
+    <tu>
+      <tuv xml:lang="en"><seg>Goodbye &amp; thanks</seg></tuv>
+      <tuv xml:lang="es"><seg>Adiós y gracias</seg></tuv>
+    </tu>
+  </body>
+</tmx>
+'''
+
+
+def temp_path():
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+
+    return path
+
+
+class TestTranslationMemory():
+
+    def setup_method(self, method):
+        self.path = temp_path()
+        self.memory = TranslationMemory(self.path, threshold=0.8)
+
+    def teardown_method(self, method):
+        os.remove(self.path)
+
+    def test_ngrams(self):
+        assert ngrams(u'ab') == set([u' ab', u'ab '])
+        assert ngrams(u'A  b') == ngrams(u'a b ')
+
+    def test_exact(self):
+        memory = self.memory
+
+        assert memory.lookup(u'Hello there.', 'en', 'es') is None
+
+        memory.add(u'Hello there. ', 'en', 'es', u'Hola.', 'Dummy')
+
+        match = memory.lookup(u' Hello there.', 'en', 'es')
+        assert match['translation'] == u'Hola.'
+        assert match['backend'] == 'Dummy'
+        assert match['score'] == 1
+
+        assert memory.lookup(u'Hello there.', 'en', 'fr') is None
+        assert memory.lookup(u'Hello there.', 'en', 'es', ['Dummy']) is None
+
+        # Replaces the earlier translation
+        memory.add(u'Hello there.', 'en', 'es', u'Hola allí.', 'Other')
+        assert memory.lookup(u'Hello there.', 'en', 'es')['backend'] == \
+            'Other'
+
+        info = memory.info()
+        assert info['segments'] == 1
+        assert info['hits'] == 2
+        assert info['misses'] == 3
+
+    def test_fuzzy(self):
+        memory = self.memory
+
+        memory.add(u'The quick brown fox jumps over the lazy dog.', 'en',
+                   'es', u'El rápido zorro marrón...', 'Dummy')
+        memory.add(u'Something else entirely.', 'en', 'es', u'Otra cosa.',
+                   'Dummy')
+
+        match = memory.lookup(u'The quick brown fox jumped over the lazy dog',
+                              'en', 'es')
+        assert match['translation'] == u'El rápido zorro marrón...'
+        assert 0.8 <= match['score'] < 1
+
+        assert memory.lookup(u'The slow red fox', 'en', 'es') is None
+        assert memory.info()['fuzzy_hits'] == 1
+
+        # Exact matches only
+        exact = TranslationMemory(self.path)
+        assert exact.lookup(u'The quick brown fox jumped over the lazy dog',
+                            'en', 'es') is None
+
+    def test_shared(self):
+        self.memory.add(u'a', 'en', 'es', u'b', 'Dummy')
+
+        other = TranslationMemory(self.path)
+        assert other.lookup(u'a', 'en', 'es')['translation'] == u'b'
+
+    def test_tmx(self):
+        memory = self.memory
+
+        assert memory.import_tmx(StringIO.StringIO(TMX)) == 3
+
+        match = memory.lookup(u'Hi, <b>world.', 'en', 'fr')
+        assert match['translation'] == u'Bonjour, monde.'
+        assert match['backend'] == 'Human'
+        assert match['created'] == 1420167845
+
+        match = memory.lookup(u'Goodbye & thanks', 'en', 'es')
+        assert match['translation'] == u'Adiós y gracias'
+        assert match['backend'] == 'TMX'
+
+        out = StringIO.StringIO()
+        assert memory.export_tmx(out, from_lang='en', to_lang='es') == 2
+
+        path = temp_path()
+
+        try:
+            copy = TranslationMemory(path)
+            assert copy.import_tmx(StringIO.StringIO(out.getvalue())) == 2
+
+            copied = copy.lookup(u'Goodbye & thanks', 'en', 'es')
+            assert copied['translation'] == match['translation']
+            assert copied['backend'] == match['backend']
+
+            # TMX only keeps whole seconds
+            assert copied['created'] == int(match['created'])
+        finally:
+            os.remove(path)
+
+
+class TestMemoryAPI():
+
+    def setup_class(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+
+        # Make sure the app is initialized before replacing anything.
+        self.client.get('/api/v1/info')
+
+        self.path = temp_path()
+
+        views.manager = BackendManager({'dummy': {'active': True}})
+        views.memory = TranslationMemory(self.path)
+        views.cache = None
+
+    def teardown_class(self):
+        views.memory = None
+        os.remove(self.path)
+
+    def test_translate(self):
+        url = '/api/v1/translate?from=en&to=en&text=hello'
+
+        first = json.loads(self.client.get(url).data)
+        second = json.loads(self.client.get(url).data)
+
+        assert first['origin'] == 'backend'
+        assert second['origin'] == 'memory'
+        assert second['match'] == 1
+        assert first['result'] == second['result']
+        assert first['translator'] == second['translator']
+
+        segments = [{'text': 'hello', 'from': 'en', 'to': 'en'},
+                    {'text': 'there', 'from': 'en', 'to': 'en'}]
+
+        js = json.loads(self.client.post(
+            '/api/v1/translate/batch',
+            data=json.dumps({'segments': segments})).data)
+
+        assert [r['origin'] for r in js] == ['memory', 'backend']
+
+        js = json.loads(self.client.get('/api/v1/info').data)
+        assert js['memory']['segments'] == 2
+        assert js['memory']['hits'] == 2
@@ -1,14 +1,248 @@
 # -*- coding: utf-8 -*-
 
 import json
+import multiprocessing
+import os
+import SocketServer
+import sys
+import tempfile
+import threading
 import time
 
 from translate.app import app
 from translate.app import views
-from translate.app.ratelimit import RateLimit
+from translate.app.ratelimit import (MemoryStore, RateLimit, RedisStore,
+                                     SharedStore)
 from translate.backend import BackendManager
 
 
+class FakeRedisHandler(SocketServer.StreamRequestHandler):
+    """Speaks just enough of the Redis protocol for RedisStore."""
+
+    def handle(self):
+        data = self.server.data
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+
+            args = []
+            for _ in xrange(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+
+            command = args[0].upper()
+
+            with self.server.lock:
+                if command == 'INCRBY':
+                    data[args[1]] = data.get(args[1], 0) + int(args[2])
+                    reply = ':{0}\r\n'.format(data[args[1]])
+                elif command == 'EXPIREAT':
+                    self.server.expiries[args[1]] = int(args[2])
+                    reply = ':1\r\n'
+                elif command == 'EVAL':
+                    # Only RedisStore.TAKE_SCRIPT is supported
+                    capacity, rate, now, amount = map(float, args[4:8])
+                    tokens, updated = data.get(args[3], (capacity, now))
+
+                    tokens = min(capacity, tokens + (now - updated) * rate)
+                    taken = 1 if tokens >= amount else 0
+                    tokens -= taken * amount
+
+                    data[args[3]] = (tokens, now)
+                    reply = '*2\r\n:{0}\r\n${1}\r\n{2}\r\n'.format(
+                        taken, len(repr(tokens)), repr(tokens))
+                elif command == 'HMGET':
+                    if args[1] in data:
+                        values = map(repr, data[args[1]])
+                        reply = '*2\r\n' + ''.join(
+                            '${0}\r\n{1}\r\n'.format(len(v), v)
+                            for v in values)
+                    else:
+                        reply = '*2\r\n$-1\r\n$-1\r\n'
+                elif command == 'GET':
+                    if args[1] in data:
+                        value = str(data[args[1]])
+                        reply = '${0}\r\n{1}\r\n'.format(len(value), value)
+                    else:
+                        reply = '$-1\r\n'
+                else:
+                    reply = '-ERR unknown command\r\n'
+
+            self.wfile.write(reply)
+
+
+class FakeRedis(SocketServer.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        SocketServer.ThreadingTCPServer.__init__(self, ('127.0.0.1', 0),
+                                                 FakeRedisHandler)
+        self.data = {}
+        self.expiries = {}
+        self.lock = threading.Lock()
+
+
+def hammer(store, name, window, times):
+    for _ in xrange(times):
+        store.incr(name, window, window)
+
+
+def check_store(store):
+    assert store.get('a', 10) == 0
+    assert store.incr('a', 10, 10) == 1
+    assert store.incr('a', 10, 10) == 2
+    assert store.incr('e', 10, 10, 500) == 500
+    assert store.incr('e', 10, 10, 20) == 520
+    assert store.incr('b', 10, 10) == 1
+    assert store.get('a', 10) == 2
+
+    # Counts start over in a new window
+    assert store.incr('a', 20, 20) == 1
+    assert store.get('a', 20) == 1
+
+    # Concurrent updates aren't lost
+    threads = [threading.Thread(target=hammer, args=(store, 'c', 30, 100))
+               for _ in xrange(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert store.get('c', 30) == 400
+
+
+def check_buckets(store):
+    # 2 tokens, refilling at 1 per second
+    assert store.peek('a', 2, 1.0, 100) == 2
+    assert store.take('a', 2, 1.0, 100) == (True, 1)
+    assert store.take('a', 2, 1.0, 100) == (True, 0)
+    assert store.take('a', 2, 1.0, 100.5) == (False, 0.5)
+    assert store.peek('a', 2, 1.0, 100.5) == 0.5
+    assert store.take('a', 2, 1.0, 101) == (True, 0)
+
+    # Never refills past the capacity
+    assert store.take('a', 2, 1.0, 200) == (True, 1)
+    assert store.take('b', 2, 1.0, 200) == (True, 1)
+
+    # Several tokens at once, or none at all
+    assert store.take('c', 10, 1.0, 300, 8) == (True, 2)
+    assert store.take('c', 10, 1.0, 300, 3) == (False, 2)
+    assert store.take('c', 10, 1.0, 301, 3) == (True, 0)
+
+
+def check_windows(store):
+    # Counters with different periods can share a stripe without resetting
+    # each other.
+    now = time.time()
+    minute = (now // 60) * 60 + 60
+    day = (now // 86400) * 86400 + 86400
+
+    for i in xrange(3):
+        assert store.incr('requests', minute, minute) == i + 1
+        assert store.incr('bytes', day, day, 100) == (i + 1) * 100
+
+    assert store.get('requests', minute) == 3
+    assert store.get('bytes', day) == 300
+
+
+class TestStores():
+
+    def test_memory(self):
+        check_store(MemoryStore())
+        check_buckets(MemoryStore())
+
+    def test_memory_windows(self):
+        check_windows(MemoryStore(stripes=1))
+
+        # Expired counters are dropped once a stripe fills up
+        store = MemoryStore(stripes=1)
+        for i in xrange(MemoryStore.SWEEP):
+            store.incr(str(i), 10, 10)
+
+        check_windows(store)
+        assert len(store.stripes[0]) == 2
+
+    def test_memory_expiry(self):
+        store = MemoryStore(stripes=1)
+        buckets, heap = store.buckets[0]
+
+        for i in xrange(100):
+            store.take(str(i), 10, 1.0, 0)
+
+        assert len(buckets) == 100
+
+        # Buckets are only dropped once they're full again
+        store.take('x', 10, 1.0, 0.5)
+        assert len(buckets) == 101
+
+        store.take('x', 10, 1.0, 1)
+        assert buckets.keys() == ['x']
+        assert len(heap) == 1
+
+    def test_shared(self):
+        path = tempfile.mktemp()
+
+        try:
+            check_store(SharedStore(path))
+            check_buckets(SharedStore(path + '-buckets'))
+
+            # Separate processes see the same counts
+            store = SharedStore(path)
+            procs = [multiprocessing.Process(target=hammer,
+                                             args=(store, 'd', 40, 100))
+                     for _ in xrange(4)]
+            # Don't let the children write out our buffered output again
+            sys.stdout.flush()
+
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+
+            assert SharedStore(path).get('d', 40) == 400
+        finally:
+            os.remove(path)
+            os.remove(path + '-buckets')
+
+    def test_shared_windows(self):
+        path = tempfile.mktemp()
+
+        try:
+            check_windows(SharedStore(path, slots=2, stripes=1))
+        finally:
+            os.remove(path)
+
+    def test_shared_full(self):
+        path = tempfile.mktemp()
+
+        try:
+            store = SharedStore(path, slots=4, stripes=1)
+
+            for name in 'abcdef':
+                assert store.incr(name, 10, 10) == 1
+        finally:
+            os.remove(path)
+
+    def test_redis(self):
+        server = FakeRedis()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        try:
+            host, port = server.server_address
+            check_store(RedisStore(host=host, port=port))
+            check_buckets(RedisStore(host=host, port=port, prefix='b'))
+
+            assert server.expiries.values()[0] in [11, 21, 31]
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
 class TestRateLimit():
 
     reset = 0
@@ -32,7 +266,6 @@ class TestRateLimit():
 
     def teardown_class(self):
         RateLimit.enabled = False
-        RateLimit.limit_dict = {}
 
     def test_returns_limit_headers(self):
         for path in ['/api/v1/pairs',
@@ -138,10 +371,191 @@ class TestRateLimit():
 
         assert len(js) == len(urls)
 
-        for i in xrange(RateLimit.limit):
-            rem = int(js[i]['headers']['X-RateLimit-Remaining'])
+        # Batched requests run concurrently, so which one ends up being
+        # limited isn't fixed, but every request gets its own place in the
+        # window.
+        statuses = [r['status'] for r in js]
+        assert statuses.count(200) == RateLimit.limit
+        assert statuses.count(429) == 1
+
+        remaining = sorted(int(r['headers']['X-RateLimit-Remaining'])
+                           for r in js if r['status'] == 200)
+        assert remaining == range(RateLimit.limit)
+
+
+class TestTokenBucket():
+
+    def setup_class(self):
+        views.manager = BackendManager({'dummy': {'enabled': True}})
+        app.config['TESTING'] = True
+
+        RateLimit.enable(limit=5, per=10, strategy='bucket',
+                         endpoints={'/api/v1/translate': {'limit': 2,
+                                                          'per': 10}},
+                         api_keys={'secret': {'limit': 3, 'per': 10}})
 
-            assert rem == RateLimit.limit - (i + 1)
-            assert js[i]['status'] == 200
+        self.client = app.test_client()
+
+    def teardown_class(self):
+        RateLimit.enable(limit=5, per=1)
+        RateLimit.enabled = False
+
+    def test_headers(self):
+        for i in xrange(5):
+            start = time.time()
+            resp = self.client.get('/api/v1/pairs')
+            assert resp.status_code == 200
 
-        assert js[RateLimit.limit]['status'] == 429
+            # Tokens trickle back in while the test runs, so allow a little
+            # leeway.
+            assert int(resp.headers['X-RateLimit-Remaining']) in [4 - i,
+                                                                  5 - i]
+            assert int(resp.headers['X-RateLimit-Limit']) == 5
+            assert int(resp.headers['X-RateLimit-Duration']) == 10
+
+            # Each request used takes 2 seconds to refill (the header is
+            # rounded to hundredths of a second)
+            reset = float(resp.headers['X-RateLimit-Reset'])
+            assert start + 2 * (i + 1) - 0.5 <= reset <= \
+                time.time() + 2 * (i + 1) + 0.01
+
+        resp = self.client.get('/api/v1/pairs')
+        assert resp.status_code == 429
+        assert int(resp.headers['X-RateLimit-Remaining']) == 0
+
+    def test_endpoint_limit(self):
+        for i in xrange(2):
+            resp = self.client.get('/api/v1/translate')
+            assert resp.status_code == 452
+            assert int(resp.headers['X-RateLimit-Limit']) == 2
+
+        assert self.client.get('/api/v1/translate').status_code == 429
+
+    def test_api_key(self):
+        headers = {'X-API-Key': 'secret'}
+
+        for i in xrange(3):
+            resp = self.client.get('/api/v1/pairs', headers=headers)
+            assert resp.status_code == 200
+            assert int(resp.headers['X-RateLimit-Limit']) == 3
+
+            # /info reports the key's own limit and usage
+            info = json.loads(self.client.get('/api/v1/info',
+                                              headers=headers).data)
+            assert info['ratelimit']['limit'] == 3
+            assert info['ratelimit']['methods']['/api/v1/pairs'] == \
+                int(resp.headers['X-RateLimit-Remaining'])
+
+        resp = self.client.get('/api/v1/pairs', headers=headers)
+        assert resp.status_code == 429
+
+        # Unknown keys get the usual limit
+        resp = self.client.get('/api/v1/info',
+                               headers={'X-API-Key': 'wrong'})
+        assert RateLimit.limits('/api/v1/pairs', 'wrong') == (5, 10)
+
+
+class TestByteQuota():
+
+    def setup_class(self):
+        views.manager = BackendManager({'dummy': {'active': True}})
+        app.config['TESTING'] = True
+
+        RateLimit.enable(limit=100, per=1000, byte_quota={'limit': 10,
+                                                          'per': 1000})
+
+        self.client = app.test_client()
+
+    def teardown_class(self):
+        RateLimit.enable(limit=5, per=1)
+        RateLimit.enabled = False
+
+    def test_byte_quota(self):
+        url = '/api/v1/translate?from=en&to=en&text='
+
+        resp = self.client.get(url + 'abcdef')
+        assert resp.status_code == 200
+        assert int(resp.headers['X-RateLimit-Bytes-Remaining']) == 4
+        assert int(resp.headers['X-RateLimit-Bytes-Limit']) == 10
+        assert int(resp.headers['X-RateLimit-Bytes-Duration']) == 1000
+
+        # Charged by UTF-8 bytes, not characters
+        resp = self.client.get(url + u'\u00e9\u00e9\u00e9'.encode('utf-8'))
+        assert resp.status_code == 429
+        js = json.loads(resp.data)
+        assert js['details']['size'] == 6
+        assert js['details']['limit'] == 10
+
+        # The rejected text wasn't charged
+        info = json.loads(self.client.get('/api/v1/info').data)
+        assert info['ratelimit']['bytes'] == {'limit': 10, 'per': 1000,
+                                              'remaining': 4}
+
+    def test_with_request_limit(self):
+        # The byte quota has a different period from the request limit, and
+        # the two share a stripe here, so each must keep its own count.
+        RateLimit.enable(limit=5, per=60, byte_quota={'limit': 10 ** 6,
+                                                      'per': 86400},
+                         store=MemoryStore(stripes=1))
+
+        codes = [self.client.get('/api/v1/translate?from=en&to=en&text={0}'
+                                 .format(i)).status_code
+                 for i in xrange(20)]
+
+        assert codes == [200] * 5 + [429] * 15
+
+        resp = self.client.get('/api/v1/info')
+        assert json.loads(resp.data)['ratelimit']['bytes']['remaining'] == \
+            10 ** 6 - 5
+
+    def test_batch_items(self):
+        segments = [{'text': 'abcd', 'from': 'en', 'to': 'en'},
+                    {'text': 'abcdefgh', 'from': 'en', 'to': 'en'},
+                    {'text': 'abcdef', 'from': 'en', 'to': 'en'}]
+
+        for strategy in ['fixed', 'bucket']:
+            RateLimit.enable(limit=100, per=1000,
+                             byte_quota={'limit': 10, 'per': 1000},
+                             strategy=strategy)
+
+            resp = self.client.post('/api/v1/translate/batch',
+                                    data=json.dumps({'segments': segments}))
+            js = json.loads(resp.data)
+
+            # The second item doesn't fit, but the third still does
+            assert [r.get('code') for r in js] == [None, 429, None]
+            assert int(resp.headers['X-RateLimit-Bytes-Remaining']) == 0
+
+    def test_rejected_not_charged(self):
+        RateLimit.enable(limit=100, per=1000, byte_quota={'limit': 10,
+                                                          'per': 1000})
+        url = '/api/v1/translate?from=en&to=en&text='
+
+        assert self.client.get(url + 'a' * 11).status_code == 429
+        resp = self.client.get(url + 'abcd')
+        assert resp.status_code == 200
+        assert int(resp.headers['X-RateLimit-Bytes-Remaining']) == 6
+
+    def test_api_key(self):
+        RateLimit.enable(limit=100, per=1000,
+                         byte_quota={'limit': 100, 'per': 1000},
+                         api_keys={'secret': {'limit': 3, 'per': 1000,
+                                              'bytes': {'limit': 20,
+                                                        'per': 500}}})
+        headers = {'X-API-Key': 'secret'}
+
+        resp = self.client.get('/api/v1/translate?from=en&to=en&text=abcdef',
+                               headers=headers)
+        assert resp.status_code == 200
+        assert int(resp.headers['X-RateLimit-Bytes-Remaining']) == 14
+        assert int(resp.headers['X-RateLimit-Bytes-Limit']) == 20
+
+        info = json.loads(self.client.get('/api/v1/info',
+                                          headers=headers).data)
+        assert info['ratelimit']['bytes'] == {'limit': 20, 'per': 500,
+                                              'remaining': 14}
+
+        # Without the key, the client has its own quota
+        info = json.loads(self.client.get('/api/v1/info').data)
+        assert info['ratelimit']['bytes'] == {'limit': 100, 'per': 1000,
+                                              'remaining': 100}
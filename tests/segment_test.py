@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from translate import segment
+
+
+def check(text, limit):
+    chunks = list(segment.segment(text, limit))
+
+    assert u''.join(chunks) == text
+    assert all(len(c.encode('utf-8')) <= limit for c in chunks)
+
+    return chunks
+
+
+class TestSegment():
+
+    def test_small(self):
+        assert check(u'Hello there.', 100) == [u'Hello there.']
+        assert check(u'', 100) == []
+
+    def test_sentences(self):
+        text = u'One two three. Four five six! Seven eight? Nine ten.'
+
+        assert check(text, 32) == [u'One two three. Four five six! ',
+                                   u'Seven eight? Nine ten.']
+
+    def test_quotes(self):
+        text = u'He said "stop." Then he left the room.'
+
+        assert check(text, 30)[0] == u'He said "stop." '
+
+    def test_newlines(self):
+        text = u'First line\nsecond line\n\nthird line'
+
+        assert check(text, 25) == [u'First line\nsecond line\n\n',
+                                   u'third line']
+
+    def test_clauses(self):
+        text = u'Alpha beta gamma, delta epsilon zeta eta theta'
+
+        assert check(text, 30)[0] == u'Alpha beta gamma, '
+
+    def test_words(self):
+        text = u'lorem ipsum dolor sit amet consectetur'
+
+        assert check(text, 20) == [u'lorem ipsum dolor ',
+                                   u'sit amet consectetur']
+
+    def test_long_word(self):
+        assert check(u'a' * 25, 10) == [u'a' * 10, u'a' * 10, u'a' * 5]
+
+    def test_multibyte(self):
+        # Two, three and four byte characters
+        for char in [u'\xe9', u'日', u'\U0001f600']:
+            text = (char * 7 + u' ') * 20
+            check(text, 16)
+
+        # Never split a character in half
+        chunks = check(u'日' * 10, 8)
+        assert chunks == [u'日' * 2] * 5
+
+    def test_cjk(self):
+        text = u'今日は。晴れです。'
+
+        assert check(text, 15) == [u'今日は。',
+                                   u'晴れです。']
+
+    def test_iterable(self):
+        text = u'The quick brown fox. Jumps over the lazy dog. ' * 50
+        pieces = (text[i:i + 7] for i in range(0, len(text), 7))
+
+        assert list(segment.segment(pieces, 64)) == check(text, 64)
+
+    def test_lazy(self):
+        def pieces():
+            yield u'Some sentence here. ' * 10
+            raise AssertionError('Read too far')
+
+        chunks = segment.segment(pieces(), 50)
+        assert next(chunks) == u'Some sentence here. ' * 2
+
+    def test_bad_limit(self):
+        with pytest.raises(ValueError):
+            list(segment.segment(u'text', 3))
+
+    def test_join(self):
+        chunks = [u'One. ', u'Two.\n\n', u'Three.']
+
+        assert segment.join(chunks, [u'Uno.', u'Dos.', u'Tres.']) == \
+            u'Uno. Dos.\n\nTres.'
+        assert segment.join(chunks, [u'Uno. ', u'Dos.\n\n', u'Tres.']) == \
+            u'Uno. Dos.\n\nTres.'
@@ -0,0 +1,21 @@
+import time
+
+import translate.backend
+
+
+class SlowBackend(translate.backend.IBackend):
+    name = "Slow Backend"
+    description = "Takes a while to activate"
+    url = 'example.com'
+    preference = 0
+    language_pairs = [('en', 'slow')]
+
+    def activate(self, config):
+        time.sleep(config.get('delay', 0))
+        return config.get('active', False)
+
+    def deactivate(self):
+        pass
+
+    def translate(self, text, from_lang, to_lang):
+        return text
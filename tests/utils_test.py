@@ -0,0 +1,34 @@
+import requests
+import requests.adapters
+
+import pytest
+
+import translate.utils
+
+
+def test_http_session_retries(monkeypatch):
+    attempts = []
+
+    def send(self, request, **kwargs):
+        attempts.append(request.url)
+        raise requests.exceptions.ConnectionError('nope')
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, 'send', send)
+
+    session = translate.utils.http_session({'retries': 2, 'backoff': 0.01})
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get('http://example.com/')
+
+    assert len(attempts) == 3
+    session.close()
+
+
+def test_http_session_keepalive():
+    session = translate.utils.http_session({'keepalive': False})
+    assert session.headers['Connection'] == 'close'
+
+    session = translate.utils.http_session({'pool_size': 3})
+    adapter = session.get_adapter('https://example.com')
+    assert adapter._pool_maxsize == 3
+    assert session.headers.get('Connection') != 'close'
@@ -1,11 +1,92 @@
 from translate.backends.yandex import YandexBackend
+from translate.exceptions import (ContentException, QuotaException,
+                                  TranslationException)
 
+from multiprocessing.pool import ThreadPool
+
+import pytest
 import requests
 import json
 import os
+import threading
+import time
 
 api_key = os.environ.get('YANDEX_KEY')
 
+
+def test_translate_many_batches():
+    backend = YandexBackend()
+    requests = []
+
+    def api_request(method, **kwargs):
+        requests.append(kwargs['text'])
+        return {'code': 200, 'text': [t.upper() for t in kwargs['text']]}, None
+
+    backend.api_request = api_request
+
+    texts = ['a' * 5000, 'b' * 2000, 'c' * 2000, 'd']
+    assert backend.translate_many(texts, 'en', 'ru') == \
+        [t.upper() for t in texts]
+
+    # Packed as tightly as the size limit allows
+    assert requests == [texts[:2], texts[2:]]
+
+
+def test_translate_parallel():
+    backend = YandexBackend()
+    backend.pool = ThreadPool(processes=3)
+    backend.deadline = 5
+
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def api_request(method, **kwargs):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+
+        time.sleep(0.05)
+
+        with lock:
+            running[0] -= 1
+
+        return {'code': 200, 'text': [kwargs['text'].strip().upper()]}, None
+
+    backend.api_request = api_request
+
+    text = u''.join(u'Sentence number {0}. '.format(i) for i in range(5000))
+    assert backend.translate(text, 'en', 'ru') == text.upper()
+
+    # Never more requests at once than the pool allows
+    assert running[1] == 3
+
+    backend.deadline = 0.1
+
+    with pytest.raises(TranslationException):
+        backend.translate(text, 'en', 'ru')
+
+    backend.pool.close()
+
+
+def test_quota_errors():
+    backend = YandexBackend()
+
+    for code in [403, 404]:
+        with pytest.raises(QuotaException):
+            backend._check_response({'code': code}, None)
+
+
+def test_content_errors():
+    backend = YandexBackend()
+
+    for code in [413, 422]:
+        with pytest.raises(ContentException):
+            backend._check_response({'code': code}, None)
+
+    with pytest.raises(TranslationException) as exc:
+        backend._check_response({'code': 401}, None)
+    assert not isinstance(exc.value, ContentException)
+
 if api_key is None:
     print("Don't have an API key for yandex, not continuing...")
 else:
@@ -34,8 +34,11 @@ app = flask.Flask(__name__, static_folder="./static")
 app.config.from_object('translate.app.defaultsettings')
 app.config.from_object('settings')
 
-from translate.app import views
-from translate.app.ratelimit import RateLimit
+from translate.app import async_server, views
+from translate.app.cache import TranslationCache
+from translate.app.hedge import Hedger
+from translate.app.memory import TranslationMemory
+from translate.app.ratelimit import RateLimit, create_store
 
 
 # API versions that we support (can respond to /api/VERSION/METHOD). It is the
@@ -52,11 +55,78 @@ def initialize_flask():
     server_conf = app.config['SERVER']
     backend_conf = app.config['BACKENDS']
 
-    views.manager = BackendManager(backend_conf)
+    # Options for each backend's circuit breaker, or None to disable them
+    breaker = server_conf.get('breaker', None)
+    if breaker is not None and breaker.get('enabled', False):
+        breaker = dict((k, v) for k, v in breaker.iteritems()
+                       if k != 'enabled')
+    else:
+        breaker = None
+
+    # Options for ordering backends by observed performance, or None to only
+    # order them by preference
+    scoring = server_conf.get('ordering', None)
+    if scoring is not None and scoring.get('adaptive', False):
+        scoring = dict((k, v) for k, v in scoring.iteritems()
+                       if k != 'adaptive')
+    else:
+        scoring = None
+
+    # Options for tracking the upstream quotas of backends, or None to not
+    # track them
+    quota = server_conf.get('quota', None)
+    if quota is not None and quota.get('enabled', False):
+        quota = dict((k, v) for k, v in quota.iteritems() if k != 'enabled')
+    else:
+        quota = None
+
+    # Options for caching the language pairs of backends on disk, or None to
+    # always ask backends for them
+    pairs = server_conf.get('pairs', {})
+    if pairs.get('path') is not None:
+        pair_cache = {'path': pairs['path'], 'ttl': pairs['ttl']}
+    else:
+        pair_cache = None
+
+    views.manager = BackendManager(backend_conf, breaker=breaker,
+                                   scoring=scoring, quota=quota,
+                                   startup=server_conf.get('startup', None),
+                                   pairs=pair_cache)
+
+    if pairs.get('refresh'):
+        views.manager.start_refresh(pairs['refresh'],
+                                    jitter=pairs.get('jitter', 0))
 
     ratelimit = server_conf.get('ratelimit', None)
     if ratelimit is not None and ratelimit.get('enabled', False):
-        RateLimit.enable(limit=ratelimit['limit'], per=ratelimit['per'])
+        byte_quota = ratelimit.get('bytes', None)
+        if byte_quota is not None and not byte_quota.get('enabled', False):
+            byte_quota = None
+
+        RateLimit.enable(limit=ratelimit['limit'], per=ratelimit['per'],
+                         store=create_store(ratelimit),
+                         strategy=ratelimit.get('strategy', 'fixed'),
+                         endpoints=ratelimit.get('endpoints'),
+                         api_keys=ratelimit.get('api_keys'),
+                         byte_quota=byte_quota)
+
+    cache = server_conf.get('cache', None)
+    if cache is not None and cache.get('enabled', False):
+        views.cache = TranslationCache(entries=cache['entries'],
+                                       size=cache['size'],
+                                       ttl=cache['ttl'],
+                                       path=cache.get('path'))
+
+    memory = server_conf.get('memory', None)
+    if memory is not None and memory.get('enabled', False):
+        views.memory = TranslationMemory(memory['path'],
+                                         threshold=memory['threshold'])
+
+    hedge = server_conf.get('hedge', None)
+    if hedge is not None and hedge.get('enabled', False):
+        views.hedger = Hedger(delay=hedge['delay'], workers=hedge['workers'],
+                              percentile=hedge.get('percentile'),
+                              samples=hedge.get('samples', 100))
 
     def deinitialize_manager():
         """Do any cleanup that needs to be done (for backends in particular)
@@ -66,6 +136,9 @@ def initialize_flask():
         log.info("Shutting down server...")
         views.manager.shutdown()
 
+        if views.hedger is not None:
+            views.hedger.close()
+
     # Cleanup the server on ^C
     import atexit
     atexit.register(deinitialize_manager)
@@ -94,4 +167,8 @@ def start_server(custom_config, debug=True):
         options['ssl_context'] = (server_conf['ssl']['cert'],
                                   server_conf['ssl']['key'])
 
-    app.run(host=host, port=port, debug=debug, **options)
+    if server_conf.get('async', {}).get('enabled', False):
+        async_server.serve(app, host, port, server_conf['async'],
+                           ssl=options.get('ssl_context'))
+    else:
+        app.run(host=host, port=port, debug=debug, **options)
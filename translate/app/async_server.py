@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of translate.
+#
+# translate is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# translate is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# translate.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+translate.app.async_server
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Optional asynchronous serving mode, using gevent. Every request is handled in
+its own greenlet, so a request waiting on a slow upstream service doesn't tie
+up a whole worker thread, and a single process can have thousands of
+translations in flight.
+
+Backends which only block on sockets or pipes (and so yield to other greenlets
+once gevent has patched the standard library) should set `cooperative = True`.
+Any other backends are run in a bounded pool of real threads, so they can't
+stall the event loop.
+
+This requires gevent (pip install gevent). The standard library has to be
+patched by gevent before anything else is imported, which bin/translate does
+when given --async. When running under uWSGI, use its own gevent loop engine
+instead (e.g. `uwsgi --gevent 1000`).
+"""
+
+from translate import log
+
+try:
+    import gevent.monkey
+    import gevent.pool
+    import gevent.pywsgi
+    import gevent.threadpool
+except ImportError:
+    gevent = None
+
+
+# Pool of threads used to run non-cooperative backends while the async server
+# is running, None otherwise.
+threadpool = None
+
+
+def call_backend(backend, method, *args):
+    """Call the given method of backend with args, and return the result.
+
+    If the async server is running and the backend doesn't declare itself
+    cooperative, the call is made from the thread pool, so that it can't block
+    other requests.
+    """
+
+    func = getattr(backend, method)
+
+    if threadpool is None or getattr(backend, 'cooperative', False):
+        return func(*args)
+
+    return threadpool.apply(func, args)
+
+
+def serve(app, host, port, conf, ssl=None):
+    """Serve app using gevent's WSGI server. This function doesn't return.
+
+    :param conf: dict containing 'connections', the maximum number of
+                 requests to handle at once, and 'threads', the number of
+                 threads to run non-cooperative backends in.
+    :param ssl: optional tuple of (certificate file, key file).
+    """
+
+    global threadpool
+
+    if gevent is None:
+        raise RuntimeError('Async mode requires gevent (pip install gevent)')
+
+    # Too late to patch what's already been imported, but better than
+    # nothing.
+    if not gevent.monkey.is_module_patched('threading'):
+        log.warning('The standard library was not patched by gevent before '
+                    'translate was imported, start the server with --async')
+        gevent.monkey.patch_all()
+
+    threadpool = gevent.threadpool.ThreadPool(conf['threads'])
+
+    options = {}
+    if ssl is not None:
+        options['certfile'], options['keyfile'] = ssl
+
+    server = gevent.pywsgi.WSGIServer(
+        (host, port), app, spawn=gevent.pool.Pool(conf['connections']),
+        **options)
+
+    log.info("Serving asynchronously, up to {0} connections"
+             .format(conf['connections']))
+
+    server.serve_forever()
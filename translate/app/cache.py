@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of translate.
+#
+# translate is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# translate is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# translate.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+translate.app.cache
+~~~~~~~~~~~~~~~~~~~
+
+Cache of previously translated texts, so that repeated requests for the same
+text and language pair don't have to go through a backend again.
+
+Entries are kept in an in-process LRU, bounded both by number of entries and
+total size, and optionally in an SQLite database on disk, which can be shared
+between every worker process on the host.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    # Python 2.6 needs the backport from PyPI
+    from ordereddict import OrderedDict
+
+
+class DiskStore(object):
+    """Cache storage backed by an SQLite database, so that multiple server
+    processes can share entries.
+    """
+
+    # Clean out expired rows every this many writes
+    PURGE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.writes = 0
+
+        self._connection().execute('CREATE TABLE IF NOT EXISTS cache ('
+                                   'key TEXT PRIMARY KEY, '
+                                   'value TEXT, '
+                                   'expires REAL)')
+
+    def get(self, key):
+        """Return a tuple of (value, expiry time) for key, or None if key is
+        missing or expired."""
+
+        row = self._connection().execute(
+            'SELECT value, expires FROM cache WHERE key = ? AND expires > ?',
+            (key, time.time())).fetchone()
+
+        return (json.loads(row[0]), row[1]) if row is not None else None
+
+    def set(self, key, value, expires):
+        conn = self._connection()
+
+        conn.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                     (key, json.dumps(value), expires))
+
+        self.writes += 1
+        if self.writes % DiskStore.PURGE_EVERY == 0:
+            conn.execute('DELETE FROM cache WHERE expires <= ?',
+                         (time.time(),))
+
+    def _connection(self):
+        """SQLite connections can't be shared between threads, so keep one
+        per thread."""
+
+        conn = getattr(self.local, 'conn', None)
+
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5,
+                                   isolation_level=None)
+            self.local.conn = conn
+
+        return conn
+
+
+class TranslationCache(object):
+    """LRU cache of translation results, with a time to live for every entry.
+
+    Values are dicts of JSON-serializable data (e.g. the result text and name
+    of the backend that created it).
+    """
+
+    def __init__(self, entries=1024, size=1024 * 1024, ttl=3600, path=None):
+        """
+        :param entries: maximum number of entries to keep in memory.
+        :param size: maximum number of bytes of values to keep in memory.
+        :param ttl: number of seconds each entry stays valid for.
+        :param path: file name of SQLite database to share entries through,
+                     or None to only cache in memory.
+        """
+
+        self.max_entries = entries
+        self.max_size = size
+        self.ttl = ttl
+
+        self.store = DiskStore(path) if path is not None else None
+
+        # key -> (expiry time, size, value)
+        self.entries = OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(text, from_lang, to_lang, exclude=()):
+        """Build the cache key for a translation request. Texts are unicode
+        normalized, so that equivalent texts share an entry."""
+
+        text = unicodedata.normalize('NFC', text)
+        exclude = u','.join(sorted(set(exclude)))
+
+        raw = u'\0'.join([from_lang, to_lang, exclude, text])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached value for key, or None if there isn't one."""
+
+        now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None:
+                if entry[0] > now:
+                    # Move to the most recently used end
+                    del self.entries[key]
+                    self.entries[key] = entry
+
+                    self.hits += 1
+                    return entry[2]
+
+                self._remove(key)
+
+        stored = self.store.get(key) if self.store is not None else None
+
+        with self.lock:
+            if stored is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._insert(key, stored[0], stored[1])
+
+        return stored[0]
+
+    def set(self, key, value):
+        """Add value to the cache under key."""
+
+        expires = time.time() + self.ttl
+
+        with self.lock:
+            self._insert(key, value, expires)
+
+        if self.store is not None:
+            self.store.set(key, value, expires)
+
+    def info(self):
+        """Return a dict of statistics about the cache"""
+
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'size': self.size}
+
+    def _insert(self, key, value, expires):
+        size = len(json.dumps(value))
+
+        # Don't bother with anything that would push out the whole cache.
+        if size > self.max_size:
+            return
+
+        if key in self.entries:
+            self._remove(key)
+
+        self.entries[key] = (expires, size, value)
+        self.size += size
+
+        while len(self.entries) > self.max_entries or \
+                self.size > self.max_size:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
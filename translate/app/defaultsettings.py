@@ -29,7 +29,16 @@ SERVER = {
     'ratelimit': {
         'enabled': False,
         'limit': 0,
-        'per': 0
+        'per': 0,
+        'strategy': 'fixed',
+        'storage': 'memory',
+        'endpoints': {},
+        'api_keys': {},
+        'bytes': {
+            'enabled': False,
+            'limit': 0,
+            'per': 0
+        }
     },
 
     'ssl': {
@@ -38,11 +47,86 @@ SERVER = {
         'cert': 'ssl.cert'
     },
 
+    'async': {
+        'enabled': False,
+        'connections': 1000,
+        'threads': 10
+    },
+
     # Only allow 10k characters to be translated at once. Larger requests will
     # be rejected.
     'sizelimit': {
         'enabled': False,
         'limit': 10 * 1024
+    },
+
+    # Documents sent to /api/v1/translate/document are split up into pieces of
+    # at most this many bytes (or the size limit, if that's smaller).
+    'document': {
+        'segment': 4 * 1024
+    },
+
+    # Limits for /api/v1/batch requests
+    'batch': {
+        'limit': 100,
+        'workers': 8,
+        'timeout': 30
+    },
+
+    'startup': {
+        'deadline': 10,
+        'workers': 8
+    },
+
+    'pairs': {
+        'path': None,
+        'ttl': 24 * 60 * 60,
+        'refresh': None,
+        'jitter': 0.1
+    },
+
+    'ordering': {
+        'adaptive': False,
+        'alpha': 0.2,
+        'latency': 10,
+        'errors': 50,
+        'decay': 300
+    },
+
+    'quota': {
+        'enabled': False,
+        'path': None,
+        'margin': 0.05
+    },
+
+    'breaker': {
+        'enabled': True,
+        'failures': 5,
+        'reset': 30,
+        'interval': 5,
+        'slow': None
+    },
+
+    'hedge': {
+        'enabled': False,
+        'delay': 1,
+        'workers': 20,
+        'percentile': None,
+        'samples': 100
+    },
+
+    'memory': {
+        'enabled': False,
+        'path': 'memory.db',
+        'threshold': 1.0
+    },
+
+    'cache': {
+        'enabled': False,
+        'entries': 1024,
+        'size': 1024 * 1024,
+        'ttl': 60 * 60,
+        'path': None
     }
 }
 
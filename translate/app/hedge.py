@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of translate.
+#
+# translate is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# translate is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# translate.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+translate.app.hedge
+~~~~~~~~~~~~~~~~~~~
+
+Hedged translation requests. Rather than waiting out the whole timeout of a
+slow (but not failing) backend before falling back to the next one, the next
+backend is started in parallel once the first has taken longer than a given
+delay, and whichever translation comes back first is used.
+
+The delay can be fixed, or taken from a percentile of the latencies recently
+observed for each backend, so that a backend is only hedged once it's slower
+than it usually is.
+"""
+
+import collections
+import math
+import Queue
+import threading
+import time
+
+from multiprocessing.pool import ThreadPool
+
+from translate import log
+from translate.app.async_server import call_backend
+from translate.exceptions import TranslationException
+
+
+# Latencies to observe for a backend before hedging it by them rather than by
+# the fixed delay
+MIN_SAMPLES = 10
+
+
+class Hedger(object):
+    """Races translation requests across backends."""
+
+    def __init__(self, delay, workers=20, percentile=None, samples=100):
+        """
+        :param delay: seconds to wait on a backend before also starting the
+                      next one, if percentile is None or not enough of its
+                      requests have been seen yet.
+        :param workers: maximum number of backend calls to have running at
+                        once, across every request.
+        :param percentile: percentile (0 to 100) of the recent latencies of a
+                           backend to wait for before starting the next one,
+                           or None to always wait delay seconds.
+        :param samples: number of the latest successful requests to each
+                        backend to take the percentile of.
+        """
+
+        self.delay = delay
+        self.percentile = percentile
+        self.pool = ThreadPool(processes=workers)
+
+        # Backend name -> latencies of its latest successful requests
+        self.latencies = collections.defaultdict(
+            lambda: collections.deque(maxlen=samples))
+        self.lock = threading.Lock()
+
+    def delay_for(self, backend):
+        """Return how many seconds to wait on backend before hedging."""
+
+        if self.percentile is None:
+            return self.delay
+
+        with self.lock:
+            observed = sorted(self.latencies.get(backend.name, ()))
+
+        if len(observed) < MIN_SAMPLES:
+            return self.delay
+
+        rank = int(math.ceil(len(observed) * self.percentile / 100.0))
+
+        return observed[min(max(rank, 1), len(observed)) - 1]
+
+    def observe(self, backend, latency):
+        """Record that a request to backend succeeded after latency
+        seconds."""
+
+        with self.lock:
+            self.latencies[backend.name].append(latency)
+
+    def translate(self, backends, text, from_lang, to_lang, tried,
+                  report=None, admit=None):
+        """Translate text using the given backends, in order of preference.
+
+        Each backend is started either when the previous one fails, or when
+        it hasn't finished after self.delay seconds. Returns a tuple of
+        (backend, translation) for the first backend to succeed. Any results
+        that arrive after that are ignored.
+
+        The name of each backend that is started is appended to tried. If
+        every backend fails, a TranslationException is raised.
+
+        If given, report is called as report(backend, exc, latency) when each
+        backend finishes, including those that lose the race, where exc is
+        the exception raised by the backend, or None if it succeeded.
+
+        If given, admit(backend) is called just before starting each backend,
+        and the backend is skipped if it returns False.
+        """
+
+        results = Queue.Queue()
+        waiting = list(backends)
+        running = 0
+
+        # How long to wait on the latest backend to be started
+        delay = [self.delay]
+
+        def run(backend):
+            start = time.time()
+
+            try:
+                trans = call_backend(backend, 'translate', text, from_lang,
+                                     to_lang)
+
+                if trans is None or trans == "":
+                    raise TranslationException("Received empty result text")
+
+                result = (backend, trans, None)
+
+            except Exception as exc:
+                result = (backend, None, exc)
+
+            latency = time.time() - start
+
+            if result[2] is None:
+                self.observe(backend, latency)
+
+            if report is not None:
+                report(backend, result[2], latency)
+
+            results.put(result)
+
+        def start_next():
+            """Start the next admissible backend, returning whether there
+            was one."""
+
+            while waiting:
+                backend = waiting.pop(0)
+
+                if admit is None or admit(backend):
+                    tried.append(backend.name)
+                    delay[0] = self.delay_for(backend)
+
+                    self.pool.apply_async(run, (backend,))
+                    return True
+
+            return False
+
+        if start_next():
+            running += 1
+
+        while running > 0:
+            try:
+                # Only bother timing out if there's something to hedge with
+                backend, trans, exc = results.get(
+                    timeout=delay[0] if waiting else None)
+
+            except Queue.Empty:
+                log.info('Hedging with %s', waiting[0].name)
+
+                if start_next():
+                    running += 1
+                continue
+
+            running -= 1
+
+            if exc is None:
+                return backend, trans
+
+            log.warning('{0} failed to translate text: {1}'
+                        .format(backend.name, exc))
+
+            # Replace the failed backend straight away, rather than waiting
+            # out the delay.
+            if start_next():
+                running += 1
+
+        raise TranslationException('Every backend failed')
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of translate.
+#
+# translate is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# translate is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# translate.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+translate.app.memory
+~~~~~~~~~~~~~~~~~~~~
+
+Translation memory. Every segment translated by a backend is kept in an SQLite
+database, and looked up again before any backend is asked to translate a
+segment, so text reused between versions of a document is only translated
+once.
+
+Segments that don't match exactly can still be matched to ones that are
+similar enough, using an index of the character trigrams of every segment.
+Similarity is the Dice coefficient of the sets of trigrams of two segments.
+
+Memories can be imported from and exported to TMX files.
+"""
+
+import calendar
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from xml.etree import cElementTree as ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+import translate
+
+# Length of the n-grams used to find similar segments
+NGRAM = 3
+
+# Maximum number of n-grams to look up in a single query, staying under
+# SQLite's limit on the number of parameters.
+BATCH = 500
+
+TMX_DATE = '%Y%m%dT%H%M%SZ'
+XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+
+
+def normalize(text):
+    """Normalize text for exact matching."""
+
+    return unicodedata.normalize('NFC', text).strip()
+
+
+def ngrams(text):
+    """Return the set of n-grams of text used for fuzzy matching. Case and
+    differences in whitespace are ignored."""
+
+    text = u' {0} '.format(u' '.join(normalize(text).lower().split()))
+
+    return set(text[i:i + NGRAM] for i in xrange(len(text) - NGRAM + 1))
+
+
+def element_text(elem):
+    """Return all of the text inside elem, including that of its children.
+    (Element.itertext isn't available before Python 2.7.)"""
+
+    parts = [elem.text or u'']
+
+    for child in elem:
+        parts.append(element_text(child))
+        parts.append(child.tail or u'')
+
+    return u''.join(parts)
+
+
+class TranslationMemory(object):
+    """Store of previously translated segments, shared through an SQLite
+    database."""
+
+    def __init__(self, path, threshold=1.0):
+        """
+        :param path: file name of the SQLite database to keep segments in.
+        :param threshold: minimum similarity (from 0 to 1) of a stored segment
+                          to one being looked up for it to count as a match.
+                          1 only allows exact matches.
+        """
+
+        self.path = path
+        self.threshold = threshold
+        self.local = threading.local()
+
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+        conn = self._connection()
+
+        conn.execute('CREATE TABLE IF NOT EXISTS segments ('
+                     'id INTEGER PRIMARY KEY, '
+                     'source TEXT, '
+                     'from_lang TEXT, '
+                     'to_lang TEXT, '
+                     'translation TEXT, '
+                     'backend TEXT, '
+                     'created REAL, '
+                     'UNIQUE (from_lang, to_lang, source))')
+
+        conn.execute('CREATE TABLE IF NOT EXISTS ngrams ('
+                     'from_lang TEXT, '
+                     'to_lang TEXT, '
+                     'gram TEXT, '
+                     'size INTEGER, '
+                     'segment INTEGER)')
+
+        conn.execute('CREATE INDEX IF NOT EXISTS ngrams_gram ON ngrams '
+                     '(from_lang, to_lang, gram, size)')
+
+    def lookup(self, text, from_lang, to_lang, excludes=()):
+        """Find a translation of text in the memory.
+
+        Returns a dict containing the 'source' text that matched, its
+        'translation', the 'backend' that translated it, when it was
+        'created', and the 'score' of the match (1 for exact matches), or
+        None if nothing matched well enough. Translations by any of the
+        backends named in excludes are ignored.
+        """
+
+        source = normalize(text)
+        conn = self._connection()
+
+        row = conn.execute(
+            'SELECT source, translation, backend, created FROM segments '
+            'WHERE from_lang = ? AND to_lang = ? AND source = ?',
+            (from_lang, to_lang, source)).fetchone()
+
+        if row is not None and row[2] not in excludes:
+            self.hits += 1
+            return self._match(row, 1.0)
+
+        match = None
+        if self.threshold < 1:
+            match = self._fuzzy(source, from_lang, to_lang, excludes)
+
+        if match is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.fuzzy_hits += 1
+
+        return match
+
+    def add(self, text, from_lang, to_lang, translation, backend,
+            created=None):
+        """Remember that backend translated text as translation."""
+
+        source = normalize(text)
+        created = created if created is not None else time.time()
+
+        conn = self._connection()
+
+        with conn:
+            cursor = conn.execute(
+                'UPDATE segments SET translation = ?, backend = ?, '
+                'created = ? WHERE from_lang = ? AND to_lang = ? '
+                'AND source = ?',
+                (translation, backend, created, from_lang, to_lang, source))
+
+            # The n-grams of an existing segment don't change
+            if cursor.rowcount > 0:
+                return
+
+            cursor = conn.execute(
+                'INSERT INTO segments (source, from_lang, to_lang, '
+                'translation, backend, created) VALUES (?, ?, ?, ?, ?, ?)',
+                (source, from_lang, to_lang, translation, backend, created))
+
+            grams = ngrams(source)
+
+            conn.executemany(
+                'INSERT INTO ngrams VALUES (?, ?, ?, ?, ?)',
+                [(from_lang, to_lang, gram, len(grams), cursor.lastrowid)
+                 for gram in grams])
+
+    def info(self):
+        """Return a dict of statistics about the memory"""
+
+        count = self._connection().execute(
+            'SELECT COUNT(*) FROM segments').fetchone()[0]
+
+        return {'hits': self.hits,
+                'fuzzy_hits': self.fuzzy_hits,
+                'misses': self.misses,
+                'segments': count,
+                'threshold': self.threshold}
+
+    def import_tmx(self, fileobj, backend='TMX'):
+        """Add every translation unit in the TMX file fileobj to the memory.
+
+        Each unit is stored as a translation from the source language of the
+        file (or the first variant of the unit, if the file doesn't have one)
+        into each other language. Returns the number of segments added.
+
+        :param backend: name to store as the translator of units which don't
+                        give a creationid.
+        """
+
+        srclang = None
+        count = 0
+
+        for event, elem in ElementTree.iterparse(fileobj,
+                                                 events=('start', 'end')):
+            if event == 'start' and elem.tag == 'header':
+                srclang = elem.get('srclang')
+                if srclang == '*all*':
+                    srclang = None
+
+            if event != 'end' or elem.tag != 'tu':
+                continue
+
+            variants = {}
+            first = None
+
+            for tuv in elem.getiterator('tuv'):
+                lang = tuv.get(XML_LANG, tuv.get('lang'))
+                seg = tuv.find('seg')
+
+                if lang is not None and seg is not None:
+                    variants[lang] = element_text(seg)
+                    first = first or lang
+
+            source_lang = srclang
+            if source_lang not in variants:
+                source_lang = first
+
+            created = elem.get('creationdate')
+            if created is not None:
+                created = calendar.timegm(time.strptime(created, TMX_DATE))
+
+            for lang, trans in variants.iteritems():
+                if lang == source_lang or not trans:
+                    continue
+
+                self.add(variants[source_lang], source_lang, lang, trans,
+                         elem.get('creationid', backend), created)
+                count += 1
+
+            elem.clear()
+
+        return count
+
+    def export_tmx(self, fileobj, from_lang=None, to_lang=None):
+        """Write the segments in the memory (optionally only those of a single
+        language pair) to fileobj as TMX. Returns the number of segments
+        written."""
+
+        query = 'SELECT source, from_lang, to_lang, translation, backend, ' \
+            'created FROM segments'
+        where = []
+        args = []
+
+        if from_lang is not None:
+            where.append('from_lang = ?')
+            args.append(from_lang)
+
+        if to_lang is not None:
+            where.append('to_lang = ?')
+            args.append(to_lang)
+
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+
+        fileobj.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<tmx version="1.4">\n'
+            '  <header creationtool="translate" creationtoolversion={0} '
+            'datatype="plaintext" segtype="sentence" adminlang="en" '
+            'srclang={1} o-tmf="translate"/>\n'
+            '  <body>\n'.format(quoteattr(translate.__version__),
+                                quoteattr(from_lang or '*all*')))
+
+        count = 0
+
+        for row in self._connection().execute(query + ' ORDER BY id', args):
+            source, src, dst, trans, backend, created = row
+
+            date = time.strftime(TMX_DATE, time.gmtime(created))
+
+            fileobj.write(
+                u'    <tu creationdate={0} creationid={1}>\n'
+                u'      <tuv xml:lang={2}><seg>{3}</seg></tuv>\n'
+                u'      <tuv xml:lang={4}><seg>{5}</seg></tuv>\n'
+                u'    </tu>\n'.format(quoteattr(date), quoteattr(backend),
+                                      quoteattr(src), escape(source),
+                                      quoteattr(dst), escape(trans))
+                .encode('utf-8'))
+            count += 1
+
+        fileobj.write('  </body>\n</tmx>\n')
+
+        return count
+
+    def _fuzzy(self, source, from_lang, to_lang, excludes):
+        """Return the best match for source that's at least as similar as the
+        threshold, or None if there isn't one."""
+
+        grams = list(ngrams(source))
+        size = len(grams)
+
+        # Segments with too many or too few n-grams can't possibly be similar
+        # enough, however many they share.
+        low = size * self.threshold / (2 - self.threshold)
+        high = size * (2 - self.threshold) / max(self.threshold, 1e-6)
+
+        conn = self._connection()
+
+        # segment id -> [number of n-grams, number shared]
+        shared = {}
+
+        for i in xrange(0, size, BATCH):
+            batch = grams[i:i + BATCH]
+
+            rows = conn.execute(
+                'SELECT segment, size, COUNT(*) FROM ngrams '
+                'WHERE from_lang = ? AND to_lang = ? '
+                'AND size BETWEEN ? AND ? AND gram IN ({0}) '
+                'GROUP BY segment'.format(','.join('?' * len(batch))),
+                [from_lang, to_lang, low, high] + batch)
+
+            for segment, other, count in rows:
+                shared.setdefault(segment, [other, 0])[1] += count
+
+        candidates = sorted(((2.0 * count / (size + other), segment)
+                             for segment, (other, count) in
+                             shared.iteritems()), reverse=True)
+
+        for score, segment in candidates:
+            if score < self.threshold:
+                break
+
+            row = conn.execute(
+                'SELECT source, translation, backend, created FROM segments '
+                'WHERE id = ?', (segment,)).fetchone()
+
+            if row is not None and row[2] not in excludes:
+                return self._match(row, score)
+
+        return None
+
+    def _match(self, row, score):
+        return {'source': row[0],
+                'translation': row[1],
+                'backend': row[2],
+                'created': row[3],
+                'score': score}
+
+    def _connection(self):
+        """SQLite connections can't be shared between threads, so keep one
+        per thread."""
+
+        conn = getattr(self.local, 'conn', None)
+
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self.local.conn = conn
+
+        return conn
@@ -20,10 +20,26 @@ translate.app.ratelimit
 
 Simple IP-based rate-limiting functionality for Flask routes.
 
-This code is derived from http://flask.pocoo.org/snippets/70/ but doesn't rely
-on redis. Opts for simple dictionary implementation instead.
+This code is derived from http://flask.pocoo.org/snippets/70/. Request counts
+are kept in a pluggable store: either in the memory of a single process
+(MemoryStore), in a memory mapped file shared by every worker process on the
+host (SharedStore), or on a Redis server shared by every host (RedisStore).
+
+Two strategies are supported. 'fixed' counts requests in windows of `per`
+seconds, which is simple but lets a client make up to twice the limit in a
+burst across the end of a window. 'bucket' gives each client a token bucket
+holding up to `limit` tokens, refilled at `limit / per` tokens a second, with
+one token taken per request.
 """
 
+import fcntl
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import socket
+import struct
 import time
 import flask
 import threading
@@ -32,7 +48,451 @@ from functools import update_wrapper
 from translate.exceptions import APIException
 
 
-RATELIMIT_MUTEX = threading.Lock()
+def _stripe(name, stripes):
+    """Pick which of stripes locks guards the counter called name."""
+
+    return struct.unpack('<Q', hashlib.sha1(name).digest()[:8])[0] % stripes
+
+
+def _refill(tokens, updated, capacity, rate, now):
+    """Return the number of tokens in a bucket at time now, which had tokens
+    in it at time updated."""
+
+    return min(capacity, tokens + max(now - updated, 0) * rate)
+
+
+class MemoryStore(object):
+    """Keeps request counts in the memory of this process.
+
+    Counters are spread over a number of stripes, each with its own lock, so
+    that requests from different users rarely wait on each other.
+    """
+
+    # Don't bother dropping expired counters from a stripe until it holds
+    # this many.
+    SWEEP = 1024
+
+    def __init__(self, stripes=16):
+        # Each stripe is {name: [window, count, expires]}. Counters with
+        # different windows (e.g. from limits with different periods) can
+        # share a stripe.
+        self.stripes = [{} for _ in xrange(stripes)]
+        self.locks = [threading.Lock() for _ in xrange(stripes)]
+
+        # Number of counters left in each stripe after it was last swept
+        self.swept = [0] * stripes
+
+        # Each stripe is ({name: [tokens, updated, capacity, rate]},
+        # [(time bucket is full again, name), ...]). Full buckets are no
+        # different from missing ones, so they are dropped as the heap says
+        # they fill up, keeping memory proportional to active clients.
+        self.buckets = [({}, []) for _ in xrange(stripes)]
+
+    def incr(self, name, window, expires, amount=1):
+        """Add amount to the counter called name for the given window, and
+        return its new value. Counts from earlier windows are forgotten.
+
+        :param window: identifier of the current ratelimit window.
+        :param expires: unix timestamp after which the counter can be dropped.
+        """
+
+        index = _stripe(name, len(self.stripes))
+        counters = self.stripes[index]
+
+        with self.locks[index]:
+            counter = counters.get(name)
+
+            if counter is None or counter[0] != window:
+                # Sweep before adding, so the new counter is never dropped
+                if len(counters) >= max(2 * self.swept[index],
+                                        MemoryStore.SWEEP):
+                    self._sweep(index, time.time())
+
+                counter = counters[name] = [window, 0, expires]
+
+            counter[1] += amount
+
+        return counter[1]
+
+    def get(self, name, window):
+        """Return the value of the counter called name for the given
+        window."""
+
+        counter = self.stripes[_stripe(name, len(self.stripes))].get(name)
+
+        if counter is None or counter[0] != window:
+            return 0
+
+        return counter[1]
+
+    def _sweep(self, index, now):
+        """Drop the expired counters in a stripe."""
+
+        counters = self.stripes[index]
+
+        for name, counter in counters.items():
+            if counter[2] <= now:
+                del counters[name]
+
+        self.swept[index] = len(counters)
+
+    def take(self, name, capacity, rate, now, amount=1):
+        """Take amount tokens from the bucket called name, which holds up to
+        capacity tokens and refills at rate tokens per second. Nothing is
+        taken unless the bucket holds at least amount tokens.
+
+        Returns a tuple of (whether the tokens were taken, tokens left).
+        """
+
+        index = _stripe(name, len(self.buckets))
+        buckets, heap = self.buckets[index]
+
+        with self.locks[index]:
+            self._expire(buckets, heap, now)
+
+            bucket = buckets.get(name)
+
+            if bucket is None:
+                bucket = buckets[name] = [capacity, now, capacity, rate]
+                heapq.heappush(heap, (now, name))
+
+            tokens = _refill(bucket[0], bucket[1], capacity, rate, now)
+
+            taken = tokens >= amount
+            if taken:
+                tokens -= amount
+
+            bucket[:] = [tokens, now, capacity, rate]
+
+        return taken, tokens
+
+    def peek(self, name, capacity, rate, now):
+        """Return the number of tokens in the bucket called name."""
+
+        bucket = self.buckets[_stripe(name, len(self.buckets))][0].get(name)
+
+        if bucket is None:
+            return capacity
+
+        return _refill(bucket[0], bucket[1], capacity, rate, now)
+
+    @staticmethod
+    def _expire(buckets, heap, now):
+        while heap and heap[0][0] <= now:
+            _, name = heapq.heappop(heap)
+
+            tokens, updated, capacity, rate = buckets[name]
+            full = updated + (capacity - tokens) / rate
+
+            # Taken from since it was queued, so check again later
+            if full > now:
+                heapq.heappush(heap, (full, name))
+            else:
+                del buckets[name]
+
+
+class SharedStore(object):
+    """Keeps request counts in a memory mapped file, so that every server
+    process on the host shares them.
+
+    The file is a fixed size hash table, split into stripes which are locked
+    separately (with fcntl between processes, and a threading lock between
+    threads). Every slot records when it expires: at the end of a counter's
+    window, or when a bucket would be full again. Expired slots are simply
+    overwritten, whatever limit they were for, and if a stripe fills up with
+    ones still in use, the first one probed is evicted.
+    """
+
+    # Key hash, expires, window, count
+    SLOT = struct.Struct('<QddQ')
+
+    # Key hash, expires, last updated, tokens. This has the same size and
+    # layout for the first three fields as SLOT.
+    BUCKET = struct.Struct('<Qddd')
+
+    def __init__(self, path, slots=4096, stripes=64):
+        self.stripes = stripes
+        self.slots_per_stripe = max(slots // stripes, 1)
+
+        size = self.stripes * self.slots_per_stripe * SharedStore.SLOT.size
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        # Every process sizes the file the same, so this only changes it the
+        # first time.
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+
+        self.map = mmap.mmap(self.fd, size)
+        self.locks = [threading.Lock() for _ in xrange(stripes)]
+
+    def _find(self, name, current, now):
+        """Return (stripe, offset of the slot for name, key to store in the
+        slot, whether the slot already holds name's data).
+
+        current(value) is called with the third field of name's slot, and
+        should return whether its data is still valid. Other slots are only
+        reused once they have expired by time now.
+        """
+
+        digest = struct.unpack('<Q', hashlib.sha1(name).digest()[:8])[0]
+        key = digest or 1
+
+        stripe = digest % self.stripes
+        first = stripe * self.slots_per_stripe
+        home = (digest // self.stripes) % self.slots_per_stripe
+
+        free = None
+
+        for i in xrange(self.slots_per_stripe):
+            offset = (first + (home + i) % self.slots_per_stripe) * \
+                SharedStore.SLOT.size
+
+            slot_key, expires, value, _ = SharedStore.SLOT.unpack_from(
+                self.map, offset)
+
+            if slot_key == key:
+                return stripe, offset, key, current(value)
+
+            if free is None and (slot_key == 0 or expires <= now):
+                free = offset
+
+        if free is None:
+            free = (first + home) * SharedStore.SLOT.size
+
+        return stripe, free, key, False
+
+    def _lock(self, stripe, op):
+        size = self.slots_per_stripe * SharedStore.SLOT.size
+        fcntl.lockf(self.fd, op, size, stripe * size)
+
+    def incr(self, name, window, expires, amount=1):
+        stripe = _stripe(name, self.stripes)
+
+        with self.locks[stripe]:
+            self._lock(stripe, fcntl.LOCK_EX)
+
+            try:
+                _, offset, key, current = self._find(
+                    name, lambda w: w == window, time.time())
+
+                count = amount
+                if current:
+                    count += SharedStore.SLOT.unpack_from(self.map,
+                                                          offset)[3]
+
+                # Only happens when giving back a count which was evicted
+                count = max(count, 0)
+
+                SharedStore.SLOT.pack_into(self.map, offset, key, expires,
+                                           window, count)
+            finally:
+                self._lock(stripe, fcntl.LOCK_UN)
+
+        return count
+
+    def get(self, name, window):
+        _, offset, _, current = self._find(name, lambda w: w == window,
+                                           time.time())
+
+        if not current:
+            return 0
+
+        return SharedStore.SLOT.unpack_from(self.map, offset)[3]
+
+    def take(self, name, capacity, rate, now, amount=1):
+        stripe = _stripe(name, self.stripes)
+
+        with self.locks[stripe]:
+            self._lock(stripe, fcntl.LOCK_EX)
+
+            try:
+                _, offset, key, current = self._find(
+                    name, lambda updated: True, now)
+
+                if current:
+                    _, _, updated, tokens = SharedStore.BUCKET.unpack_from(
+                        self.map, offset)
+                    tokens = _refill(tokens, updated, capacity, rate, now)
+                else:
+                    tokens = capacity
+
+                taken = tokens >= amount
+                if taken:
+                    tokens -= amount
+
+                # A full bucket is the same as a new one, so the slot can be
+                # reused once it would be full again.
+                SharedStore.BUCKET.pack_into(
+                    self.map, offset, key, now + (capacity - tokens) / rate,
+                    now, tokens)
+            finally:
+                self._lock(stripe, fcntl.LOCK_UN)
+
+        return taken, tokens
+
+    def peek(self, name, capacity, rate, now):
+        _, offset, _, current = self._find(name, lambda updated: True, now)
+
+        if not current:
+            return capacity
+
+        _, _, updated, tokens = SharedStore.BUCKET.unpack_from(self.map,
+                                                               offset)
+        return _refill(tokens, updated, capacity, rate, now)
+
+
+class RedisStore(object):
+    """Keeps request counts on a Redis server (or anything else speaking its
+    protocol), so that servers on multiple hosts can share them.
+
+    Counters are updated with INCRBY, which Redis guarantees to be atomic, and
+    expire on their own at the end of the window. Token buckets are updated by
+    a Lua script, which Redis also runs atomically, and expire once they would
+    be full again. Each thread has its own connection.
+    """
+
+    # KEYS[1] = bucket, ARGV = capacity, rate, now, amount. Returns {1 if the
+    # tokens were taken else 0, tokens left}. Numbers are passed back as
+    # strings, as Redis would truncate them to integers.
+    TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+local amount = tonumber(ARGV[4])
+local taken = 0
+if tokens >= amount then
+  tokens = tokens - amount
+  taken = 1
+end
+redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'updated', ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return {taken, tostring(tokens)}
+"""
+
+    def __init__(self, host='localhost', port=6379, db=0, prefix='translate',
+                 timeout=1):
+        self.address = (host, port)
+        self.db = db
+        self.prefix = prefix
+        self.timeout = timeout
+
+        self.local = threading.local()
+
+    def incr(self, name, window, expires, amount=1):
+        key = self._key(name, window)
+
+        count, _ = self._command(['INCRBY', key, str(amount)],
+                                 ['EXPIREAT', key, str(int(expires) + 1)])
+        return count
+
+    def get(self, name, window):
+        count, = self._command(['GET', self._key(name, window)])
+        return int(count) if count is not None else 0
+
+    def take(self, name, capacity, rate, now, amount=1):
+        (taken, tokens), = self._command(
+            ['EVAL', RedisStore.TAKE_SCRIPT, '1', self._key(name, 'bucket'),
+             repr(float(capacity)), repr(float(rate)), repr(now),
+             str(amount)])
+
+        return bool(taken), float(tokens)
+
+    def peek(self, name, capacity, rate, now):
+        (tokens, updated), = self._command(
+            ['HMGET', self._key(name, 'bucket'), 'tokens', 'updated'])
+
+        if tokens is None or updated is None:
+            return capacity
+
+        return _refill(float(tokens), float(updated), capacity, rate, now)
+
+    def _key(self, name, window):
+        return '{0}:ratelimit:{1!r}:{2}'.format(self.prefix, window, name)
+
+    def _connect(self):
+        conn = socket.create_connection(self.address, self.timeout)
+        self.local.conn = conn
+        self.local.reader = conn.makefile('rb')
+
+        if self.db:
+            self._send(['SELECT', str(self.db)])
+            self._read()
+
+    def _command(self, *commands):
+        """Send each command (a list of strings) in a single pipeline, and
+        return the list of replies. Reconnects once if the connection has been
+        lost."""
+
+        for attempt in (0, 1):
+            try:
+                if getattr(self.local, 'conn', None) is None:
+                    self._connect()
+
+                self._send(*commands)
+                return [self._read() for _ in commands]
+
+            except (socket.error, EOFError):
+                self.local.conn = None
+
+                if attempt:
+                    raise
+
+    def _send(self, *commands):
+        data = []
+
+        for command in commands:
+            data.append('*{0}\r\n'.format(len(command)))
+
+            for arg in command:
+                data.append('${0}\r\n{1}\r\n'.format(len(arg), arg))
+
+        self.local.conn.sendall(''.join(data))
+
+    def _read(self):
+        line = self.local.reader.readline()
+        if not line.endswith('\r\n'):
+            raise EOFError('Connection closed')
+
+        kind, rest = line[0], line[1:-2]
+
+        if kind == '+':
+            return rest
+        if kind == '-':
+            raise RuntimeError('Redis error: ' + rest)
+        if kind == ':':
+            return int(rest)
+        if kind == '$':
+            if rest == '-1':
+                return None
+            data = self.local.reader.read(int(rest) + 2)
+            return data[:-2]
+        if kind == '*':
+            return [self._read() for _ in xrange(int(rest))]
+
+        raise RuntimeError('Bad reply from Redis: ' + repr(line))
+
+
+def create_store(conf):
+    """Create the request count store described by the ratelimit
+    configuration dict conf."""
+
+    storage = conf.get('storage', 'memory')
+
+    if storage == 'memory':
+        return MemoryStore()
+    if storage == 'shared':
+        return SharedStore(conf['path'], slots=conf.get('slots', 4096))
+    if storage == 'redis':
+        return RedisStore(host=conf.get('host', 'localhost'),
+                          port=conf.get('port', 6379),
+                          db=conf.get('db', 0))
+
+    raise ValueError('Unknown ratelimit storage: {0}'.format(storage))
 
 
 class RateLimit(object):
@@ -40,82 +500,301 @@ class RateLimit(object):
     and adding them as necessary
     """
 
-    limit_dict = {}
+    store = MemoryStore()
+
+    # Rate limited API methods which have been requested from this process
+    keys = set()
 
     enabled = False
+    strategy = 'fixed'
     limit = 0
     per = 0
     reset = 0
 
+    # {API method: (limit, per)} and {API key: (limit, per)}, overriding the
+    # default limit. API key limits take precedence.
+    endpoints = {}
+    api_keys = {}
+
+    # Number of bytes of text each client can have translated every
+    # byte_per seconds, or 0 to not limit them.
+    byte_limit = 0
+    byte_per = 0
+
+    # {API key: (byte_limit, byte_per)}, overriding the default byte quota
+    api_key_bytes = {}
+
     @staticmethod
-    def enable(limit, per):
-        """Initialize rate limiting with given limit / per values."""
+    def enable(limit, per, store=None, strategy='fixed', endpoints=None,
+               api_keys=None, byte_quota=None):
+        """Initialize rate limiting with given limit / per values, keeping
+        counts in store (or in this process, if None).
+
+        :param strategy: 'fixed' or 'bucket' (see module documentation)
+        :param endpoints: dict of API method paths to dicts of 'limit' and
+                          'per' to use for that method instead.
+        :param api_keys: dict of API keys to dicts of 'limit' and 'per' to use
+                         for clients sending that key in the X-API-Key header,
+                         and optionally a 'bytes' dict of 'limit' and 'per'
+                         to use instead of byte_quota.
+        :param byte_quota: dict of 'limit' and 'per' for the number of bytes
+                           of text each client can have translated, or None.
+        """
+
+        if strategy not in ('fixed', 'bucket'):
+            raise ValueError('Unknown ratelimit strategy: {0}'
+                             .format(strategy))
 
         RateLimit.enabled = True
+        RateLimit.strategy = strategy
         RateLimit.limit = limit
         RateLimit.per = per
         RateLimit.reset = (time.time() // per) * per + per
 
+        RateLimit.endpoints = dict((k, (v['limit'], v['per']))
+                                   for k, v in (endpoints or {}).iteritems())
+        RateLimit.api_keys = dict((k, (v['limit'], v['per']))
+                                  for k, v in (api_keys or {}).iteritems())
+        RateLimit.api_key_bytes = dict(
+            (k, (v['bytes']['limit'], v['bytes']['per']))
+            for k, v in (api_keys or {}).iteritems() if 'bytes' in v)
+
+        if byte_quota is not None:
+            RateLimit.byte_limit = byte_quota['limit']
+            RateLimit.byte_per = byte_quota['per']
+        else:
+            RateLimit.byte_limit = RateLimit.byte_per = 0
+
+        RateLimit.store = store if store is not None else MemoryStore()
+        RateLimit.keys = set()
+
     @staticmethod
     def update_timer():
-        """Reset the RateLimit requests, if time has expired"""
+        """Start a new window, if the current one has expired. Windows are
+        aligned to multiples of per, so every process agrees on them."""
         now = time.time()
 
-        # Limit has expired, flush requests and reset timer
+        # Limit has expired, so reset timer. The store forgets the old counts
+        # once it sees the new window.
         if RateLimit.reset <= now:
             RateLimit.reset = (now // RateLimit.per) * RateLimit.per +\
                 RateLimit.per
 
-            RateLimit.limit_dict = {}
+    @staticmethod
+    def limits(key, api_key=None):
+        """Return (limit, per) for requests to the given API method, by a
+        client using api_key."""
+
+        if api_key in RateLimit.api_keys:
+            return RateLimit.api_keys[api_key]
+
+        return RateLimit.endpoints.get(key, (RateLimit.limit, RateLimit.per))
+
+    @staticmethod
+    def byte_limits(api_key=None):
+        """Return (limit, per) for the byte quota of a client using
+        api_key."""
+
+        return RateLimit.api_key_bytes.get(
+            api_key, (RateLimit.byte_limit, RateLimit.byte_per))
 
     @staticmethod
-    def add_request(user, key):
+    def hit(user, key, api_key=None):
         """Record that the given user (IP-address) made a request to the
-        specified API endpoint (/api/v1/METHOD)
+        specified API endpoint (/api/v1/METHOD), using api_key if given.
 
-        If the current ratelimit window has expired, clears all requests and
-        resets the timer before adding the request in.
+        Returns a dict of the 'limit' and 'per' which apply, how many requests
+        are 'remaining', when the limit next 'reset's (the end of the window,
+        or the time the bucket will be full again), and whether this request
+        was 'over' the limit.
         """
 
-        # GIL should take care of us, but just in case we'll obtain a lock so
-        # concurrent requests can't do any harm.
-        RATELIMIT_MUTEX.acquire()
+        limit, per = RateLimit.limits(key, api_key)
+
+        RateLimit.keys.add(key)
 
-        RateLimit.update_timer()
+        return RateLimit._consume(
+            RateLimit._name(RateLimit._client(user, api_key), key), limit, per,
+            1)
 
-        key_dict = RateLimit.limit_dict.get(key, {})
+    @staticmethod
+    def charge(user, size, api_key=None):
+        """Charge size bytes of text against the byte quota of the given user
+        (IP-address), or of api_key if given.
 
-        # Add to requests this user has made
-        key_dict[user] = key_dict.get(user, 0) + 1
+        Returns a dict in the same format as hit, counting bytes rather than
+        requests.
+        """
 
-        RateLimit.limit_dict[key] = key_dict
+        limit, per = RateLimit.byte_limits(api_key)
 
-        RATELIMIT_MUTEX.release()
+        return RateLimit._consume(
+            RateLimit._name(RateLimit._client(user, api_key), 'bytes'),
+            limit, per, size)
 
     @staticmethod
-    def remaining(user, key):
+    def remaining(user, key, api_key=None):
         """Return how many request the current user has for the given API
-        method during this request period.
+        method during this request period, using api_key if given.
         """
 
-        reqs = RateLimit.limit_dict.get(key, {}).get(user, 0)
+        limit, per = RateLimit.limits(key, api_key)
+
+        return RateLimit._remaining(
+            RateLimit._name(RateLimit._client(user, api_key), key), limit, per)
+
+    @staticmethod
+    def bytes_remaining(user, api_key=None):
+        """Return how many bytes of text the user (or api_key, if given) can
+        still have translated during this request period."""
+
+        limit, per = RateLimit.byte_limits(api_key)
+
+        return RateLimit._remaining(
+            RateLimit._name(RateLimit._client(user, api_key), 'bytes'), limit,
+            per)
+
+    @staticmethod
+    def _consume(name, limit, per, amount):
+        if RateLimit.strategy == 'bucket':
+            now = time.time()
+            rate = float(limit) / per
+
+            taken, tokens = RateLimit.store.take(name, limit, rate, now,
+                                                 amount)
+
+            return dict(limit=limit, per=per, over=not taken,
+                        remaining=int(math.floor(tokens)),
+                        reset=now + (limit - tokens) / rate)
+
+        reset = RateLimit._window(per)
+        used = RateLimit.store.incr(name, reset, reset, amount)
+
+        # Give back what a rejected request took, so that it doesn't use up
+        # the limit (a large request could otherwise lock a client out of
+        # its byte quota until the window ends).
+        over = used > limit
+        if over:
+            used = RateLimit.store.incr(name, reset, reset, -amount)
+
+        return dict(limit=limit, per=per, over=over,
+                    remaining=max(limit - used, 0), reset=reset)
+
+    @staticmethod
+    def _remaining(name, limit, per):
+        if RateLimit.strategy == 'bucket':
+            tokens = RateLimit.store.peek(name, limit, float(limit) / per,
+                                          time.time())
+            return int(math.floor(tokens))
+
+        used = RateLimit.store.get(name, RateLimit._window(per))
 
         # Make sure we never return a negative number of requests remaining
-        if reqs > RateLimit.limit:
+        if used > limit:
             return 0
 
-        return RateLimit.limit - reqs
+        return limit - used
 
     @staticmethod
-    def over_limit(user, key):
+    def over_limit(user, key, api_key=None):
         """Is the current user over the rate limit for the given API method"""
-        reqs = RateLimit.limit_dict.get(key, {}).get(user, 0)
-        return reqs > RateLimit.limit
+
+        limit, per = RateLimit.limits(key, api_key)
+        name = RateLimit._name(RateLimit._client(user, api_key), key)
+
+        if RateLimit.strategy == 'bucket':
+            return RateLimit.store.peek(name, limit, float(limit) / per,
+                                        time.time()) < 1
+
+        return RateLimit.store.get(name, RateLimit._window(per)) > limit
+
+    @staticmethod
+    def methods(user, api_key=None):
+        """Return a dict of the number of requests remaining for user (or
+        api_key, if given), for each rate limited API method."""
+
+        return dict((key, RateLimit.remaining(user, key, api_key))
+                    for key in list(RateLimit.keys))
+
+    @staticmethod
+    def summary(user, api_key=None):
+        """Return a dict of the default 'limit', 'per' and 'reset' which apply
+        to user (or api_key, if given), and the requests remaining for each
+        API method, as shown by /api/v1/info. The byte quota is included as
+        'bytes', if enabled."""
+
+        limit, per = RateLimit.limits(None, api_key)
+
+        summary = dict(limit=limit, per=per, reset=RateLimit._window(per),
+                       methods=RateLimit.methods(user, api_key))
+
+        if RateLimit.byte_limit:
+            limit, per = RateLimit.byte_limits(api_key)
+            summary['bytes'] = dict(
+                limit=limit, per=per,
+                remaining=RateLimit.bytes_remaining(user, api_key))
+
+        return summary
+
+    @staticmethod
+    def _window(per):
+        """Return the end of the current window of the given length."""
+
+        if per == RateLimit.per:
+            RateLimit.update_timer()
+            return RateLimit.reset
+
+        return (time.time() // per) * per + per
+
+    @staticmethod
+    def _client(user, api_key):
+        """Return who to count requests against: users of a known API key
+        share its limit, wherever they are."""
+
+        if api_key in RateLimit.api_keys:
+            return 'key:' + api_key
+
+        return user
+
+    @staticmethod
+    def _name(user, key):
+        return u'{0} {1}'.format(key, user).encode('utf-8')
+
+
+def get_view_rate_limit():
+    """Get the ratelimit information (as returned by RateLimit.hit) for the
+    current requester / API method"""
+    return getattr(flask.g, '_view_rate_limit', None)
 
 
 def get_view_rate_limit_remaining():
     """Get the ratelimit for the current requester / API method"""
-    return getattr(flask.g, '_view_rate_limit_remaining', None)
+    info = get_view_rate_limit()
+    return info['remaining'] if info is not None else None
+
+
+def get_view_byte_limit():
+    """Get the byte quota information (as returned by RateLimit.charge) for
+    the current requester"""
+    return getattr(flask.g, '_view_byte_limit', None)
+
+
+def charge_bytes(size):
+    """Charge size bytes of text against the quota of the current requester,
+    if byte quotas are enabled.
+
+    Returns the dict returned by RateLimit.charge, or None if byte quotas are
+    disabled.
+    """
+
+    if not RateLimit.enabled or not RateLimit.byte_limit:
+        return None
+
+    info = RateLimit.charge(flask.request.remote_addr, size,
+                            flask.request.headers.get('X-API-Key'))
+
+    flask.g._view_byte_limit = info
+    return info
 
 
 def get_view_send_x_headers():
@@ -126,8 +805,10 @@ def get_view_send_x_headers():
 def on_over_limit():
     """Callback function to call when API method goes over the ratelimit"""
 
-    raise APIException.ratelimit(limit=RateLimit.limit, per=RateLimit.per,
-                                 reset=RateLimit.reset)
+    info = get_view_rate_limit()
+
+    raise APIException.ratelimit(limit=info['limit'], per=info['per'],
+                                 reset=info['reset'])
 
 
 def ratelimit(send_x_headers=True, over_limit_func=on_over_limit):
@@ -140,19 +821,20 @@ def ratelimit(send_x_headers=True, over_limit_func=on_over_limit):
     def decorator(f):
         def rate_limited(*args, **kwargs):
             if RateLimit.enabled:
-                # Base rate limiting on IPs
+                # Base rate limiting on IPs, or API keys if one is given
                 user = flask.request.remote_addr
                 key = flask.request.path
+                api_key = flask.request.headers.get('X-API-Key')
 
-                RateLimit.add_request(user, key)
+                # Use the result of hit rather than looking it up again, so
+                # concurrent requests (e.g. from a batch) each see their own
+                # place in the window.
+                info = RateLimit.hit(user, key, api_key)
 
                 flask.g._send_rate_limit_x_headers = send_x_headers
-                flask.g._view_rate_limit_remaining =\
-                    RateLimit.remaining(user, key)
-
-                if over_limit_func is not None and\
-                   RateLimit.over_limit(user, key):
+                flask.g._view_rate_limit = info
 
+                if over_limit_func is not None and info['over']:
                     return over_limit_func()
 
             return f(*args, **kwargs)
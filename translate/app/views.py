@@ -23,19 +23,31 @@ specifies. All HTML and JSON responses are generated here.
 """
 
 from . import app, log
-from .ratelimit import ratelimit, RateLimit
-from translate.exceptions import APIException, TranslationException
+from .async_server import call_backend
+from .ratelimit import charge_bytes, ratelimit, RateLimit
+from translate.exceptions import (APIException, ContentException,
+                                  QuotaException, TranslationException)
 
 import translate.app
+import translate.segment
 import translate.utils
 
 import flask
 from flask import render_template, request
 
+import codecs
+import itertools
 import json
+import multiprocessing
+import time
+
+from multiprocessing.pool import ThreadPool
 
 
 manager = None
+cache = None
+hedger = None
+memory = None
 
 
 @app.after_request
@@ -44,13 +56,21 @@ def inject_x_rate_headers(response):
     endpoint that requires rate-limiting
     """
 
-    remaining = translate.app.ratelimit.get_view_rate_limit_remaining()
-    if RateLimit.enabled and translate.app.ratelimit.get_view_send_x_headers():
+    info = translate.app.ratelimit.get_view_rate_limit()
+    if RateLimit.enabled and info is not None and \
+            translate.app.ratelimit.get_view_send_x_headers():
         h = response.headers
-        h.add('X-RateLimit-Remaining', str(remaining))
-        h.add('X-RateLimit-Limit', str(RateLimit.limit))
-        h.add('X-RateLimit-Duration', str(RateLimit.per))
-        h.add('X-RateLimit-Reset', str(RateLimit.reset))
+        h.add('X-RateLimit-Remaining', str(info['remaining']))
+        h.add('X-RateLimit-Limit', str(info['limit']))
+        h.add('X-RateLimit-Duration', str(info['per']))
+        h.add('X-RateLimit-Reset', str(info['reset']))
+
+        quota = translate.app.ratelimit.get_view_byte_limit()
+        if quota is not None:
+            h.add('X-RateLimit-Bytes-Remaining', str(quota['remaining']))
+            h.add('X-RateLimit-Bytes-Limit', str(quota['limit']))
+            h.add('X-RateLimit-Bytes-Duration', str(quota['per']))
+            h.add('X-RateLimit-Bytes-Reset', str(quota['reset']))
     return response
 
 
@@ -73,16 +93,8 @@ def html_index():
 def html_info():
     """Show information about the server, in HTML form."""
 
-    pairs = set()
-
-    for backend in manager.backends:
-        for pair in backend.language_pairs:
-            pairs.add(pair)
-
-    pairs = list(pairs)
-
-    # Sort by from_language
-    pairs = sorted(pairs, key=lambda pair: pair[0])
+    # Sorted by from_language
+    pairs = manager.pairs()
 
     if app.config['SERVER']['sizelimit']['enabled']:
         sizelimit = app.config['SERVER']['sizelimit']['limit']
@@ -91,15 +103,10 @@ def html_info():
 
     if RateLimit.enabled:
 
-        RateLimit.update_timer()
-
         user = flask.request.remote_addr
-        methods = {}
-        for key, users in RateLimit.limit_dict.iteritems():
-            methods[key] = RateLimit.remaining(user, key)
+        api_key = flask.request.headers.get('X-API-Key')
 
-        ratelimit = dict(limit=RateLimit.limit, per=RateLimit.per,
-                         reset=RateLimit.reset, methods=methods)
+        ratelimit = RateLimit.summary(user, api_key)
     else:
         ratelimit = False
 
@@ -115,11 +122,11 @@ def html_info():
 @app.route('/api/v1/batch', methods=['POST'])
 @translate.utils.jsonp
 def batch_api():
-    """Batch multiple API calls into a single request."""
-    # TODO: Should there be a limit on the number of URLs here? Even though
-    #       ratelimiting is handled, this could be a potential target for
-    #       DOSing the server. This batch method is also quite a bit slower
-    #       than direct requests.
+    """Batch multiple API calls into a single request.
+
+    Requests are dispatched concurrently (up to SERVER['batch']['workers'] at a
+    time), but responses are always returned in the order they were given.
+    """
 
     # Flask raises a special error when this isn't provided
     try:
@@ -128,44 +135,49 @@ def batch_api():
         # Die with a 400 BAD REQUEST if we're given... a bad request.
         flask.abort(400)
 
+    conf = app.config['SERVER']['batch']
+
+    if conf['limit'] and len(urls) > conf['limit']:
+        raise APIException.batchlimit(len=len(urls), limit=conf['limit'])
+
     responses = []
 
-    for url in urls:
+    if len(urls) != 0:
+        # Count sub-requests against the ratelimit of the original client.
+        environ = {'REMOTE_ADDR': request.remote_addr}
 
-        # Pretend flask was just given the specified URL
-        ctx = app.test_request_context(url)
-        ctx.push()
+        if 'X-API-Key' in request.headers:
+            environ['HTTP_X_API_KEY'] = request.headers['X-API-Key']
 
-        # Dispatch URL (error + route handling) as a normal request.
-        resp = app.full_dispatch_request()
+        pool = ThreadPool(processes=min(conf['workers'], len(urls)))
+        results = [pool.apply_async(dispatch_batch_url, (url, environ))
+                   for url in urls]
+
+        # Let the worker threads exit once every request has finished, even
+        # if we give up on some of them before then.
+        pool.close()
+
+        deadline = time.time() + conf['timeout']
 
-        # If we requested an API url, load the serialized JSON so that the
-        # entire response can be loaded by the caller as a single JSON
-        # parse. If we didn't request an API method, just return a string, to
-        # be JSON-escaped when the final response is created.
-        #
-        # TODO: Maybe require API urls only?
-        if url.startswith("/api/v1/"):
+        for url, result in zip(urls, results):
             try:
-                resp_data = json.loads(resp.data)
-            except ValueError:
-                resp_data = {'error': "Bad JSON returned %s" % resp.data}
-        else:
-            resp_data = resp.data
-
-        # This will overwrite duplicate headers (resp.headers is a multimap),
-        # but we don't care about that, since there shouldn't be any duplicates
-        # returned.
-        headers = {}
-        for k, v in resp.headers.iteritems():
-            headers[k] = v
-
-        responses.append(dict(status=resp.status_code,
-                              headers=headers,
-                              url=url,
-                              data=resp_data))
-
-        ctx.pop()
+                responses.append(result.get(max(deadline - time.time(), 0)))
+
+            except multiprocessing.TimeoutError:
+                log.warning('Batch request %s missed the deadline', url)
+
+                responses.append(dict(status=504, headers={}, url=url, data={
+                    'code': 504,
+                    'status': 'Timed out',
+                    'url': url,
+                    'message': 'Request did not finish before the batch '
+                               'deadline',
+                    'details': {'timeout': conf['timeout']}
+                }))
+
+        # Everything finished on time, so nothing should be left running.
+        if len(responses) == len(urls) and all(r.ready() for r in results):
+            pool.join()
 
     # Pretty print
     js = json.dumps(responses, sort_keys=True, indent=4)
@@ -174,6 +186,46 @@ def batch_api():
     return resp, 200
 
 
+def dispatch_batch_url(url, environ):
+    """Dispatch a single URL from a batch request, and return a dict describing
+    the response.
+
+    This is run in a worker thread, so it sets up its own request context.
+    """
+
+    # Pretend flask was just given the specified URL
+    with app.test_request_context(url, environ_base=environ):
+
+        # Dispatch URL (error + route handling) as a normal request.
+        resp = app.full_dispatch_request()
+
+    # If we requested an API url, load the serialized JSON so that the
+    # entire response can be loaded by the caller as a single JSON
+    # parse. If we didn't request an API method, just return a string, to
+    # be JSON-escaped when the final response is created.
+    #
+    # TODO: Maybe require API urls only?
+    if url.startswith("/api/v1/"):
+        try:
+            resp_data = json.loads(resp.data)
+        except ValueError:
+            resp_data = {'error': "Bad JSON returned %s" % resp.data}
+    else:
+        resp_data = resp.data
+
+    # This will overwrite duplicate headers (resp.headers is a multimap),
+    # but we don't care about that, since there shouldn't be any duplicates
+    # returned.
+    headers = {}
+    for k, v in resp.headers.iteritems():
+        headers[k] = v
+
+    return dict(status=resp.status_code,
+                headers=headers,
+                url=url,
+                data=resp_data)
+
+
 @app.route('/api/v1/info')
 @translate.utils.jsonp
 def show_info():
@@ -188,25 +240,29 @@ def show_info():
                              'description': b.description,
                              'url': b.url,
                              'preference': b.preference,
-                             'pairs': b.language_pairs}
+                             'pairs': b.language_pairs,
+                             'health': manager.health(b),
+                             'quota': manager.quota(b)}
                             for b in manager.backends]
 
+    resp_obj['startup'] = manager.startup()
+    resp_obj['pairs_version'] = manager.pairs_version()
+
     if RateLimit.enabled:
         user = flask.request.remote_addr
+        api_key = flask.request.headers.get('X-API-Key')
 
-        # Make sure the ratelimit information is up to date.
-        RateLimit.update_timer()
-
-        methods = {}
-        for key, users in RateLimit.limit_dict.iteritems():
-            methods[key] = RateLimit.remaining(user, key)
-
-        resp_obj['ratelimit'] = dict(limit=RateLimit.limit, per=RateLimit.per,
-                                     reset=RateLimit.reset, methods=methods)
+        resp_obj['ratelimit'] = RateLimit.summary(user, api_key)
 
     if app.config['SERVER']['sizelimit']['enabled']:
         resp_obj['sizelimit'] = app.config['SERVER']['sizelimit']['limit']
 
+    if cache is not None:
+        resp_obj['cache'] = cache.info()
+
+    if memory is not None:
+        resp_obj['memory'] = memory.info()
+
     return flask.jsonify(**resp_obj)
 
 
@@ -215,15 +271,18 @@ def show_info():
 @ratelimit()
 @translate.utils.jsonp
 def list_pairs():
-    """Deduplicated list of language pairs that the server supports."""
+    """Deduplicated list of language pairs that the server supports.
+
+    The version of the list is sent as an ETag, so clients can cheaply check
+    whether their copy is still current with If-None-Match.
+    """
 
-    pairs = set()
+    version = manager.pairs_version()
 
-    for backend in manager.backends:
-        for pair in backend.language_pairs:
-            pairs.add(pair)
+    response = flask.jsonify(pairs=manager.pairs(), version=version)
+    response.set_etag(str(version))
 
-    return flask.jsonify(pairs=list(pairs))
+    return response.make_conditional(request)
 
 
 @app.route('/api/v1/translate')
@@ -250,41 +309,504 @@ def translate_text():
     if conf['enabled'] and bytelen > conf['limit']:
         raise APIException.sizelimit(len=bytelen, limit=conf['limit'])
 
-    # Try each translator sequentially (sorted by preference) until one works
-    backends = manager.find_all(source_lang, dest_lang)
+    quota = charge_bytes(bytelen)
+    if quota is not None and quota['over']:
+        raise APIException.bytelimit(size=bytelen, limit=quota['limit'],
+                                     per=quota['per'], reset=quota['reset'])
 
     # List of translator backend names that the client does not want to use
     excludes = request.args.getlist('exclude')
 
+    result = translate_single(text, source_lang, dest_lang, excludes)
+
+    return flask.Response(json.dumps(result), mimetype='application/json')
+
+
+@app.route('/api/v1/translate/batch', methods=['POST'])
+@ratelimit()
+@translate.utils.jsonp
+def translate_batch():
+    """Translate multiple texts in a single request.
+
+    Texts are grouped by language pair, and each group is handed to a backend
+    in a single call to IBackend.translate_many.
+    """
+
+    try:
+        body = json.loads(request.data)
+        segments = body['segments']
+        excludes = body.get('exclude', [])
+
+        if not isinstance(segments, list) or not isinstance(excludes, list):
+            raise ValueError('Expected lists')
+
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise APIException.translate(msg='Bad JSON body given')
+
+    limit = app.config['SERVER']['batch']['limit']
+    if limit and len(segments) > limit:
+        raise APIException.batchlimit(len=len(segments), limit=limit)
+
+    conf = app.config['SERVER']['sizelimit']
+
+    results = [None] * len(segments)
+
+    # (from, to) -> [indices of segments with that pair]. Results are put
+    # back by index, so the order groups are translated in doesn't matter.
+    groups = {}
+
+    for i, segment in enumerate(segments):
+        try:
+            text = segment.get('text')
+            source_lang = segment.get('from')
+            dest_lang = segment.get('to')
+        except AttributeError:
+            text = source_lang = dest_lang = None
+
+        if not text:
+            results[i] = APIException.translate(
+                msg='No translation text given').as_dict()
+            continue
+
+        if not source_lang:
+            results[i] = APIException.translate(
+                msg='No source language given').as_dict()
+            continue
+
+        if not dest_lang:
+            results[i] = APIException.translate(
+                msg='No destination language given').as_dict()
+            continue
+
+        # Anything else in the JSON (numbers, objects...) can't be translated
+        if not all(isinstance(value, basestring)
+                   for value in (text, source_lang, dest_lang)):
+            results[i] = APIException.translate(
+                msg='Text and languages must be strings').as_dict()
+            continue
+
+        bytelen = len(text.encode('utf-8'))
+        if conf['enabled'] and bytelen > conf['limit']:
+            results[i] = APIException.sizelimit(
+                len=bytelen, limit=conf['limit']).as_dict()
+            continue
+
+        quota = charge_bytes(bytelen)
+        if quota is not None and quota['over']:
+            results[i] = APIException.bytelimit(
+                size=bytelen, limit=quota['limit'], per=quota['per'],
+                reset=quota['reset']).as_dict()
+            continue
+
+        if cache is not None:
+            cached = cache.get(cache.key(text, source_lang, dest_lang,
+                                         excludes))
+
+            if cached is not None:
+                results[i] = {'from': source_lang,
+                              'to': dest_lang,
+                              'result': cached['result'],
+                              'translator': cached['translator'],
+                              'origin': 'backend'}
+                continue
+
+        if memory is not None:
+            results[i] = recall(text, source_lang, dest_lang, excludes)
+            if results[i] is not None:
+                continue
+
+        groups.setdefault((source_lang, dest_lang), []).append(i)
+
+    for (source_lang, dest_lang), indices in groups.iteritems():
+        texts = [segments[i]['text'] for i in indices]
+
+        group = translate_group(texts, source_lang, dest_lang, excludes)
+
+        for i, result in zip(indices, group):
+            results[i] = result
+
+    js = json.dumps(results)
+    return flask.Response(response=js, mimetype='application/json')
+
+
+@app.route('/api/v1/translate/document', methods=['POST'])
+@ratelimit()
+def translate_document():
+    """Translate a document of any size.
+
+    The body is either plain text (text/plain), which is split up on sentence
+    boundaries, or one JSON segment per line (application/x-ndjson). Either
+    way it's read and translated a piece at a time, and the translation is
+    streamed back as it's produced, so documents don't have to fit in memory.
+    """
+
+    source_lang = request.args.get('from', None)
+    if not source_lang:
+        raise APIException.translate(msg='No source language given')
+
+    dest_lang = request.args.get('to', None)
+    if not dest_lang:
+        raise APIException.translate(msg='No destination language given')
+
+    excludes = request.args.getlist('exclude')
+
+    # Check the pair before anything is streamed back, so that a document
+    # which can't be translated at all gets a proper status code.
+    if not manager.find_all(source_lang, dest_lang):
+        raise APIException.pair(from_lang=source_lang, to_lang=dest_lang,
+                                text=None)
+
+    if request.mimetype == 'application/x-ndjson':
+        pieces = translate_lines(request.stream, source_lang, dest_lang,
+                                 excludes)
+        mimetype = 'application/x-ndjson'
+
+    elif request.mimetype in ('', 'text/plain'):
+        pieces = translate_stream(request.stream, source_lang, dest_lang,
+                                  excludes)
+        mimetype = 'text/plain'
+
+    else:
+        raise APIException.translate(
+            msg='Unsupported content type {0}'.format(request.mimetype))
+
+    # Translate the first piece straight away, so that errors that would
+    # affect the whole document (e.g. every backend failing) can be reported
+    # with a proper status code, rather than in the middle of the response.
+    first = next(pieces, '')
+
+    return flask.Response(
+        flask.stream_with_context(
+            mark_failure(itertools.chain([first], pieces))),
+        mimetype=mimetype)
+
+
+def mark_failure(pieces):
+    """Yield each of pieces, until one raises an APIException. As the
+    response has already started by then, the error can't be given a status
+    code, so a NUL byte is sent instead, followed by the error as JSON. The
+    rest of the document is abandoned.
+    """
+
+    try:
+        for piece in pieces:
+            yield piece
+
+    except APIException as exc:
+        log.warning('Document translation failed part way: {0}'
+                    .format(exc.message))
+
+        yield '\0' + json.dumps(exc.as_dict())
+
+
+def translate_stream(stream, source_lang, dest_lang, excludes):
+    """Translate the UTF-8 text read from stream, yielding each chunk of the
+    translation (encoded in UTF-8) in turn.
+
+    If a chunk can't be translated, its APIException is raised and the rest
+    of the text is abandoned (see mark_failure).
+    """
+
+    limit = app.config['SERVER']['document']['segment']
+
+    conf = app.config['SERVER']['sizelimit']
+    if conf['enabled']:
+        limit = min(limit, conf['limit'])
+
+    def read():
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+        while True:
+            block = stream.read(limit)
+            if not block:
+                break
+
+            yield decoder.decode(block)
+
+        yield decoder.decode('', True)
+
+    for chunk in translate.segment.segment(read(), limit):
+        # Nothing to translate
+        if not chunk.strip():
+            yield chunk.encode('utf-8')
+            continue
+
+        bytelen = len(chunk.encode('utf-8'))
+
+        quota = charge_bytes(bytelen)
+        if quota is not None and quota['over']:
+            raise APIException.bytelimit(size=bytelen, limit=quota['limit'],
+                                         per=quota['per'],
+                                         reset=quota['reset'])
+
+        result = translate_single(chunk, source_lang, dest_lang, excludes)
+
+        trans = translate.segment.restore(chunk, result['result'])
+        yield trans.encode('utf-8')
+
+
+def translate_lines(stream, source_lang, dest_lang, excludes):
+    """Translate each line of NDJSON read from stream, yielding a line of
+    JSON for each, in the same format as translate_batch.
+
+    Each line is either a JSON string, or an object with a 'text' key. Blank
+    lines are skipped.
+    """
+
+    conf = app.config['SERVER']['sizelimit']
+
+    for line in stream:
+        if not line.strip():
+            continue
+
+        try:
+            text = json.loads(line)
+
+            if isinstance(text, dict):
+                text = text.get('text')
+
+        except ValueError:
+            text = None
+
+        try:
+            if not isinstance(text, basestring) or not text:
+                raise APIException.translate(msg='No translation text given')
+
+            bytelen = len(text.encode('utf-8'))
+
+            if conf['enabled'] and bytelen > conf['limit']:
+                raise APIException.sizelimit(len=bytelen, limit=conf['limit'])
+
+            quota = charge_bytes(bytelen)
+            if quota is not None and quota['over']:
+                raise APIException.bytelimit(
+                    size=bytelen, limit=quota['limit'], per=quota['per'],
+                    reset=quota['reset'])
+
+            result = translate_single(text, source_lang, dest_lang, excludes)
+
+        except APIException as exc:
+            result = exc.as_dict()
+
+        yield json.dumps(result) + '\n'
+
+
+def healthy(exc):
+    """Return whether a request to a backend which raised exc (or None if it
+    succeeded) shows that the backend is working. Services refusing to
+    translate a particular text are working fine, so that doesn't count
+    against their circuit breakers, whatever the client sent."""
+
+    return exc is None or isinstance(exc, ContentException)
+
+
+def translate_single(text, source_lang, dest_lang, excludes):
+    """Translate text, trying each capable backend in turn (or racing them if
+    hedging is enabled) until one succeeds.
+
+    Returns a result dict containing 'from', 'to', 'result', 'translator' and
+    'origin', or raises an APIException if the text couldn't be translated.
+    """
+
+    # Upstream quotas are counted in characters
+    size = len(text)
+
+    if cache is not None:
+        cache_key = cache.key(text, source_lang, dest_lang, excludes)
+        cached = cache.get(cache_key)
+
+        if cached is not None:
+            return {'from': source_lang,
+                    'to': dest_lang,
+                    'result': cached['result'],
+                    'translator': cached['translator'],
+                    'origin': 'backend'}
+
+    if memory is not None:
+        recalled = recall(text, source_lang, dest_lang, excludes)
+        if recalled is not None:
+            return recalled
+
+    # Try each translator sequentially (sorted by preference) until one works,
+    # or race them against each other if hedging is enabled.
+    backends = manager.find_all(source_lang, dest_lang)
+
     if len(backends) == 0:
         raise APIException.pair(from_lang=source_lang, to_lang=dest_lang,
                                 text=text)
 
+    for backend in list(backends):
+        if backend.name in excludes:
+            log.info("Skipping %s, client disapproved.", backend.name)
+            backends.remove(backend)
+
+        elif not manager.available(backend, size):
+            log.info("Skipping %s, over quota or failing.", backend.name)
+            backends.remove(backend)
+
+    tried = []
+    result = None
+
+    if hedger is not None and len(backends) > 1:
+        def report(backend, exc, latency):
+            manager.record(backend, healthy(exc), latency,
+                           (source_lang, dest_lang), size)
+
+            if isinstance(exc, QuotaException):
+                manager.exhaust(backend)
+
+        try:
+            result = hedger.translate(backends, text, source_lang, dest_lang,
+                                      tried, report=report,
+                                      admit=manager.allow)
+        except TranslationException:
+            pass
+
+    else:
+        for backend in backends:
+            # Only claim a probe of a recovering backend once it's actually
+            # about to be used.
+            if not manager.allow(backend):
+                continue
+
+            tried.append(backend.name)
+            start = time.time()
+
+            try:
+                trans = call_backend(backend, 'translate', text, source_lang,
+                                     dest_lang)
+
+                if trans is None or trans == "":
+                    raise TranslationException("Received empty result text")
+
+            except TranslationException as exc:
+                manager.record(backend, healthy(exc), time.time() - start,
+                               (source_lang, dest_lang), size)
+
+                if isinstance(exc, QuotaException):
+                    manager.exhaust(backend)
+
+                log.warning('{0} failed to translate text: {1}'
+                            .format(backend.name, exc))
+                continue
+
+            manager.record(backend, True, time.time() - start,
+                           (source_lang, dest_lang), size)
+
+            result = (backend, trans)
+            break
+
+    if result is None:
+        raise APIException.translator(from_lang=source_lang,
+                                      to_lang=dest_lang, text=text,
+                                      tried=tried)
+
+    backend, trans = result
+
+    if cache is not None:
+        cache.set(cache_key, {'result': trans, 'translator': backend.name})
+
+    if memory is not None:
+        memory.add(text, source_lang, dest_lang, trans, backend.name)
+
+    return {'from': source_lang,
+            'to': dest_lang,
+            'result': trans,
+            'translator': backend.name,
+            'origin': 'backend'}
+
+
+def recall(text, source_lang, dest_lang, excludes):
+    """Look text up in the translation memory, returning a result dict in the
+    same format as translate_single, with the 'match' score added, or None if
+    the memory doesn't have a translation for it.
+    """
+
+    match = memory.lookup(text, source_lang, dest_lang, excludes)
+
+    if match is None:
+        return None
+
+    return {'from': source_lang,
+            'to': dest_lang,
+            'result': match['translation'],
+            'translator': match['backend'],
+            'origin': 'memory',
+            'match': match['score']}
+
+
+def translate_group(texts, source_lang, dest_lang, excludes):
+    """Translate a list of texts sharing a language pair, trying each capable
+    backend until one manages to translate all of them.
+
+    Returns a list containing a result dict for each text, in the same format
+    as translate_text, or the dict of an APIException if translation failed.
+    """
+
+    backends = manager.find_all(source_lang, dest_lang)
+
+    if len(backends) == 0:
+        return [APIException.pair(from_lang=source_lang, to_lang=dest_lang,
+                                  text=text).as_dict() for text in texts]
+
     tried = []
+    size = sum(len(text) for text in texts)
 
     for backend in backends:
         if backend.name in excludes:
             log.info("Skipping %s, client disapproved.", backend.name)
             continue
 
+        if not manager.available(backend, size) or \
+                not manager.allow(backend):
+            log.info("Skipping %s, over quota or failing.", backend.name)
+            continue
+
         tried.append(backend.name)
+        start = time.time()
 
         try:
-            trans = backend.translate(text, source_lang, dest_lang)
+            translations = call_backend(backend, 'translate_many', texts,
+                                        source_lang, dest_lang)
 
-            if trans is None or trans == "":
-                raise TranslationException("Received empty result text")
+            if len(translations) != len(texts):
+                raise TranslationException("Received wrong number of results")
 
-            return flask.Response(json.dumps({
-                'from': source_lang,
-                'to': dest_lang,
-                'result': trans,
-                'translator': backend.name
-            }), mimetype='application/json')
+            if any(trans is None or trans == "" for trans in translations):
+                raise TranslationException("Received empty result text")
 
         except TranslationException as exc:
-            log.warning('{0} failed to translate text: {1}'
+            manager.record(backend, healthy(exc), time.time() - start,
+                           (source_lang, dest_lang), size)
+
+            if isinstance(exc, QuotaException):
+                manager.exhaust(backend)
+
+            log.warning('{0} failed to translate texts: {1}'
                         .format(backend.name, exc))
+            continue
+
+        manager.record(backend, True, time.time() - start,
+                       (source_lang, dest_lang), size)
+
+        results = []
+
+        for text, trans in zip(texts, translations):
+            if cache is not None:
+                cache.set(cache.key(text, source_lang, dest_lang, excludes),
+                          {'result': trans, 'translator': backend.name})
+
+            if memory is not None:
+                memory.add(text, source_lang, dest_lang, trans, backend.name)
+
+            results.append({'from': source_lang,
+                            'to': dest_lang,
+                            'result': trans,
+                            'translator': backend.name,
+                            'origin': 'backend'})
+
+        return results
 
-    raise APIException.translator(from_lang=source_lang, to_lang=dest_lang,
-                                  text=text, tried=tried)
+    return [APIException.translator(from_lang=source_lang, to_lang=dest_lang,
+                                    text=text, tried=tried).as_dict()
+            for text in texts]
@@ -24,21 +24,78 @@ inherit from.
 """
 
 import abc
+import hashlib
+import json
+import os
+import random
+import threading
+import time
 import utils
+import zlib
+
+from multiprocessing.pool import ThreadPool
 
 from . import log
+from .backends import BUILTIN
+
+# Entry point group other packages can register backends under
+ENTRY_POINT_GROUP = 'translate.backends'
 
 
 class BackendManager(object):
     """Handles the loading and management of various translation service
     backends."""
 
-    def __init__(self, config):
+    def __init__(self, config, breaker=None, scoring=None, quota=None,
+                 startup=None, pairs=None):
+        """
+        :param config: dict of backend configurations, by backend name (its
+                       module name, for backends shipped with translate).
+        :param breaker: dict of keyword arguments for the CircuitBreaker of
+                        each backend, or None to never skip backends.
+        :param scoring: dict of keyword arguments for BackendStats, to order
+                        backends by their observed performance as well as
+                        preference, or None to only use preference.
+        :param quota: dict of keyword arguments for QuotaTracker, or None to
+                      ignore the upstream quotas of backends.
+        :param startup: dict of keyword arguments for load_backends (the
+                        activation 'deadline' and number of 'workers').
+        :param pairs: dict of keyword arguments for PairCache, or None to
+                      discover the language pairs of backends every time.
+        """
+
         self.backends = []
         self.config = config
 
-        # Load the default backends
-        self.load_backends('translate/backends')
+        # Backend name -> 'warming', 'active' or 'disabled'
+        self.status = {}
+        # Backend name -> seconds taken to activate
+        self.timings = {}
+        # Backend name -> position in the order backends were loaded
+        self.order = {}
+
+        # Held while changing the set of backends. Readers don't need it.
+        self.lock = threading.RLock()
+
+        self.breaker_conf = breaker
+        self.breakers = {}
+
+        self.adaptive = scoring is not None
+        self.stats = BackendStats(**(scoring or {}))
+
+        self.quotas = QuotaTracker(**quota) if quota is not None else None
+        self.pair_cache = PairCache(**pairs) if pairs is not None else None
+
+        # Tuple of ({(src, dst): [backends by preference]}, [all pairs],
+        # version of the pairs). This is replaced as a whole whenever it's
+        # rebuilt, so readers never see the parts out of sync.
+        self._index = ({}, [], 0)
+
+        # Set to stop the background refresh of language pairs
+        self.stopping = threading.Event()
+
+        # Load the configured backends
+        self.load_backends(**(startup or {}))
 
     def shutdown(self):
         """Calls the deactivate functions for each of the backends to give them
@@ -46,13 +103,37 @@ class BackendManager(object):
 
         Called on server exit"""
 
+        self.stopping.set()
+
         for backend in self.backends:
             backend.deactivate()
 
-    def load_backends(self, dir_name):
-        """Load all backends from the given absolute directory name"""
+        if self.quotas is not None:
+            self.quotas.save()
+
+    def load_backends(self, dir_name=None, deadline=None, workers=8):
+        """Load every active backend in the configuration (see find_backend),
+        or if dir_name is given, every backend in the modules in that
+        directory.
+
+        Backends are activated in parallel, since most of them have to ask a
+        remote service for their language pairs. Any that haven't finished
+        after deadline seconds are left to finish in the background, and are
+        'warming' (and not routed to) until they do.
+
+        :param deadline: seconds to wait for backends to activate, or None to
+                         wait for all of them.
+        :param workers: maximum number of backends to activate at once.
+        """
+
+        pending = []
 
-        for subclass, module in utils.find_subclasses(dir_name, IBackend):
+        if dir_name is None:
+            found = self.find_configured()
+        else:
+            found = utils.find_subclasses(dir_name, IBackend)
+
+        for subclass, module in found:
             backend_conf = self.config.get(module, dict())
 
             # Update the preference according the configuration
@@ -68,33 +149,832 @@ class BackendManager(object):
                 log.warning(repr(exc))
                 continue
 
-            if backend.activate(backend_conf):
-                log.info("Loading backend {0}... ".format(backend.name))
-                self.backends.append(backend)
+            self.status[backend.name] = 'warming'
+            self.order[backend.name] = len(self.order)
+
+            backend.pair_cache = self.pair_cache
+
+            pending.append((backend, backend_conf))
+
+        if len(pending) == 0:
+            self.build_index()
+            return
+
+        start = time.time()
+
+        pool = ThreadPool(processes=min(workers, len(pending)))
+        results = [pool.apply_async(self._activate, args)
+                   for args in pending]
+
+        # Let stragglers finish on their own
+        pool.close()
+
+        for result in results:
+            if deadline is None:
+                result.wait()
             else:
+                result.wait(max(start + deadline - time.time(), 0))
+
+        log.info('Backends activated in {0:.2f}s: {1}'.format(
+            time.time() - start,
+            ', '.join('{0} {1}'.format(backend.name, self._timing(backend))
+                      for backend, _ in pending)))
+
+    def find_configured(self):
+        """Return a list of tuples of (backend class, name) for every backend
+        that's configured as active. Only these backends are imported."""
+
+        found = []
+
+        for name in sorted(self.config):
+            backend_conf = self.config[name] or {}
+
+            if not backend_conf.get('active', True):
+                continue
+
+            try:
+                subclass = find_backend(name, backend_conf)
+            except Exception as exc:
+                log.warning('Failed to import backend {0}: {1!r}'
+                            .format(name, exc))
+                continue
+
+            if subclass is None:
+                log.warning('No backend named {0} is installed'.format(name))
+                continue
+
+            found.append((subclass, name))
+
+        return found
+
+    def _activate(self, backend, backend_conf):
+        """Activate backend, then start routing requests to it if that
+        succeeded. Called from a worker thread by load_backends."""
+
+        start = time.time()
+
+        try:
+            active = backend.activate(backend_conf)
+        except Exception as exc:
+            log.warning('Failed to activate backend {0}: {1!r}'
+                        .format(backend.name, exc))
+            active = False
+
+        with self.lock:
+            self.timings[backend.name] = time.time() - start
+
+            if not active:
                 log.info("Disabling backend {0}...".format(backend.name))
+                self.status[backend.name] = 'disabled'
+                return
+
+            log.info("Loading backend {0}... ".format(backend.name))
+            self.status[backend.name] = 'active'
+
+            # Keep the order backends were loaded in, whichever finished
+            # first.
+            self.backends = sorted(
+                self.backends + [backend],
+                key=lambda b: self.order.get(b.name, len(self.order)))
+
+            if self.breaker_conf is not None:
+                self.breakers[backend.name] = \
+                    CircuitBreaker(backend.name, **self.breaker_conf)
+
+            quota = backend_conf.get('quota', backend.quota)
+            if self.quotas is not None and quota is not None:
+                self.quotas.declare(backend.name, **quota)
+
+            self.build_index()
+
+        # Pairs from the cache are good enough to start with, but if they're
+        # old, check whether they've changed.
+        if self.pair_cache is not None and \
+                self.pair_cache.get(backend) is not None and \
+                self.pair_cache.stale(backend):
+            thread = threading.Thread(target=self.refresh, args=(backend,))
+            thread.daemon = True
+            thread.start()
+
+    def refresh(self, backend):
+        """Ask backend for its current language pairs, and route requests by
+        them from now on. Returns whether the pairs were updated. If none
+        could be found, the old pairs are kept.
+        """
+
+        try:
+            pairs = backend.discover_pairs()
+        except Exception as exc:
+            log.warning('Failed to refresh language pairs of {0}: {1!r}'
+                        .format(backend.name, exc))
+            return False
+
+        pairs = list(set(tuple(pair) for pair in pairs))
+
+        if len(pairs) == 0:
+            log.warning('{0} found no language pairs, keeping the old ones'
+                        .format(backend.name))
+            return False
+
+        if self.pair_cache is not None:
+            self.pair_cache.set(backend, pairs)
+
+        if set(pairs) == set(backend.language_pairs):
+            return False
+
+        log.info('Language pairs of {0} changed'.format(backend.name))
+
+        with self.lock:
+            backend.language_pairs = pairs
+            self.build_index()
+
+        return True
+
+    def start_refresh(self, interval, jitter=0.1):
+        """Start a background thread which refreshes the language pairs of
+        every backend (that discovers its pairs) every interval seconds, give
+        or take a random fraction jitter of that, so that several server
+        processes don't all hit a service at once. Stops on shutdown.
+        """
+
+        def run():
+            while not self.stopping.wait(
+                    interval * random.uniform(1 - jitter, 1 + jitter)):
+
+                for backend in list(self.backends):
+                    if discovers_pairs(backend):
+                        self.refresh(backend)
+
+        thread = threading.Thread(target=run, name='pair-refresh')
+        thread.daemon = True
+        thread.start()
+
+        return thread
+
+    def _timing(self, backend):
+        status = self.status.get(backend.name)
+        timing = self.timings.get(backend.name)
+
+        if timing is None:
+            return '({0})'.format(status)
+
+        return '{0:.2f}s ({1})'.format(timing, status)
+
+    def startup(self):
+        """Return a dict describing the activation of every backend that was
+        loaded, by name, containing its 'status' ('warming', 'active' or
+        'disabled'), and the 'time' in seconds it took to activate, or None
+        if it's still warming."""
+
+        return dict((name, {'status': status,
+                            'time': self.timings.get(name)})
+                    for name, status in self.status.items())
+
+    def disable(self, backend):
+        """Deactivate a loaded backend and stop routing requests to it."""
+
+        with self.lock:
+            if backend not in self.backends:
+                return
+
+            self.backends.remove(backend)
+            self.status[backend.name] = 'disabled'
+            self.build_index()
+
+        backend.deactivate()
+
+    def reweight(self, backend, preference):
+        """Change the preference of a loaded backend."""
+
+        with self.lock:
+            backend.preference = preference
+            self.build_index()
+
+    def build_index(self):
+        """Rebuild the mapping of language pairs to backends. This needs to
+        be called whenever the set of backends, their preferences or their
+        language pairs change.
+        """
+
+        routes = {}
+
+        # sorted() is stable, so backends with equal preference keep the order
+        # they were loaded in.
+        for backend in sorted(self.backends, reverse=True,
+                              key=lambda b: b.preference):
+            for pair in set(backend.language_pairs):
+                routes.setdefault(tuple(pair), []).append(backend)
+
+        # Sort by from_language, then to_language
+        pairs = sorted(routes.keys())
+
+        # Derived from the pairs themselves, so every server process agrees
+        version = zlib.crc32(json.dumps(pairs)) & 0xffffffff
+
+        self._index = (routes, pairs, version)
+
+    def pairs(self):
+        """Return the deduplicated list of every language pair that can be
+        handled by at least one backend."""
+
+        return self._index[1]
+
+    def pairs_version(self):
+        """Return a number which changes whenever the list returned by pairs
+        does, so that clients can tell whether their copy is out of date."""
+
+        return self._index[2]
 
     def find_all(self, src, dst):
         """Return all translation backends that can possibly serve this
-        request, sorted by preference (high first)
+        request, sorted by preference (high first), or by score if adaptive
+        ordering is enabled.
         """
 
-        backends = [b for b in self.backends
-                    if (src, dst) in b.language_pairs]
+        backends = self._index[0].get((src, dst), [])
+
+        if self.adaptive:
+            return sorted(backends, reverse=True,
+                          key=lambda b: self.stats.score(b, src, dst))
 
-        return sorted(backends, reverse=True, key=lambda b: b.preference)
+        return list(backends)
 
     def find_best(self, src, dst):
         """Find the best backend service for a given language pair"""
 
-        best = (None, -1)
+        if self.adaptive:
+            backends = self.find_all(src, dst)
+        else:
+            backends = self._index[0].get((src, dst))
 
-        for backend in self.backends:
-            if (src, dst) in backend.language_pairs:
-                if backend.preference > best[1]:
-                    best = (backend, backend.preference)
+        return backends[0] if backends else None
+
+    def available(self, backend, size=0):
+        """Return whether a request for size characters of text could
+        currently be sent to backend, i.e. it wouldn't go over the backend's
+        upstream quota and its circuit breaker isn't open. This has no side
+        effects, so call allow just before actually sending the request."""
+
+        if self.quotas is not None and \
+                not self.quotas.allows(backend.name, size):
+            return False
+
+        breaker = self.breakers.get(backend.name)
+
+        return breaker is None or breaker.ready()
+
+    def allow(self, backend):
+        """Return whether a request can be sent to backend right now. If its
+        circuit breaker is half open, this uses up the probe, so only call it
+        when the request is about to be sent."""
+
+        breaker = self.breakers.get(backend.name)
+
+        return breaker is None or breaker.allow()
+
+    def record(self, backend, success, latency, pair=None, size=0):
+        """Record the outcome of a request to backend for size characters of
+        text, which took latency seconds. If pair is given as (src, dst), the
+        request also counts towards the backend's statistics for that language
+        pair.
+        """
+
+        breaker = self.breakers.get(backend.name)
+
+        if breaker is not None:
+            breaker.record(success, latency)
+
+        if pair is not None:
+            self.stats.record(backend, pair[0], pair[1], success, latency)
+
+        # Upstream services count failed requests too
+        if self.quotas is not None:
+            self.quotas.consume(backend.name, size)
+
+    def quota(self, backend):
+        """Return a dict describing the upstream quota of backend and how much
+        of it has been used, or None if it isn't tracked."""
+
+        if self.quotas is None:
+            return None
+
+        return self.quotas.info(backend.name)
+
+    def exhaust(self, backend):
+        """Stop sending requests to backend until its quota resets, because
+        the upstream service says it has been used up."""
+
+        if self.quotas is not None:
+            self.quotas.exhaust(backend.name)
+
+    def health(self, backend):
+        """Return a dict describing the state of backend's circuit breaker, or
+        None if it doesn't have one."""
+
+        breaker = self.breakers.get(backend.name)
+
+        return breaker.info() if breaker is not None else None
+
+
+def find_backend(name, config=None):
+    """Import and return the backend class configured as name, or None if
+    there's no such backend.
+
+    The class is named by the 'module' option of config if it has one (as
+    'package.module:ClassName'), or else looked up in the backends shipped
+    with translate, then in the entry points other packages have registered
+    in the 'translate.backends' group.
+    """
+
+    spec = (config or {}).get('module', BUILTIN.get(name))
+
+    if spec is not None:
+        return utils.import_object(spec)
+
+    # Only scan installed packages when a backend isn't one of ours, since
+    # that's slow.
+    try:
+        import pkg_resources
+    except ImportError:
+        return None
+
+    for entry_point in pkg_resources.iter_entry_points(ENTRY_POINT_GROUP,
+                                                       name):
+        return entry_point.load()
+
+    return None
+
+
+def discovers_pairs(backend):
+    """Return whether backend finds its language pairs with discover_pairs,
+    rather than having a fixed list."""
+
+    return type(backend).discover_pairs.__func__ is not \
+        IBackend.discover_pairs.__func__
+
+
+class BackendStats(object):
+    """Rolling estimates of the latency and success rate of each backend for
+    each language pair, as exponentially weighted moving averages.
+
+    These are combined with a backend's static preference into a score:
+
+        preference - latency * mean latency - errors * error rate
+
+    so by default, each second of latency costs a backend 10 points of
+    preference, and failing every request costs it 50.
+
+    A backend that scores badly stops being chosen, and so stops being
+    measured, so the averages also decay towards nothing (leaving just the
+    preference) while a backend isn't used, halving every `decay` seconds.
+    This way a demoted backend is tried again once it has had time to
+    recover.
+    """
+
+    def __init__(self, alpha=0.2, latency=10, errors=50, decay=300):
+        """
+        :param alpha: weight of each new observation in the averages, between
+                      0 and 1. Higher values react faster to changes.
+        :param latency: preference points lost per second of mean latency.
+        :param errors: preference points lost at a 100% error rate.
+        :param decay: half life in seconds of the averages while a backend
+                      isn't used, or None to keep them until it's used again.
+        """
+
+        self.alpha = alpha
+        self.latency_weight = latency
+        self.error_weight = errors
+        self.decay = decay
+
+        # (backend name, src, dst) -> [mean latency, mean error rate, time of
+        # the last observation]
+        self.averages = {}
+        self.lock = threading.Lock()
+
+    def record(self, backend, src, dst, success, latency, now=None):
+        key = (backend.name, src, dst)
+        error = 0.0 if success else 1.0
+        now = now if now is not None else time.time()
+
+        with self.lock:
+            averages = self.averages.get(key)
+
+            # Start from the first observation, rather than biasing towards 0
+            if averages is None:
+                self.averages[key] = [latency, error, now]
+                return
+
+            mean_latency, errors = self._decayed(averages, now)
 
-        return best[0]
+            averages[:] = [mean_latency + self.alpha * (latency -
+                                                        mean_latency),
+                           errors + self.alpha * (error - errors),
+                           now]
+
+    def get(self, backend, src, dst, now=None):
+        """Return a tuple of (mean latency, error rate) for backend on the
+        given pair, or None if it hasn't been used for it yet."""
+
+        averages = self.averages.get((backend.name, src, dst))
+
+        if averages is None:
+            return None
+
+        return self._decayed(averages,
+                             now if now is not None else time.time())
+
+    def score(self, backend, src, dst, now=None):
+        """Return the score of backend for the given pair (higher is better).
+        Backends that haven't been used yet are scored by preference alone,
+        so that they get tried."""
+
+        averages = self.get(backend, src, dst, now)
+
+        if averages is None:
+            return backend.preference
+
+        latency, errors = averages
+
+        return backend.preference - self.latency_weight * latency - \
+            self.error_weight * errors
+
+    def _decayed(self, averages, now):
+        """Return (mean latency, error rate) from averages, decayed for the
+        time since they were last updated."""
+
+        latency, errors, updated = averages
+
+        if self.decay is None:
+            return latency, errors
+
+        weight = 0.5 ** (max(now - updated, 0) / float(self.decay))
+
+        return latency * weight, errors * weight
+
+
+class QuotaTracker(object):
+    """Tracks how much of the upstream quota of each metered backend has been
+    used, so that requests can go elsewhere before the quota runs out rather
+    than after a request fails.
+
+    Quotas are counted in windows of `per` seconds aligned to the epoch (so a
+    daily quota resets at midnight UTC). Usage is kept in memory, and written
+    to a JSON file every so often and on shutdown so it survives restarts.
+    Each server process counts its own usage.
+    """
+
+    # Write usage to disk every this many requests
+    SAVE_EVERY = 20
+
+    def __init__(self, path=None, margin=0.05):
+        """
+        :param path: file name to persist usage in, or None to keep it in
+                     memory only.
+        :param margin: fraction of each quota to leave unused, to allow for
+                       requests made elsewhere or miscounted.
+        """
+
+        self.path = path
+        self.margin = margin
+
+        # name -> (requests, characters, per)
+        self.quotas = {}
+
+        # name -> {'window': end of window, 'requests': n, 'characters': n,
+        #          'exhausted': bool}
+        self.usage = {}
+
+        self.lock = threading.Lock()
+        self.changes = 0
+
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.usage = json.load(f)
+            except (IOError, ValueError) as exc:
+                log.warning('Ignoring bad quota usage file {0}: {1}'
+                            .format(path, exc))
+
+    def declare(self, name, per, requests=None, characters=None):
+        """Declare that the backend called name can make requests requests,
+        translating characters characters of text, every per seconds. Either
+        limit can be None if there isn't one."""
+
+        self.quotas[name] = (requests, characters, per)
+
+    def allows(self, name, size):
+        """Return whether another request for size characters of text to the
+        backend called name would stay within its quota."""
+
+        if name not in self.quotas:
+            return True
+
+        requests, size_limit, _ = self.quotas[name]
+        usage = self._usage(name)
+
+        if usage['exhausted']:
+            return False
+
+        scale = 1 - self.margin
+
+        if requests is not None and usage['requests'] + 1 > requests * scale:
+            return False
+
+        if size_limit is not None and \
+                usage['characters'] + size > size_limit * scale:
+            return False
+
+        return True
+
+    def consume(self, name, size):
+        """Count a request for size characters of text to the backend called
+        name."""
+
+        if name not in self.quotas:
+            return
+
+        with self.lock:
+            usage = self._usage(name)
+            usage['requests'] += 1
+            usage['characters'] += size
+
+            self.changes += 1
+            save = self.changes % QuotaTracker.SAVE_EVERY == 0
+
+        if save:
+            self.save()
+
+    def exhaust(self, name):
+        """Mark the quota of the backend called name as used up until the end
+        of the current window."""
+
+        if name not in self.quotas:
+            return
+
+        with self.lock:
+            self._usage(name)['exhausted'] = True
+
+        log.warning('{0} has used up its quota'.format(name))
+        self.save()
+
+    def info(self, name):
+        """Return a dict describing the quota and usage of the backend called
+        name, or None if it doesn't have a quota."""
+
+        if name not in self.quotas:
+            return None
+
+        requests, size_limit, per = self.quotas[name]
+        usage = self._usage(name)
+
+        return {'requests': usage['requests'],
+                'characters': usage['characters'],
+                'max_requests': requests, 'max_characters': size_limit,
+                'per': per, 'reset': usage['window'],
+                'exhausted': usage['exhausted']}
+
+    def save(self):
+        """Write usage to disk, if there's a file to write it to."""
+
+        if self.path is None:
+            return
+
+        with self.lock:
+            data = json.dumps(self.usage)
+
+        # Write to a temporary file and rename it into place, so the file is
+        # never left half written.
+        tmp = '{0}.{1}.tmp'.format(self.path, os.getpid())
+
+        try:
+            with open(tmp, 'w') as f:
+                f.write(data)
+            os.rename(tmp, self.path)
+        except (IOError, OSError) as exc:
+            log.warning('Failed to save quota usage to {0}: {1}'
+                        .format(self.path, exc))
+
+    def _usage(self, name):
+        """Return the usage dict for the current window of the backend called
+        name, starting a new one if the last has ended."""
+
+        per = self.quotas[name][2]
+        now = time.time()
+
+        usage = self.usage.get(name)
+
+        if usage is None or usage['window'] <= now:
+            usage = self.usage[name] = {
+                'window': (now // per) * per + per,
+                'requests': 0,
+                'characters': 0,
+                'exhausted': False
+            }
+
+        return usage
+
+
+class CircuitBreaker(object):
+    """Tracks failures of a single backend, to stop sending it requests while
+    it's broken.
+
+    The breaker starts out closed, letting every request through. After
+    `failures` consecutive failed (or slow) requests it opens, and no requests
+    are let through for `reset` seconds. It is then half open: a single probe
+    request is let through every `interval` seconds, and the first one to
+    succeed closes the breaker again, while a failure reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, failures=5, reset=30, interval=5, slow=None):
+        """
+        :param name: name of the backend, for logging.
+        :param failures: consecutive failures after which to open.
+        :param reset: seconds to stay open before letting probes through.
+        :param interval: seconds between probes while half open.
+        :param slow: requests taking longer than this many seconds count as
+                     failures, even if they succeed. None to disable.
+        """
+
+        self.name = name
+        self.max_failures = failures
+        self.reset = reset
+        self.interval = interval
+        self.slow = slow
+
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.opened = None
+        self.next_probe = None
+
+        self.lock = threading.Lock()
+
+    def ready(self):
+        """Return whether allow would let a request through right now,
+        without using up a probe."""
+
+        now = time.time()
+
+        with self.lock:
+            if self.state == CircuitBreaker.CLOSED:
+                return True
+
+            if self.state == CircuitBreaker.OPEN:
+                return now >= self.opened + self.reset
+
+            return now >= self.next_probe
+
+    def allow(self):
+        """Return whether a request should be let through right now. While
+        half open, this lets the probe through, so it should only be called
+        for requests which are about to be sent."""
+
+        now = time.time()
+
+        with self.lock:
+            if self.state == CircuitBreaker.CLOSED:
+                return True
+
+            if self.state == CircuitBreaker.OPEN:
+                if now < self.opened + self.reset:
+                    return False
+
+                self.state = CircuitBreaker.HALF_OPEN
+                self.next_probe = now
+
+            if now < self.next_probe:
+                return False
+
+            self.next_probe = now + self.interval
+            return True
+
+    def record(self, success, latency):
+        """Record the outcome of a request that was let through."""
+
+        if self.slow is not None and latency > self.slow:
+            success = False
+
+        with self.lock:
+            if success:
+                self.state = CircuitBreaker.CLOSED
+                self.failures = 0
+                return
+
+            self.failures += 1
+
+            if self.state == CircuitBreaker.HALF_OPEN or \
+                    self.failures >= self.max_failures:
+                if self.state != CircuitBreaker.OPEN:
+                    log.warning('Not using {0} for {1} seconds after {2} '
+                                'failures'.format(self.name, self.reset,
+                                                  self.failures))
+
+                self.state = CircuitBreaker.OPEN
+                self.opened = time.time()
+
+    def info(self):
+        """Return a dict describing the state of the breaker."""
+
+        return {'state': self.state, 'failures': self.failures}
+
+
+class PairCache(object):
+    """On-disk cache of the language pairs discovered by each backend, so a
+    freshly started server (or worker) can route requests straight away
+    instead of asking every service which pairs it supports.
+
+    Entries are keyed by backend name and a digest of the backend's
+    configuration, so that e.g. changing an API key doesn't reuse pairs found
+    with the old one. Entries older than the TTL are still used, but the
+    backend is asked for its pairs again in the background.
+    """
+
+    # Bump this whenever the format of the file changes
+    VERSION = 1
+
+    def __init__(self, path, ttl=24 * 60 * 60):
+        """
+        :param path: file name of the JSON file to keep pairs in.
+        :param ttl: seconds after which pairs should be discovered again.
+        """
+
+        self.path = path
+        self.ttl = ttl
+
+        # name -> {'config': digest, 'time': when found, 'pairs': [...]}
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        try:
+            with open(path) as f:
+                data = json.load(f)
+
+            if data.get('version') == PairCache.VERSION:
+                self.entries = data['backends']
+
+        except (IOError, ValueError, KeyError, AttributeError) as exc:
+            if os.path.exists(path):
+                log.warning('Ignoring bad language pair cache {0}: {1}'
+                            .format(path, exc))
+
+    def get(self, backend):
+        """Return the cached list of language pairs of backend, or None if
+        there isn't one."""
+
+        entry = self._entry(backend)
+
+        if entry is None:
+            return None
+
+        return [tuple(pair) for pair in entry['pairs']]
+
+    def stale(self, backend):
+        """Return whether the cached pairs of backend are older than the
+        TTL (or missing)."""
+
+        entry = self._entry(backend)
+
+        return entry is None or entry['time'] + self.ttl <= time.time()
+
+    def set(self, backend, pairs):
+        """Replace the cached pairs of backend, and save the cache."""
+
+        with self.lock:
+            self.entries[backend.name] = {'config': self._digest(backend),
+                                          'time': time.time(),
+                                          'pairs': sorted(pairs)}
+
+            data = json.dumps({'version': PairCache.VERSION,
+                               'backends': self.entries})
+
+        # Write to a temporary file and rename it into place, so the file is
+        # never left half written.
+        tmp = '{0}.{1}.tmp'.format(self.path, os.getpid())
+
+        try:
+            with open(tmp, 'w') as f:
+                f.write(data)
+            os.rename(tmp, self.path)
+        except (IOError, OSError) as exc:
+            log.warning('Failed to save language pairs to {0}: {1}'
+                        .format(self.path, exc))
+
+    def _entry(self, backend):
+        entry = self.entries.get(backend.name)
+
+        if entry is None or entry.get('config') != self._digest(backend):
+            return None
+
+        return entry
+
+    def _digest(self, backend):
+        config = json.dumps(getattr(backend, 'config', None), sort_keys=True,
+                            default=repr)
+
+        return hashlib.sha1(config).hexdigest()
 
 
 class IBackend(object):
@@ -110,6 +990,22 @@ class IBackend(object):
 
     __metaclass__ = abc.ABCMeta
 
+    # Set this to True if the backend only blocks on socket or pipe I/O (e.g.
+    # using requests or subprocess), and so can be run directly from a greenlet
+    # when the server is in async mode. Otherwise it will be run in a separate
+    # thread.
+    cooperative = False
+
+    # Upstream quota of metered services, as a dict of 'per' (seconds) and
+    # 'requests' and/or 'characters' allowed in that time, or None if the
+    # service isn't metered. Can be overridden with the 'quota' key of the
+    # backend's configuration.
+    quota = None
+
+    # PairCache to load language pairs from, set by BackendManager before
+    # activating the backend. See load_pairs.
+    pair_cache = None
+
     @abc.abstractmethod
     def activate(self, config):
         """Called upon initial activation of the backend. Should return either
@@ -146,6 +1042,51 @@ class IBackend(object):
         """
         pass
 
+    def translate_many(self, texts, from_lang, to_lang):
+        """Translate each of the given texts from `from_lang` to `to_lang`,
+        returning a list of translations in the same order.
+
+        Overriding this is optional. By default each text is passed to
+        `translate` in turn, but backends that can translate several texts in
+        a single request or pass should do so here.
+
+        As with `translate`, a translate.exceptions.TranslationException
+        should be raised if any of the texts fail to translate.
+        """
+        return [self.translate(text, from_lang, to_lang) for text in texts]
+
+    def discover_pairs(self):
+        """Return the list of (from, to) language pairs the backend currently
+        supports, asking the service it uses if necessary. An empty list means
+        they couldn't be found.
+
+        Backends that have to go to some effort to find their pairs (e.g. a
+        request to a web service) should do so here, and set language_pairs
+        to the result of load_pairs in activate. The pairs will then be cached
+        between restarts. By default, language_pairs is returned as is.
+        """
+        return list(self.language_pairs)
+
+    def load_pairs(self):
+        """Return the language pairs of the backend from the pair cache if it
+        has them, otherwise from discover_pairs.
+
+        This should be called from activate, once the backend is configured
+        enough for discover_pairs to work.
+        """
+
+        if self.pair_cache is not None:
+            pairs = self.pair_cache.get(self)
+            if pairs is not None:
+                return pairs
+
+        pairs = list(set(tuple(pair) for pair in self.discover_pairs()))
+
+        if self.pair_cache is not None and len(pairs) != 0:
+            self.pair_cache.set(self, pairs)
+
+        return pairs
+
     @abc.abstractproperty
     def name(self):
         """Name of this translation backend."""
@@ -21,3 +21,20 @@ translate.backends
 This package contains the plugin modules for the various machine translation
 sources the server can have access to.
 """
+
+# Backends shipped with translate, by the name of their configuration section.
+# Each is only imported when its section is configured and active. Other
+# packages can add backends of their own under the 'translate.backends' entry
+# point group, or a backend's configuration can name its class directly with a
+# 'module' option.
+BUILTIN = {
+    'apertium': 'translate.backends.apertium:ApertiumBackend',
+    'apertiumweb': 'translate.backends.apertiumweb:ApertiumWebBackend',
+    'dummy': 'translate.backends.dummy:DummyBackend',
+    'freetranslation':
+    'translate.backends.freetranslation:FreeTranslationBackend',
+    'frengly': 'translate.backends.frengly:FrenglyBackend',
+    'translate_backend':
+    'translate.backends.translate_backend:TranslateBackend',
+    'yandex': 'translate.backends.yandex:YandexBackend'
+}
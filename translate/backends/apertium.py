@@ -17,21 +17,671 @@
 from translate.backend import IBackend
 from translate.exceptions import TranslationException
 
+import collections
+import errno
+import fcntl
 import glob
 import os
+import Queue
 import re
+import select
+import shlex
 import subprocess
+import threading
+import time
+
+from distutils.spawn import find_executable
 
 import logging
 log = logging.getLogger(__name__)
 
 
+# Number of warm apertium processes to keep per language pair.
+POOL_SIZE = 1
+# Recycle a process after it has served this many requests, to keep any slow
+# leaks in the pipeline in check.
+MAX_REQUESTS = 1000
+# Seconds to wait on a process before assuming it has hung.
+TIMEOUT = 10
+
+
+def _frame(text):
+    """Encode text as a block for a process running in null-flush mode."""
+
+    # NUL bytes are the frame delimiter, so they can't appear in the text.
+    return (text.replace(u'\0', u'') + u'\n').encode('utf-8') + '\0'
+
+
+def _unframe(block):
+    """Decode a block read back from a process running in null-flush mode
+    (without its NUL byte)."""
+
+    output = block.decode('utf-8')
+
+    # Strip the newline added by _frame
+    if output.endswith(u'\n'):
+        output = output[:-1]
+
+    return output
+
+
+def parse_mode(path):
+    """Return the commands making up the apertium mode file at path, as a
+    list of argument lists, one for each stage of the pipeline. Every stage is
+    set to run in null-flush mode."""
+
+    with open(path) as f:
+        mode = f.read().strip()
+
+    commands = []
+
+    for stage in mode.split('|'):
+        # The apertium script passes the generator options as $1, and any
+        # extra tagger options as $2.
+        args = shlex.split(stage.replace('$1', '-g').replace('$2', ''))
+
+        if len(args) == 0:
+            continue
+
+        if '-z' not in args:
+            args.insert(1, '-z')
+
+        commands.append(args)
+
+    if len(commands) == 0:
+        raise TranslationException('Mode file {0} is empty'.format(path))
+
+    return commands
+
+
+class ApertiumPipeline(object):
+    """A single long-running apertium process for one language pair.
+
+    The process is started in null-flush mode (`apertium -z`), so every block
+    of text written to it and terminated by a NUL byte is translated and
+    written back, also terminated by a NUL byte, without having to restart the
+    whole chain of transducers.
+    """
+
+    def __init__(self, command, timeout=TIMEOUT):
+        self.command = command
+        self.timeout = timeout
+        self.requests = 0
+
+        self.proc = subprocess.Popen(command,
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     close_fds=True)
+
+        # Writes only go as far as the pipe has room for, so that reading the
+        # output can carry on in between.
+        fd = self.proc.stdin.fileno()
+        fcntl.fcntl(fd, fcntl.F_SETFL,
+                    fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+    def alive(self):
+        """Whether or not the underlying process is still running"""
+        return self.proc.poll() is None
+
+    def translate(self, text):
+        output = _unframe(self._exchange(_frame(text)))
+        self.requests += 1
+
+        return output
+
+    def _exchange(self, block):
+        """Write block to the process and read back its output up to a NUL
+        byte, giving up once self.timeout seconds have passed.
+
+        Writing and reading are interleaved, so a large block can't leave both
+        the process and us stuck waiting on a full pipe.
+        """
+
+        infd = self.proc.stdin.fileno()
+        outfd = self.proc.stdout.fileno()
+        deadline = time.time() + self.timeout
+        written = 0
+        chunks = []
+
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TranslationException('Apertium process timed out')
+
+            writing = [infd] if written < len(block) else []
+            readable, writable, _ = select.select([outfd], writing, [],
+                                                  remaining)
+
+            if writable:
+                try:
+                    written += os.write(infd, block[written:written + 65536])
+                except OSError as exc:
+                    if exc.errno != errno.EAGAIN:
+                        raise TranslationException('Apertium process exited')
+
+            if not readable:
+                continue
+
+            chunk = os.read(outfd, 4096)
+            if not chunk:
+                raise TranslationException('Apertium process exited')
+
+            chunks.append(chunk)
+
+            if '\0' in chunk:
+                break
+
+        return ''.join(chunks).split('\0', 1)[0]
+
+    def close(self):
+        """Kill the process, if it hasn't already exited"""
+        for stream in (self.proc.stdin, self.proc.stdout):
+            try:
+                stream.close()
+            except IOError:
+                pass
+
+        if self.alive():
+            try:
+                self.proc.terminate()
+            except OSError:
+                pass
+
+        self.proc.wait()
+
+
+class ApertiumPool(object):
+    """A bounded set of ApertiumPipelines for a single language pair.
+
+    Pipelines are only started when there is demand for them. Pipelines that
+    hang, die or have served `max_requests` requests are thrown away, and
+    replaced with a fresh one the next time one is needed.
+    """
+
+    def __init__(self, command, size=POOL_SIZE, max_requests=MAX_REQUESTS,
+                 timeout=TIMEOUT):
+        self.command = command
+        self.size = size
+        self.max_requests = max_requests
+        self.timeout = timeout
+
+        self.idle = Queue.Queue()
+        self.lock = threading.Lock()
+        self.spawned = 0
+        self.closed = False
+
+    def translate(self, text):
+        pipeline = self._acquire()
+
+        try:
+            output = pipeline.translate(text)
+        except Exception:
+            self._discard(pipeline)
+            raise
+
+        self._release(pipeline)
+        return output
+
+    def translate_many(self, texts):
+        """Translate each of texts in turn using a single pipeline"""
+
+        pipeline = self._acquire()
+
+        try:
+            outputs = [pipeline.translate(text) for text in texts]
+        except Exception:
+            self._discard(pipeline)
+            raise
+
+        self._release(pipeline)
+        return outputs
+
+    def close(self):
+        """Stop every idle pipeline. Any pipelines currently in use will be
+        stopped as soon as they are released."""
+
+        self.closed = True
+
+        while True:
+            try:
+                self._discard(self.idle.get_nowait())
+            except Queue.Empty:
+                break
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except Queue.Empty:
+            pass
+
+        with self.lock:
+            spawn = self.spawned < self.size
+            if spawn:
+                self.spawned += 1
+
+        if spawn:
+            try:
+                return ApertiumPipeline(self.command, timeout=self.timeout)
+            except OSError as exc:
+                with self.lock:
+                    self.spawned -= 1
+                raise TranslationException(repr(exc))
+
+        # Every pipeline is busy, so wait on one to free up.
+        try:
+            return self.idle.get(timeout=self.timeout)
+        except Queue.Empty:
+            raise TranslationException('No apertium process available')
+
+    def _release(self, pipeline):
+        if self.closed or not pipeline.alive() or \
+           pipeline.requests >= self.max_requests:
+            self._discard(pipeline)
+        else:
+            self.idle.put(pipeline)
+
+    def _discard(self, pipeline):
+        pipeline.close()
+
+        with self.lock:
+            self.spawned -= 1
+
+
+class ApertiumChain(object):
+    """The stages of an apertium mode, each run as its own long-running
+    process, with the output of each piped straight into the next.
+
+    This skips the `apertium` shell script, and lets any number of requests
+    stream through the chain at once. Each is written as a NUL terminated
+    block, and since every stage keeps blocks in order, the blocks read back
+    from the last stage are matched to requests in the order they were
+    written.
+    """
+
+    def __init__(self, commands, timeout=TIMEOUT):
+        """
+        :param commands: list of argument lists, one for each stage.
+        :param timeout: seconds to wait for a translation before assuming the
+                        chain has hung.
+        """
+
+        self.commands = commands
+        self.timeout = timeout
+        self.requests = 0
+
+        # Queues to put the result of each request on, in the order the
+        # requests were written
+        self.pending = collections.deque()
+        # Held while writing, so requests are written in the order they're
+        # queued. Writes give up after self.timeout, so it's never held for
+        # longer than that.
+        self.write_lock = threading.Lock()
+        # Held while queueing requests or refusing any more. This is never
+        # held while writing, so it can't be stuck behind a full pipe.
+        self.lock = threading.Lock()
+        # Set once the chain stops accepting requests
+        self.error = None
+        # When the chain stopped accepting requests
+        self.retired = None
+
+        self.procs = []
+        stdin = subprocess.PIPE
+
+        try:
+            for command in commands:
+                proc = subprocess.Popen(command,
+                                        stdin=stdin,
+                                        stdout=subprocess.PIPE,
+                                        close_fds=True)
+
+                # Only the next stage should have the pipe open, so that it
+                # sees the end of it when the previous stage exits.
+                if stdin is not subprocess.PIPE:
+                    stdin.close()
+
+                self.procs.append(proc)
+                stdin = proc.stdout
+
+        except OSError:
+            self.close()
+            raise
+
+        self.stdin = self.procs[0].stdin
+        self.stdout = self.procs[-1].stdout
+
+        # Writes only go as far as the pipe has room for, so that one stuck
+        # on a full pipe can give up.
+        fd = self.stdin.fileno()
+        fcntl.fcntl(fd, fcntl.F_SETFL,
+                    fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+        self.reader = threading.Thread(target=self._read,
+                                       name='apertium-chain')
+        self.reader.daemon = True
+        self.reader.start()
+
+    def alive(self):
+        """Whether or not the chain is still accepting requests"""
+        return self.error is None and \
+            all(proc.poll() is None for proc in self.procs)
+
+    def submit(self, text):
+        """Write text to the chain, and return a queue that a tuple of
+        (translation, exception) will be put on once it's translated. Pass it
+        to result to wait for the translation.
+
+        Returns None without writing anything if the chain has stopped
+        accepting requests. Raises TranslationException if the text can't be
+        written within self.timeout, since the chain might have hung.
+        """
+
+        slot = Queue.Queue(1)
+
+        self.write_lock.acquire()
+
+        try:
+            with self.lock:
+                if self.error is not None:
+                    return None
+
+                self.pending.append(slot)
+                self.requests += 1
+
+            try:
+                written = self._write(_frame(text),
+                                      time.time() + self.timeout)
+            except (OSError, ValueError, select.error):
+                self._fail(TranslationException('Apertium chain exited'))
+                return slot
+
+            if not written:
+                # Part of the text may have been written, so nothing else can
+                # follow it. The slot stays queued, to keep the rest in order.
+                self._refuse(TranslationException('Apertium chain timed out'))
+                raise TranslationException('Apertium chain timed out')
+
+        finally:
+            self.write_lock.release()
+            self._shut()
+
+        return slot
+
+    def result(self, slot):
+        """Wait for and return the translation of the request that slot was
+        returned for.
+
+        If it takes longer than self.timeout, only this request fails. The
+        chain stops accepting requests, since it might have hung, but any
+        others already written to it can still finish.
+        """
+
+        try:
+            output, exc = slot.get(timeout=self.timeout)
+        except Queue.Empty:
+            self._refuse(TranslationException('Apertium chain timed out'))
+            raise TranslationException('Apertium chain timed out')
+
+        if exc is not None:
+            raise exc
+
+        return _unframe(output)
+
+    def translate(self, text):
+        slot = self.submit(text)
+
+        if slot is None:
+            raise self.error
+
+        return self.result(slot)
+
+    def retire(self):
+        """Stop accepting requests, and let the chain exit once every
+        request already written has been translated."""
+
+        self._refuse(TranslationException('Apertium chain retired'))
+        self._shut()
+
+    def close(self):
+        """Kill every stage of the chain. Any requests still waiting fail."""
+
+        # Kill the processes first, so that a write stuck on a full pipe
+        # fails rather than holding up the rest.
+        for proc in self.procs:
+            if proc.poll() is None:
+                try:
+                    proc.terminate()
+                except OSError:
+                    pass
+
+        self.retire()
+
+        for proc in self.procs:
+            proc.wait()
+
+        self._fail(TranslationException('Apertium chain closed'))
+
+    def _write(self, data, deadline):
+        """Write data to the first stage, giving up at deadline. Returns
+        whether all of it was written."""
+
+        fd = self.stdin.fileno()
+        written = 0
+
+        while written < len(data):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+
+            _, writable, _ = select.select([], [fd], [], remaining)
+
+            if not writable:
+                continue
+
+            try:
+                written += os.write(fd, data[written:written + 65536])
+            except OSError as exc:
+                if exc.errno != errno.EAGAIN:
+                    raise
+
+        return True
+
+    def _shut(self):
+        """Close the input of the chain if it has stopped accepting requests.
+
+        This doesn't wait for a write in progress, which is left to close it
+        once it's done, so it is safe to call while holding other locks.
+        """
+
+        if self.error is not None and self.write_lock.acquire(False):
+            try:
+                self._close_stdin()
+            finally:
+                self.write_lock.release()
+
+    def _close_stdin(self):
+        if self.procs and self.procs[0].stdin is not None:
+            try:
+                self.procs[0].stdin.close()
+            except IOError:
+                pass
+
+    def _read(self):
+        """Read translated blocks from the last stage, handing each to the
+        oldest request still waiting, until the chain exits."""
+
+        fd = self.stdout.fileno()
+        buf = ''
+
+        try:
+            while True:
+                # Wait with select, so that this yields under gevent
+                select.select([fd], [], [])
+
+                chunk = os.read(fd, 4096)
+                if not chunk:
+                    break
+
+                blocks = (buf + chunk).split('\0')
+                buf = blocks.pop()
+
+                for block in blocks:
+                    with self.lock:
+                        slot = self.pending.popleft() if self.pending \
+                            else None
+
+                    if slot is None:
+                        log.warning('Unexpected output from apertium chain')
+                        continue
+
+                    # Requests that timed out are still queued, to keep the
+                    # rest in order, but nobody is waiting on their slots.
+                    slot.put((block, None))
+
+        except (OSError, select.error) as exc:
+            log.warning('Failed to read from apertium chain: {0!r}'
+                        .format(exc))
+
+        finally:
+            self._fail(TranslationException('Apertium chain exited'))
+            self.stdout.close()
+
+    def _refuse(self, exc):
+        """Stop accepting requests, refusing them with exc."""
+
+        with self.lock:
+            if self.error is None:
+                self.error = exc
+                self.retired = time.time()
+
+    def _fail(self, exc):
+        """Stop accepting requests, and fail every request still waiting
+        with exc."""
+
+        with self.lock:
+            if self.error is None:
+                self.error = exc
+                self.retired = time.time()
+
+            pending = list(self.pending)
+            self.pending.clear()
+
+        for slot in pending:
+            slot.put((None, exc))
+
+
+class ApertiumChainPool(object):
+    """Shares a single ApertiumChain between every request for a language
+    pair.
+
+    Mirrors the interface of ApertiumPool. The chain is only started when
+    there is demand for it, and is replaced with a fresh one once it stops
+    accepting requests (after dying or timing out) or has served
+    `max_requests` requests. Replaced chains are left to finish the requests
+    already written to them, and killed once they're done or have had
+    `timeout` seconds to finish.
+    """
+
+    # Number of times to try submitting a text, if the chain is replaced in
+    # between being acquired and written to.
+    ATTEMPTS = 3
+
+    def __init__(self, commands, max_requests=MAX_REQUESTS, timeout=TIMEOUT):
+        self.commands = commands
+        self.max_requests = max_requests
+        self.timeout = timeout
+
+        self.chain = None
+        self.retired = []
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def translate(self, text):
+        return self.translate_many([text])[0]
+
+    def translate_many(self, texts):
+        """Translate each of texts, writing them all to the chain before
+        waiting on any of them."""
+
+        slots = [self._submit(text) for text in texts]
+
+        return [chain.result(slot) for chain, slot in slots]
+
+    def close(self):
+        """Stop the chain, failing any requests still waiting on it"""
+
+        with self.lock:
+            self.closed = True
+
+            chains = self.retired
+            if self.chain is not None:
+                chains.append(self.chain)
+
+            self.chain = None
+            self.retired = []
+
+        for chain in chains:
+            chain.close()
+
+    def _submit(self, text):
+        """Write text to the current chain, and return a tuple of (chain,
+        slot for the result)."""
+
+        for _ in xrange(ApertiumChainPool.ATTEMPTS):
+            with self.lock:
+                chain = self._acquire()
+
+            # Written without the lock, so a request stuck on a full pipe
+            # doesn't stop the chain being replaced.
+            slot = chain.submit(text)
+
+            if slot is not None:
+                return chain, slot
+
+        raise chain.error
+
+    def _acquire(self):
+        if self.closed:
+            raise TranslationException('Apertium chain closed')
+
+        self._reap()
+
+        chain = self.chain
+
+        if chain is not None and (not chain.alive() or
+                                  chain.requests >= self.max_requests):
+            # Requests already written to it still get their translations
+            chain.retire()
+            self.retired.append(chain)
+            chain = None
+
+        if chain is None:
+            try:
+                chain = ApertiumChain(self.commands, timeout=self.timeout)
+            except OSError as exc:
+                raise TranslationException(repr(exc))
+
+            self.chain = chain
+
+        return chain
+
+    def _reap(self):
+        """Kill retired chains that have finished, or had long enough to."""
+
+        now = time.time()
+
+        for chain in list(self.retired):
+            if not chain.pending or now - chain.retired > chain.timeout:
+                chain.close()
+                self.retired.remove(chain)
+
+
 class ApertiumBackend(IBackend):
     name = "Apertium"
     description = "A free/open-source machine translation platform"
     url = 'http://apertium.org'
     preference = 20
     language_pairs = []
+    cooperative = True
 
     def activate(self, config):
         self.config = config
@@ -39,56 +689,119 @@ class ApertiumBackend(IBackend):
         if not self.config.get('active', True):
             return False
 
-        try:
-            self.exe = subprocess.check_output(['which', 'apertium']).strip()
+        # Search PATH directly, rather than running `which`
+        self.exe = find_executable('apertium')
 
-            self.language_pairs = set()
+        if self.exe is None:
+            log.warning("apertium not available, ignoring...")
+            return False
 
-            modes_dir = os.path.join(os.path.dirname(self.exe), '..', 'share',
-                                     'apertium', 'modes')
+        self.language_pairs = self.load_pairs()
 
-            for file_name in [os.path.basename(f) for f in
-                              glob.glob(modes_dir + '/*.mode')]:
+        self.pools = {}
+        self.pools_lock = threading.Lock()
 
-                # This ignores bogus 'eco-.*' matches as well as '*-multi',
-                # which aren't what we want to handle right now.
-                #
-                # TODO: Maybe handle these eventually.
-                match = re.search(r'^(?!(?:eco-))([^\-]+)-([^\-]+)\.mode$',
-                                  file_name)
+        return True
 
-                if match is not None:
-                    self.language_pairs.add(match.groups())
+    def discover_pairs(self):
+        pairs = set()
 
-            self.language_pairs = list(self.language_pairs)
+        for file_name in [os.path.basename(f) for f in
+                          glob.glob(self._modes_dir() + '/*.mode')]:
 
-        except subprocess.CalledProcessError:
-            self.language_pairs = []
-            log.warning("apertium not available, ignoring...")
-            return False
+            # This ignores bogus 'eco-.*' matches as well as '*-multi',
+            # which aren't what we want to handle right now.
+            #
+            # TODO: Maybe handle these eventually.
+            match = re.search(r'^(?!(?:eco-))([^\-]+)-([^\-]+)\.mode$',
+                              file_name)
 
-        return True
+            if match is not None:
+                pairs.add(match.groups())
+
+        return list(pairs)
 
     def deactivate(self):
-        pass
+        with self.pools_lock:
+            for pool in self.pools.values():
+                pool.close()
+
+            self.pools = {}
 
     def translate(self, text, from_lang, to_lang):
+        if (from_lang, to_lang) not in self.language_pairs:
+            raise TranslationException("Can't translate given pair ({0},{1})"
+                                       .format(from_lang, to_lang))
+
         try:
-            proc = subprocess.Popen(['apertium',
-                                     '{0}-{1}'.format(from_lang, to_lang)],
-                                    stdin=subprocess.PIPE,
-                                    stdout=subprocess.PIPE)
-            proc.stdin.write((text + u'\n').encode('utf-8'))
-            proc.stdin.close()
-            output = proc.stdout.read()[:-1].decode('utf-8')
-
-            # Check that apertium process exited successfully
-            if proc.wait() != 0:
-                raise TranslationException('Apertium process exited with \
-non-zero status')
+            return self._pool(from_lang, to_lang).translate(text)
 
         except Exception as e:
             log.error('Failed to translate text {0}'.format(repr(e)))
+
+            if isinstance(e, TranslationException):
+                raise
             raise TranslationException(repr(e))
 
-        return output
+    def translate_many(self, texts, from_lang, to_lang):
+        if (from_lang, to_lang) not in self.language_pairs:
+            raise TranslationException("Can't translate given pair ({0},{1})"
+                                       .format(from_lang, to_lang))
+
+        # Run the whole batch through one warm pipeline, rather than
+        # contending for the pool once per text.
+        try:
+            return self._pool(from_lang, to_lang).translate_many(texts)
+
+        except Exception as e:
+            log.error('Failed to translate texts {0}'.format(repr(e)))
+
+            if isinstance(e, TranslationException):
+                raise
+            raise TranslationException(repr(e))
+
+    def _pool(self, from_lang, to_lang):
+        """Return the ApertiumPool for the given pair, creating it if it
+        doesn't exist yet."""
+
+        pair = '{0}-{1}'.format(from_lang, to_lang)
+
+        with self.pools_lock:
+            pool = self.pools.get(pair)
+
+            if pool is None:
+                # Pool sizes can be set for each pair individually, e.g.
+                # {'en-es': 4}, falling back to the global 'pool_size'.
+                size = self.config.get('pool_sizes', {}).get(
+                    pair, self.config.get('pool_size', POOL_SIZE))
+
+                max_requests = self.config.get('max_requests', MAX_REQUESTS)
+                timeout = self.config.get('timeout', TIMEOUT)
+
+                if self.config.get('engine', 'apertium') == 'chain':
+                    pool = ApertiumChainPool(self._chain_commands(pair),
+                                             max_requests=max_requests,
+                                             timeout=timeout)
+                else:
+                    pool = ApertiumPool([self.exe, '-z', pair], size=size,
+                                        max_requests=max_requests,
+                                        timeout=timeout)
+
+                self.pools[pair] = pool
+
+        return pool
+
+    def _chain_commands(self, pair):
+        """Return the commands for each stage of an ApertiumChain for pair:
+        the stages of its mode file, between the plain text deformatter and
+        reformatter that the apertium script would have added."""
+
+        bin_dir = os.path.dirname(self.exe)
+
+        return [[os.path.join(bin_dir, 'apertium-destxt'), '-z']] + \
+            parse_mode(os.path.join(self._modes_dir(), pair + '.mode')) + \
+            [[os.path.join(bin_dir, 'apertium-retxt'), '-z']]
+
+    def _modes_dir(self):
+        return os.path.join(os.path.dirname(self.exe), '..', 'share',
+                            'apertium', 'modes')
@@ -15,7 +15,8 @@
 # translate.  If not, see <http://www.gnu.org/licenses/>.
 
 from translate.backend import IBackend
-from translate.exceptions import TranslationException
+from translate.exceptions import QuotaException, TranslationException
+from translate.utils import http_session
 
 import requests
 import json
@@ -34,6 +35,8 @@ API_ERRORS = {
     500: 'Server error (500)',
     552: 'Traffic limit reached'
 }
+# Errors meaning the traffic limit has been used up
+QUOTA_ERRORS = [552]
 
 
 class ApertiumWebBackend(IBackend):
@@ -43,6 +46,7 @@ translation platform Apertium"
     url = 'http://api.apertium.org'
     preference = 40
     language_pairs = []
+    cooperative = True
 
     def activate(self, config):
         self.config = config
@@ -52,14 +56,24 @@ translation platform Apertium"
 
         self.key = self.config.get('key')
         self.timeout = self.config.get('timeout', API_TIMEOUT)
+        self.session = http_session(self.config)
 
+        self.language_pairs = self.load_pairs()
+
+        if len(self.language_pairs) == 0:
+            log.error('Got zero translation pairs, aborting.')
+            return False
+
+        return True
+
+    def discover_pairs(self):
         response, _ = self._api_request('listPairs')
 
         if response.get('responseStatus') != 200:
             log.warning('Apertium Web API request failed, bailing out')
-            return False
+            return []
 
-        self.language_pairs = []
+        pairs = []
 
         for pair in response.get('responseData', {}):
             source = pair.get('sourceLanguage')
@@ -69,16 +83,10 @@ translation platform Apertium"
                 log.error('Badly formatted responseData, skipping')
                 continue
 
-            self.language_pairs.append((source, dest))
+            pairs.append((source, dest))
 
         # Just in case the API returns duplicates for whatever reason
-        self.language_pairs = list(set(self.language_pairs))
-
-        if len(self.language_pairs) == 0:
-            log.error('Got zero translation pairs, aborting.')
-            return False
-
-        return True
+        return list(set(pairs))
 
     def translate(self, text, from_lang, to_lang):
         langpair = "{0}|{1}".format(from_lang, to_lang)
@@ -96,20 +104,23 @@ translation platform Apertium"
 
             log.error(error)
 
+            if status in QUOTA_ERRORS:
+                raise QuotaException(repr(error))
+
             raise TranslationException(repr(error))
 
         return resp.get('responseData').get('translatedText')
 
     def deactivate(self):
-        pass
+        self.session.close()
 
     def _api_request(self, method, **kwargs):
         if self.key is not None:
             kwargs['key'] = self.key
 
         try:
-            r = requests.get(API_URL + method, params=kwargs,
-                             timeout=self.timeout)
+            r = self.session.get(API_URL + method, params=kwargs,
+                                 timeout=self.timeout)
             return json.loads(r.text), r
 
         except ValueError as exc:
@@ -14,6 +14,7 @@ class DummyBackend(IBackend):
     url = 'about:blank'
     preference = 0
     language_pairs = [('en', 'en')]
+    cooperative = True
 
     def activate(self, config):
         self.config = config
@@ -16,8 +16,8 @@
 
 
 from translate.backend import IBackend
-from translate.exceptions import TranslationException
-from translate.utils import iso639_convert
+from translate.exceptions import ContentException, TranslationException
+from translate.utils import http_session, iso639_convert
 
 import requests
 import json
@@ -35,6 +35,8 @@ API_ERRORS = {
     422: 'Semantic error within request',
     500: 'Internal server error'
 }
+# Errors caused by the text given, rather than a problem with the service
+CONTENT_ERRORS = [422]
 
 # API key is passed in a request header: "Authorization: BeGlobal apiKey=KEY"
 
@@ -45,6 +47,7 @@ class FreeTranslationBackend(IBackend):
     url = 'http://freetranslation.com'
     preference = 30
     language_pairs = []
+    cooperative = True
 
     def activate(self, config):
         self.config = config
@@ -58,21 +61,31 @@ class FreeTranslationBackend(IBackend):
 
         self.key = config['key']
         self.timeout = self.config.get('timeout', API_TIMEOUT)
+        self.session = http_session(self.config)
 
         self.auth_header = 'BeGlobal apiKey=%s' % self.key
 
+        self.language_pairs = self.load_pairs()
+
+        if len(self.language_pairs) == 0:
+            log.error('Got zero translation pairs, aborting')
+            return False
+
+        return True
+
+    def discover_pairs(self):
         try:
             resp = self._api_get_request('languages', quality='Q1')
 
             if resp.status_code != 200:
                 log.error("Request failed: %s", resp.text)
-                return False
+                return []
 
             jsobj = json.loads(resp.text)
         except (ValueError, requests.exceptions.RequestException):
-            return False
+            return []
 
-        self.language_pairs = []
+        pairs = []
 
         for obj in jsobj['languageExpertise']['Q1']:
             from_lang = obj['languagePair']['from']['code'].lower()
@@ -81,16 +94,10 @@ class FreeTranslationBackend(IBackend):
             from_lang = iso639_convert(from_lang)
             to_lang = iso639_convert(to_lang)
 
-            self.language_pairs.append((from_lang, to_lang))
+            pairs.append((from_lang, to_lang))
 
         # Just in case the API returns duplicates for whatever reason
-        self.language_pairs = list(set(self.language_pairs))
-
-        if len(self.language_pairs) == 0:
-            log.error('Got zero translation pairs, aborting')
-            return False
-
-        return True
+        return list(set(pairs))
 
     def translate(self, text, from_lang, to_lang):
 
@@ -108,6 +115,10 @@ class FreeTranslationBackend(IBackend):
 
             if resp.status_code != 200:
                 error = API_ERRORS.get(resp.status_code, "Unknown error")
+
+                if resp.status_code in CONTENT_ERRORS:
+                    raise ContentException("Failed to translate: %s" % error)
+
                 raise TranslationException("Failed to translate: %s" % error)
 
             jsobj = json.loads(resp.text)
@@ -119,14 +130,14 @@ class FreeTranslationBackend(IBackend):
                                        str(exc))
 
     def deactivate(self):
-        pass
+        self.session.close()
 
     def _api_get_request(self, method, **kwargs):
         try:
-            r = requests.get(API_URL + method, params=kwargs,
-                             headers={'Authorization': self.auth_header,
-                                      'Content-type': 'application/json'},
-                             timeout=self.timeout)
+            r = self.session.get(API_URL + method, params=kwargs,
+                                 headers={'Authorization': self.auth_header,
+                                          'Content-type': 'application/json'},
+                                 timeout=self.timeout)
             return r
 
         except requests.exceptions.RequestException as exc:
@@ -138,10 +149,10 @@ class FreeTranslationBackend(IBackend):
 
     def _api_post_request(self, method, **kwargs):
         try:
-            r = requests.post(API_URL + method, data=json.dumps(kwargs),
-                              headers={'Authorization': self.auth_header,
-                                       'Content-type': 'application/json'},
-                              timeout=self.timeout)
+            r = self.session.post(API_URL + method, data=json.dumps(kwargs),
+                                  headers={'Authorization': self.auth_header,
+                                           'Content-type': 'application/json'},
+                                  timeout=self.timeout)
             return r
 
         except requests.exceptions.RequestException as exc:
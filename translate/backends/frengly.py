@@ -17,6 +17,7 @@
 
 from translate.backend import IBackend
 from translate.exceptions import TranslationException
+from translate.utils import http_session
 
 import requests
 import json
@@ -58,6 +59,7 @@ class FrenglyBackend(IBackend):
     preference = 1
     # Generate all possible language pairs
     language_pairs = list(itertools.combinations(API_LANGS, 2))
+    cooperative = True
 
     def activate(self, config):
         self.config = config
@@ -74,10 +76,12 @@ class FrenglyBackend(IBackend):
         self.email = config['email']
         self.password = config['password']
 
+        self.session = http_session(self.config)
+
         return True
 
     def deactivate(self):
-        pass
+        self.session.close()
 
     def translate(self, text, from_lang, to_lang):
         params = {'text': text, 'dest': to_lang, 'src': from_lang,
@@ -85,7 +89,8 @@ class FrenglyBackend(IBackend):
                   'outformat': 'json'}
 
         try:
-            r = requests.get(API_URL, params=params, timeout=self.timeout)
+            r = self.session.get(API_URL, params=params,
+                                 timeout=self.timeout)
             print(r.text)
             trans = json.loads(r.text)['translation']
 
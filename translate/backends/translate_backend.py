@@ -33,6 +33,7 @@ class TranslateBackend(IBackend):
     url = 'https://github.com/boredomist/translate'
     preference = 10
     language_pairs = []
+    cooperative = True
 
     def activate(self, config):
         self.config = config
@@ -53,10 +54,12 @@ class TranslateBackend(IBackend):
                             .format(self.config['port']))
 
         try:
-            self.client = translate.client.Client(config['host'],
-                                                  port=self.config['port'])
+            self.client = translate.client.Client(
+                config['host'], port=self.config['port'],
+                timeout=self.timeout,
+                max_connections=self.config.get('pool_size', 10))
 
-            self.language_pairs = self.client.language_pairs()
+            self.language_pairs = self.load_pairs()
         except translate.client.exceptions.TranslateException as exc:
             log.error("Failed to setup client: " + str(exc))
             return False
@@ -67,8 +70,11 @@ class TranslateBackend(IBackend):
 
         return True
 
+    def discover_pairs(self):
+        return self.client.language_pairs(refresh=True)
+
     def deactivate(self):
-        pass
+        self.client.close()
 
     def translate(self, text, from_lang, to_lang):
 
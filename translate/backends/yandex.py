@@ -28,12 +28,18 @@ http://api.yandex.com/translate/
 
 from translate import log
 from translate.backend import IBackend
-from translate.exceptions import TranslationException
+from translate.exceptions import (ContentException, QuotaException,
+                                  TranslationException)
 
+import translate.segment as segment
 import translate.utils
 
-import requests
 import json
+import multiprocessing
+import requests
+import time
+
+from multiprocessing.pool import ThreadPool
 
 API_URL = 'https://translate.yandex.net/api/v1.5/tr.json/'
 API_TIMEOUT = 5
@@ -47,9 +53,17 @@ API_ERRORS = {
     422: 'Text could not be translated',
     501: 'Specified translation direction is not supported'
 }
+# Errors meaning the daily quota has been used up
+QUOTA_ERRORS = [403, 404]
+# Errors caused by the text given, rather than a problem with the service
+CONTENT_ERRORS = [413, 422]
 # Yandex claims to only translate 10k bytes at a time, but seems to 500 on
 # texts that size, so try 8k instead.
 API_SIZE_LIMIT = 8 * 1000
+# Maximum number of requests to have in flight at once, across every text
+API_CONCURRENCY = 4
+# Seconds to spend translating a single text, however many chunks it takes
+API_DEADLINE = 30
 
 
 class YandexBackend(IBackend):
@@ -58,6 +72,10 @@ class YandexBackend(IBackend):
     url = "http://api.yandex.com/translate/"
     preference = 40
     language_pairs = []
+    cooperative = True
+
+    # The free API allows 1,000,000 characters of text a day
+    quota = {'per': 24 * 60 * 60, 'characters': 1000000}
 
     def activate(self, config):
         self.config = config
@@ -71,55 +89,152 @@ class YandexBackend(IBackend):
 
         self.key = config['key']
         self.timeout = config.get('timeout', API_TIMEOUT)
+        self.deadline = config.get('deadline', API_DEADLINE)
 
-        js, _ = self.api_request('getLangs', ui='en')
+        self.concurrency = config.get('concurrency', API_CONCURRENCY)
 
-        pairs = []
-        for pair in js.get('dirs', []):
-            langs = pair.split('-')
-            pairs.append((langs[0], langs[1]))
+        self.session = translate.utils.http_session(
+            dict({'pool_size': self.concurrency}, **config))
 
-        pairs = list(set(pairs))
+        self.language_pairs = self.load_pairs()
 
-        if len(pairs) == 0:
+        if len(self.language_pairs) == 0:
             log.warning("Yandex supports no translation pairs? Something is\
 wrong.")
             return False
 
-        self.language_pairs = pairs
+        self.pool = ThreadPool(processes=self.concurrency)
+
         return True
 
+    def discover_pairs(self):
+        js, _ = self.api_request('getLangs', ui='en')
+
+        pairs = []
+        for pair in js.get('dirs', []):
+            langs = pair.split('-')
+            pairs.append((langs[0], langs[1]))
+
+        return list(set(pairs))
+
     def deactivate(self):
-        pass
+        self.pool.close()
+        self.session.close()
 
     def translate(self, text, from_lang, to_lang):
+        pair = "{0}-{1}".format(from_lang, to_lang)
+        deadline = time.time() + self.deadline
 
-        results = []
-        # Split up requests into blocks of proper size
-        # FIXME: Bytesize vs charsize.
-        for chunk in translate.utils.chunk_string(text, API_SIZE_LIMIT):
-            pair = "{0}-{1}".format(from_lang, to_lang)
-            js, req = self.api_request('translate', text=chunk, lang=pair)
+        def translate_chunk(chunk):
+            # Don't bother with chunks queued up behind a text that's already
+            # run out of time.
+            if time.time() > deadline:
+                raise TranslationException('Deadline exceeded')
 
-            if js.get('code', -1) != 200:
-                error = API_ERRORS.get(js.get('code', -1), "Unknown error!")
+            js, req = self.api_request('translate', text=chunk, lang=pair)
 
-                if error is None:
-                    raise TranslationException(repr(req))
-                else:
-                    raise TranslationException(repr(error))
+            self._check_response(js, req)
 
             # Returns an array, so join with new lines
-            results.append('\n'.join(js.get('text')))
+            return '\n'.join(js.get('text'))
+
+        if len(text.encode('utf-8')) <= API_SIZE_LIMIT:
+            return translate_chunk(text)
+
+        chunks = []
+
+        def split():
+            for chunk in segment.segment(text, API_SIZE_LIMIT):
+                chunks.append(chunk)
+                yield chunk
+
+        # Split up requests into blocks of proper size, and send them off in
+        # parallel as soon as each has been split from the text.
+        pending = self.pool.imap(translate_chunk, split())
+        results = []
+
+        while True:
+            try:
+                results.append(pending.next(max(deadline - time.time(), 0)))
+
+            except StopIteration:
+                break
+
+            except multiprocessing.TimeoutError:
+                raise TranslationException(
+                    'Text not translated within {0} seconds'
+                    .format(self.deadline))
+
+        return segment.join(chunks, results)
+
+    def translate_many(self, texts, from_lang, to_lang):
+        pair = "{0}-{1}".format(from_lang, to_lang)
+        results = [None] * len(texts)
+
+        # Yandex accepts multiple 'text' parameters in a single request, so
+        # pack as many texts into each request as the size limit allows.
+        # Anything that's too large on its own goes through translate().
+        batches = [[]]
+        size = 0
+
+        for i, text in enumerate(texts):
+            bytelen = len(text.encode('utf-8'))
+
+            if bytelen > API_SIZE_LIMIT:
+                results[i] = self.translate(text, from_lang, to_lang)
+                continue
+
+            if size + bytelen > API_SIZE_LIMIT:
+                batches.append([])
+                size = 0
+
+            batches[-1].append(i)
+            size += bytelen
+
+        for batch in batches:
+            if len(batch) == 0:
+                continue
+
+            js, req = self.api_request('translate', lang=pair,
+                                       text=[texts[i] for i in batch])
+
+            self._check_response(js, req)
+
+            translations = js.get('text', [])
+            if len(translations) != len(batch):
+                raise TranslationException('Got {0} translations for {1} texts'
+                                           .format(len(translations),
+                                                   len(batch)))
+
+            for i, trans in zip(batch, translations):
+                results[i] = trans
+
+        return results
+
+    def _check_response(self, js, req):
+        """Raise a TranslationException if the given API response indicates
+        that the request failed."""
+
+        if js.get('code', -1) != 200:
+            error = API_ERRORS.get(js.get('code', -1), "Unknown error!")
+
+            if js.get('code') in QUOTA_ERRORS:
+                raise QuotaException(repr(error))
+
+            if js.get('code') in CONTENT_ERRORS:
+                raise ContentException(repr(error))
 
-        return '\n'.join(results)
+            if error is None:
+                raise TranslationException(repr(req))
+            else:
+                raise TranslationException(repr(error))
 
     def api_request(self, method, **kwargs):
         kwargs['key'] = self.key
 
         try:
-            req = requests.get(API_URL + method, params=kwargs,
-                               timeout=self.timeout)
+            req = self.session.get(API_URL + method, params=kwargs,
+                                   timeout=self.timeout)
             return json.loads(req.text), req
         except requests.exceptions.RequestException as exc:
             log.error('API request {0} params={1} failed'.
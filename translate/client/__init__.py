@@ -27,6 +27,7 @@ __version__ = '0.0.0'
 __author__ = 'Erik Price'
 __copyright__ = 'Copyright 2013 Erik Price'
 
-__all__ = ['Client', 'ServerInformation']
+__all__ = ['AsyncClient', 'Client', 'ServerInformation']
 
 from translate.client.client import Client, ServerInformation
+from translate.client.async_client import AsyncClient
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of translate.
+#
+# translate is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# translate is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# translate.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+translate.client.async_client
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Non-blocking version of translate.client.Client. Requests are run on a bounded
+pool of worker threads sharing a single pool of connections to the server, and
+each method returns a result object immediately instead of waiting on the
+server.
+"""
+
+from multiprocessing.pool import ThreadPool
+
+import translate.segment as segment
+
+from .client import Client
+
+
+class ManyResult(object):
+    """Result of AsyncClient.translate_many. Collects the results of each of
+    the requests it was split into, and mirrors the interface of the
+    multiprocessing.pool.AsyncResult objects returned by the other methods.
+    """
+
+    def __init__(self, chunks, results, spans):
+        """
+        :param chunks: text of each chunk, in order.
+        :param results: AsyncResults for each chunk, in order.
+        :param spans: (start, end) indices into results of the chunks making
+                      up each text.
+        """
+        self.chunks = chunks
+        self.results = results
+        self.spans = spans
+
+    def ready(self):
+        return all(r.ready() for r in self.results)
+
+    def successful(self):
+        return all(r.successful() for r in self.results)
+
+    def wait(self, timeout=None):
+        for r in self.results:
+            r.wait(timeout)
+
+    def get(self, timeout=None):
+        """Return the list of translated texts, raising the first exception
+        that occurred, if any. Raises multiprocessing.TimeoutError if the
+        results are not available within timeout seconds (per request).
+        """
+
+        chunks = [r.get(timeout) for r in self.results]
+
+        return [segment.join(self.chunks[start:end], chunks[start:end])
+                for start, end in self.spans]
+
+
+class AsyncClient(object):
+    """Asynchronous client for the translate server v1 API.
+
+    Each method mirrors the blocking method of the same name on Client, but
+    returns a multiprocessing.pool.AsyncResult immediately. Call .get() on the
+    result to wait for and return the value, or raise the exception that
+    occurred.
+    """
+
+    def __init__(self, host, port=5000, scheme='http', timeout=5,
+                 max_concurrency=10, **kwargs):
+        """Set up AsyncClient object.
+
+        :param host: hostname if the translate server to connect to.
+        :param port: port number translate server is on.
+        :param scheme: if the server is using SSL, change this to
+        'https'
+        :param timeout: number of seconds after which to give up on
+        requests.
+        :param max_concurrency: maximum number of requests to have in flight
+        to the server at any time.
+        """
+
+        self.client = Client(host, port=port, scheme=scheme, timeout=timeout,
+                             max_connections=max_concurrency, **kwargs)
+
+        self.pool = ThreadPool(processes=max_concurrency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Wait for any outstanding requests, then close the connection
+        pool."""
+
+        self.pool.close()
+        self.pool.join()
+
+        self.client.close()
+
+    def info(self, refresh=False):
+        return self.pool.apply_async(self.client.info, (refresh,))
+
+    def language_pairs(self, refresh=False):
+        return self.pool.apply_async(self.client.language_pairs, (refresh,))
+
+    def can_translate(self, from_lang, to_lang, refresh=False):
+        return self.pool.apply_async(self.client.can_translate,
+                                     (from_lang, to_lang, refresh))
+
+    def translate(self, text, from_lang, to_lang, split_text=True,
+                  refresh=False):
+        return self.pool.apply_async(self.client.translate,
+                                     (text, from_lang, to_lang, split_text,
+                                      refresh))
+
+    def batch_translate(self, params, ignore_timeout=False):
+        return self.pool.apply_async(self.client.batch_translate,
+                                     (params, ignore_timeout))
+
+    def translate_many(self, texts, from_lang, to_lang):
+        """Translate each of the given texts in parallel, returning a
+        ManyResult whose .get() gives the list of translations in order.
+
+        Texts larger than the server's size limit are split up and their
+        pieces translated in parallel as well. Note that the first call may
+        block while the size limit is fetched from the server.
+
+        :param texts: list of strings of text to translate.
+        :param from_lang: Language to translate from.
+        :param to_lang: Language to translate to.
+        """
+
+        sizelimit = self.client.info().sizelimit
+
+        chunks = []
+        results = []
+        spans = []
+
+        for text in texts:
+            if sizelimit and len(text.encode('utf-8')) > sizelimit:
+                pieces = segment.segment(text, sizelimit)
+            else:
+                pieces = [text]
+
+            start = len(results)
+
+            for chunk in pieces:
+                chunks.append(chunk)
+                results.append(self.pool.apply_async(
+                    self.client.translate, (chunk, from_lang, to_lang, False)))
+
+            spans.append((start, len(results)))
+
+        return ManyResult(chunks, results, spans)
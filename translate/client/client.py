@@ -25,7 +25,9 @@ import requests
 import urllib
 
 from collections import namedtuple
+from multiprocessing.pool import ThreadPool
 
+import translate.segment as segment
 import translate.utils as utils
 
 from .exceptions import HTTPException, TranslateException, \
@@ -78,21 +80,33 @@ class Client(object):
     # API version that the client requires the server to support.
     API_VERSION_SUPPORT = 'v1'
 
-    def __init__(self, host, port=5000, scheme='http', timeout=5, **kwargs):
+    def __init__(self, host, port=5000, scheme='http', timeout=5,
+                 max_connections=10, keepalive=True, **kwargs):
         """Set up Client object.
 
+        A Client keeps a pool of connections to the server open, and can be
+        shared between threads. Use it as a context manager (or call close())
+        to close the pool when done.
+
         :param host: hostname if the translate server to connect to.
         :param port: port number translate server is on.
         :param scheme: if the server is using SSL, change this to
         'https'
         :param timeout: number of seconds after which to give up on
         requests.
+        :param max_connections: maximum number of connections to keep open
+        to the server.
+        :param keepalive: if False, open a new connection for every request.
         """
         self.host = host
         self.scheme = scheme
         self.port = port
         self.timeout = timeout
         self.options = kwargs
+        self.max_connections = max_connections
+
+        self.session = utils.http_session({'pool_size': max_connections,
+                                           'keepalive': keepalive})
 
         self.base_url = "{0}://{1}:{2}/api/v1/".format(self.scheme, self.host,
                                                        self.port)
@@ -100,11 +114,22 @@ class Client(object):
         # Private variables (a lot more likely to change / be unsuitable for
         # public API use)
         self._pairs = None
+        self._pairs_version = None
         self._info = ServerInformation(backends=None, sizelimit=None,
                                        ratelimit=None, version=None,
                                        supported_api=None)
         self._info_fetched = False
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close any connections to the server that are being kept open."""
+        self.session.close()
+
     def can_connect(self):
         """Try to connect to the specified server. If a dummy request succeeds,
         True will be returned. If some kind of connection error (timeout, HTTP
@@ -150,60 +175,59 @@ class Client(object):
         :param refresh: Whether or not to ignore cached data and redownload.
         """
 
-        response = {}
-
         if not self._info_fetched or refresh:
             obj = self._request('info')
 
-            self._info = self._info._replace(backends={})
+            backends = {}
 
             for b in obj['backends']:
                 # Convert arrays to tuples
                 b['pairs'] = [(p[0], p[1]) for p in b['pairs']]
-                self._info.backends[b['name']] = b
+                backends[b['name']] = b
+
+            # Build the new information completely before storing it, so that
+            # other threads never see it half updated.
+            self._info = ServerInformation(
+                backends=backends,
+                sizelimit=obj.get('sizelimit', False),
+                ratelimit=obj.get('ratelimit', False),
+                version=obj['version'],
+                supported_api=obj['api_versions'])
 
             # Make sure these don't get out of sync by forcing language pairs
             # to regenerate as well
             self._pairs = None
 
-            if 'sizelimit' in obj:
-                self._info = self._info._replace(sizelimit=obj['sizelimit'])
-            else:
-                self._info = self._info._replace(sizelimit=False)
-
-            if 'ratelimit' in obj:
-                self._info = self._info._replace(ratelimit=obj['ratelimit'])
-            else:
-                self._info = self._info._replace(ratelimit=False)
-
-            self._info = self._info._replace(version=obj['version'])
-            self._info = self._info._replace(supported_api=obj['api_versions'])
-
             self._info_fetched = True
 
-        response['backends'] = self._info.backends
-        response['ratelimit'] = self._info.ratelimit
-        response['sizelimit'] = self._info.sizelimit
-        response['supported_api'] = self._info.supported_api
-        response['version'] = self._info.version
-
-        if response['ratelimit']:
-            self._info = self._info._replace(ratelimit=response['ratelimit'])
-
-        return ServerInformation(**response)
+        return ServerInformation(**self._info._asdict())
 
     def language_pairs(self, refresh=False):
         """Get the list of supported language pairs. If refresh is True, will
-        ignore previously cached results and hit the server again.
+        check with the server whether previously cached results are still
+        current, and download them again if not.
 
         :param refresh: Whether or not to ignore cached data and redownload.
         """
 
-        if refresh or (self._pairs is None):
-            obj = self._request('pairs')
-            self._pairs = [(p[0], p[1]) for p in obj['pairs']]
+        pairs = self._pairs
+
+        if refresh or (pairs is None):
+            headers = {}
+
+            # Only download the pairs again if they've changed
+            if pairs is not None and self._pairs_version is not None:
+                headers['If-None-Match'] = '"{0}"'.format(self._pairs_version)
+
+            obj = self._request('pairs', headers=headers)
+
+            if obj is not None:
+                pairs = [(p[0], p[1]) for p in obj['pairs']]
 
-        return self._pairs
+                self._pairs_version = obj.get('version')
+                self._pairs = pairs
+
+        return pairs
 
     # XXX: Don't really like the naming of this.
     def languages_from(self, from_lang, refresh=False):
@@ -278,14 +302,11 @@ class Client(object):
             if not self._info_fetched:
                 self.info()
 
-            if self._info.sizelimit and len(text) > self._info.sizelimit:
-                # Split up the string into proper parameters for a batch call.
-                params = [(s, from_lang, to_lang) for s in
-                          utils.chunk_string(text, self._info.sizelimit)]
+            sizelimit = self._info.sizelimit
 
-                # XXX: Should we ignore the timeout? Let user specify? What?
-                return ''.join(self.batch_translate(params,
-                                                    ignore_timeout=True))
+            if sizelimit and len(text.encode('utf-8')) > sizelimit:
+                return self._translate_chunks(text, from_lang, to_lang,
+                                              sizelimit)
 
         # Check that we're translating between valid languages
         if (from_lang, to_lang) not in self.language_pairs(refresh=refresh):
@@ -302,6 +323,31 @@ class Client(object):
                       from_lang, to_lang, exc)
             raise exc
 
+    def _translate_chunks(self, text, from_lang, to_lang, sizelimit):
+        """Split text up on sentence boundaries and translate each chunk
+        separately, up to max_connections at a time. Chunks are sent off as
+        soon as they're split from the text, rather than after the whole text
+        has been split up."""
+
+        chunks = []
+
+        def split():
+            for chunk in segment.segment(text, sizelimit):
+                chunks.append(chunk)
+                yield chunk
+
+        def translate_chunk(chunk):
+            return self.translate(chunk, from_lang, to_lang, split_text=False)
+
+        pool = ThreadPool(processes=self.max_connections)
+
+        try:
+            translations = list(pool.imap(translate_chunk, split()))
+        finally:
+            pool.close()
+
+        return segment.join(chunks, translations)
+
     def batch_translate(self, params, ignore_timeout=False):
         """Translate multiple texts and language pairs in a single
         call. Returns a list of strings containing the resulting translated
@@ -322,12 +368,12 @@ class Client(object):
         # TODO: This should handle splitting texts over the size limit if
         #       necessary.
 
-        orig_timeout = self.timeout
+        timeout = self.timeout
 
         if ignore_timeout:
             # I think 1000 seconds is more than reasonable as a cut off. (Who
             # would wait >16 minutes for this?)
-            self.timeout = 1000
+            timeout = 1000
 
         urls = []
 
@@ -348,7 +394,8 @@ of (text, from, to), got " + repr(tupl))
         results = []
 
         try:
-            objs = self._post_request('batch', urls=json.dumps(urls))
+            objs = self._post_request('batch', timeout=timeout,
+                                      urls=json.dumps(urls))
 
             for obj in objs:
                 if obj['status'] != 200:
@@ -361,9 +408,6 @@ of (text, from, to), got " + repr(tupl))
             log.error("Failed batch translate: %s", str(exc))
             raise exc
 
-        finally:
-            self.timeout = orig_timeout
-
         return results
 
     def can_translate(self, from_lang, to_lang, refresh=False):
@@ -377,18 +421,25 @@ of (text, from, to), got " + repr(tupl))
 
         return (from_lang, to_lang) in self.language_pairs(refresh=refresh)
 
-    def _request(self, method, **kwargs):
+    def _request(self, method, headers=None, **kwargs):
         """Convenience function to call an API function for the given client
         and return parsed JSON, or raise a TranslateException on error.
+
+        Returns None if the server says the result hasn't changed since the
+        version given in an If-None-Match header.
         """
 
         url = self.base_url + method
 
         try:
-            req = requests.get(url, timeout=self.timeout, params=kwargs)
+            req = self.session.get(url, timeout=self.timeout, params=kwargs,
+                                   headers=headers)
         except requests.exceptions.RequestException as exc:
             raise HTTPException(repr(exc))
 
+        if req.status_code == 304:
+            return None
+
         if req.status_code != 200:
             raise TranslateException.from_response(req)
 
@@ -402,14 +453,17 @@ of (text, from, to), got " + repr(tupl))
 
         return obj
 
-    def _post_request(self, method, **kwargs):
+    def _post_request(self, method, timeout=None, **kwargs):
         """Same concept as _request, this function sends a HTTP POST with the
         given kwargs as POST data"""
 
         url = self.base_url + method
 
+        if timeout is None:
+            timeout = self.timeout
+
         try:
-            req = requests.post(url, timeout=self.timeout, data=kwargs)
+            req = self.session.post(url, timeout=timeout, data=kwargs)
         except requests.exceptions.RequestException as exc:
             raise HTTPException(repr(exc))
 
@@ -38,7 +38,9 @@ class APIException(Exception):
         452: ('Translation error', 'Bad params to /translate'),
         453: ('Translator error', 'Failed to translate text'),
         454: ('Bad language pair',
-              'No translator can handle this language pair')
+              'No translator can handle this language pair'),
+        455: ('Batch too large',
+              'Given batch had too many requests for this server')
     }
 
     def __init__(self, status_code, status, message, details={}):
@@ -48,14 +50,19 @@ class APIException(Exception):
         self.details = details
         self.url = flask.request.url
 
+    def as_dict(self):
+        """Return a dict representation of the instance of this class, in the
+        same format as is used by jsonify.
+        """
+        return dict(code=self.status_code, status=self.status, url=self.url,
+                    message=self.message, details=self.details)
+
     def jsonify(self):
         """Return a flask Response object containing a JSON representation of
         the instance of this class. This should set everything necessary for
         the request
         """
-        resp = flask.jsonify(code=self.status_code, status=self.status,
-                             url=self.url, message=self.message,
-                             details=self.details)
+        resp = flask.jsonify(**self.as_dict())
 
         resp.status_code = self.status_code
         resp.status = "%s %s" % (self.status_code, self.status)
@@ -75,6 +82,18 @@ class APIException(Exception):
                     'per': per,
                     'reset': reset})
 
+    @classmethod
+    def bytelimit(cls, size, limit, per, reset):
+        """Class method to construct an APIException for going over the quota
+        of translated bytes.
+        """
+        tupl = APIException.API_ERRORS[429]
+        return cls(429, tupl[0], 'You went over the quota of translated bytes',
+                   {'size': size,
+                    'limit': limit,
+                    'per': per,
+                    'reset': reset})
+
     @classmethod
     def pair(cls, from_lang, to_lang, text):
         """Class method to construct an APIException for bad language pairs
@@ -117,9 +136,35 @@ class APIException(Exception):
                    {'given': len,
                     'limit': limit})
 
+    @classmethod
+    def batchlimit(cls, len, limit):
+        """Class method to construct an APIException for /batch requests
+        containing more requests than the server will handle at once.
+        """
+        tupl = APIException.API_ERRORS[455]
+        return cls(455, tupl[0], tupl[1],
+                   {'given': len,
+                    'limit': limit})
+
 
 class TranslationException(Exception):
     """Exception to be raised when a translation backend fails to translate a
     given block of text for whatever reason.
     """
     pass
+
+
+class QuotaException(TranslationException):
+    """Exception to be raised by a translation backend when the upstream
+    service refuses a request because its quota has been used up.
+    """
+    pass
+
+
+class ContentException(TranslationException):
+    """Exception to be raised by a translation backend when the upstream
+    service refuses to translate the given text (e.g. because it's too large
+    or can't be translated), which says nothing about whether the service
+    itself is working.
+    """
+    pass
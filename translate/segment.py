@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of translate.
+#
+# translate is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# translate is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# translate.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+translate.segment
+~~~~~~~~~~~~~~~~~
+
+Split text into chunks small enough to be translated in a single request.
+
+Chunks are cut at the end of a sentence where possible, then at the end of a
+clause, then between words, and only as a last resort in the middle of a word.
+Joining the chunks gives back the original text exactly, and no chunk is ever
+longer than the given number of bytes once encoded as UTF-8.
+
+Text is segmented lazily, so the first chunks can be sent off to be translated
+while the rest of a large text is still being read and split up.
+"""
+
+import re
+
+# Boundaries to split at, best first. Each match ends where the next chunk
+# should start, so whitespace after the boundary stays with the earlier chunk.
+BOUNDARIES = [
+    # End of a sentence (including any closing quotes or brackets), or a line
+    re.compile(u'[.!?\u2026\u3002\uff01\uff1f]+["\'\u2019\u201d)\\]]*\\s+|'
+               u'[\u3002\uff01\uff1f]|\n\\s*', re.UNICODE),
+
+    # End of a clause
+    re.compile(u'[,;:\u060c\u3001\uff0c\uff1b\uff1a]\\s+|[\u3001\uff0c]|'
+               u'\\s[-\u2013\u2014]\\s+', re.UNICODE),
+
+    # End of a word
+    re.compile(u'\\s+', re.UNICODE)
+]
+
+# Every character fits in this many bytes of UTF-8.
+MAX_CHAR_BYTES = 4
+
+
+def segment(text, limit):
+    """Yield successive chunks of text, each no more than limit bytes long
+    when encoded as UTF-8.
+
+    :param text: unicode string, or an iterable of unicode strings (such as a
+                 file) making up the text to split up.
+    :param limit: maximum size of each chunk, in bytes.
+    """
+
+    if limit < MAX_CHAR_BYTES:
+        raise ValueError('Chunks must be allowed at least {0} bytes'
+                         .format(MAX_CHAR_BYTES))
+
+    pieces = [text] if isinstance(text, basestring) else text
+
+    buf = u''
+    pos = 0
+
+    for piece in pieces:
+        # Drop what's already been yielded, rather than slicing the buffer
+        # for every chunk.
+        buf = buf[pos:] + piece
+        pos = 0
+
+        # Only cut once there's more than a chunk's worth of text, so that a
+        # boundary right at the end can't be split off from what follows.
+        while _size(buf, pos, limit) > limit:
+            end = pos + _split(buf[pos:pos + limit], limit)
+
+            yield buf[pos:end]
+            pos = end
+
+    if pos < len(buf):
+        yield buf[pos:]
+
+
+def join(chunks, translations):
+    """Join the translations of chunks (as produced by segment) back into a
+    single text."""
+
+    return u''.join(restore(chunk, trans)
+                    for chunk, trans in zip(chunks, translations))
+
+
+def restore(chunk, trans):
+    """Return the translation trans of chunk, ending with the same whitespace
+    as chunk.
+
+    Translators tend to strip whitespace from the ends of what they're given,
+    so any that a chunk ended with has to be put back before joining
+    translations together.
+    """
+
+    space = chunk[len(chunk.rstrip()):]
+
+    if space and not trans.endswith(space):
+        trans = trans.rstrip() + space
+
+    return trans
+
+
+def _size(buf, pos, limit):
+    """Return the size of buf[pos:] in bytes, or limit + 1 if it's obviously
+    larger than limit."""
+
+    # Each character takes at least a byte, so don't bother encoding
+    if len(buf) - pos > limit:
+        return limit + 1
+
+    return len(buf[pos:].encode('utf-8'))
+
+
+def _split(window, limit):
+    """Return how many characters from the start of window should make up
+    the next chunk."""
+
+    # Cut at limit bytes, then back up to the start of the last (partial)
+    # character.
+    fits = len(window.encode('utf-8')[:limit].decode('utf-8', 'ignore'))
+    window = window[:fits]
+
+    for boundary in BOUNDARIES:
+        end = 0
+
+        for match in boundary.finditer(window):
+            end = match.end()
+
+        if end > 0:
+            return end
+
+    return fits
@@ -25,12 +25,19 @@ a link to the original source is included in the docstring.
 """
 
 from . import log
+from . import segment
 
 import flask
 import inspect
+import os
 import subprocess
 import pkgutil
 import collections
+import sys
+import time
+
+import requests
+import requests.adapters
 
 from functools import wraps
 
@@ -41,10 +48,24 @@ def find_subclasses(path, cls):
     path: path to search for subclasses
     cls: class to find subclasses of
     """
+    import translate.backends
+
     subclasses = []
 
+    # Modules of the translate.backends package are imported by their full
+    # name, the same as the backend registry does, so they're only loaded
+    # once whichever way they're found.
+    package = os.path.dirname(os.path.abspath(translate.backends.__file__))
+    prefix = None
+    if os.path.realpath(path) == os.path.realpath(package):
+        prefix = 'translate.backends.'
+
     for loader, name, _ in pkgutil.walk_packages([path]):
-        module = loader.find_module(name).load_module(name)
+        if prefix is not None:
+            module = import_object(prefix + name)
+        else:
+            module = _load_from(loader, name, path)
+
         log.debug("Searching module %s" % (name))
 
         for key, entry in inspect.getmembers(module, inspect.isclass):
@@ -61,6 +82,108 @@ def find_subclasses(path, cls):
     return subclasses
 
 
+def _load_from(loader, name, path):
+    """Return the module called name in the directory path, only loading it
+    if the module of that name that's already loaded (if any) isn't the one
+    in path. Loading a module again would run it all over again."""
+
+    module = sys.modules.get(name)
+    module_file = getattr(module, '__file__', None)
+
+    if module_file is not None and os.path.realpath(
+            os.path.dirname(module_file)) == os.path.realpath(path):
+        return module
+
+    # Otherwise loading would run the module in path over the top of the
+    # other one.
+    sys.modules.pop(name, None)
+
+    return loader.find_module(name).load_module(name)
+
+
+def import_object(spec):
+    """Import and return the object named by spec, given as
+    'package.module:name' (the same form as setuptools entry points)."""
+
+    module_name, _, attr = spec.partition(':')
+
+    # __import__ returns the top level package, so find the module itself in
+    # sys.modules (importlib isn't available before Python 2.7).
+    __import__(module_name)
+    module = sys.modules[module_name]
+
+    if not attr:
+        return module
+
+    try:
+        return getattr(module, attr)
+    except AttributeError:
+        raise ImportError('{0} has no attribute {1}'
+                          .format(module_name, attr))
+
+
+class RetryAdapter(requests.adapters.HTTPAdapter):
+    """Transport adapter that retries requests which fail to connect,
+    backing off exponentially between each attempt.
+    """
+
+    def __init__(self, retries=0, backoff=0, **kwargs):
+        """
+        :param retries: number of times to retry a failed request.
+        :param backoff: seconds to wait before the first retry. This doubles
+                        for each following retry.
+        """
+        self.retries = retries
+        self.backoff = backoff
+
+        super(RetryAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        attempt = 0
+
+        while True:
+            try:
+                return super(RetryAdapter, self).send(request, **kwargs)
+
+            except requests.exceptions.ConnectionError:
+                if attempt >= self.retries:
+                    raise
+
+                log.debug('Retrying request to %s', request.url)
+
+                time.sleep(self.backoff * (2 ** attempt))
+                attempt += 1
+
+
+def http_session(config):
+    """Return a requests.Session which keeps a pool of connections open, to
+    avoid reconnecting (and renegotiating TLS) for each request.
+
+    The following (optional) keys of config are used:
+
+      - pool_size: maximum number of connections to keep open per host (10)
+      - keepalive: whether or not to reuse connections at all (True)
+      - retries: number of times to retry a request that fails to connect (0)
+      - backoff: seconds to wait before the first retry, doubling for each
+                 following retry (0.5)
+    """
+
+    session = requests.Session()
+
+    adapter = RetryAdapter(retries=config.get('retries', 0),
+                           backoff=config.get('backoff', 0.5),
+                           pool_connections=config.get('pool_size', 10),
+                           pool_maxsize=config.get('pool_size', 10))
+
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    if not config.get('keepalive', True):
+        session.headers['Connection'] = 'close'
+
+    return session
+
+
 def jsonp(func):
     """Wraps JSONified output for JSONP requests.
 
@@ -118,15 +241,13 @@ def update(d, u, depth=-1):
 
 
 def chunk_string(string, n):
-    """Yield successive n-byte sized substrings from string.
-
-    TODO: Split on word boundaries instead of middle of word...
+    """Yield successive substrings of string, each no more than n bytes long
+    in UTF-8, split on sentence or word boundaries where possible.
 
-    Code adapted from: http://stackoverflow.com/a/312464
+    Kept for compatibility, use translate.segment.segment instead.
     """
 
-    for i in xrange(0, len(string.encode('utf-8')), n):
-        yield string[i:i+n]
+    return segment.segment(string, n)
 
 
 def iso639_convert(code):